@@ -1,4 +1,6 @@
 import requests
+import httpx
+import asyncio
 import json
 import re
 from typing import List, Dict, Any, Optional
@@ -14,6 +16,8 @@ class LMStudioClient:
         self.embedding_model = Config.EMBEDDING_MODEL
         self.temperature = Config.TEMPERATURE
         self.max_tokens = Config.MAX_TOKENS
+        self.embedding_batch_size = 64
+        self.max_concurrent_requests = 8
         
     def _make_request(self, endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Make HTTP request to LMStudio"""
@@ -31,6 +35,36 @@ class LMStudioClient:
             print(f"Error making request to LMStudio: {e}")
             raise
     
+    def _async_client(self) -> httpx.AsyncClient:
+        """Create a pooled async HTTP client for LMStudio
+        
+        A fresh client is created per event loop run, since pooled connections
+        cannot be shared across the loops started by asyncio.run.
+        """
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.api_key}"
+            },
+            timeout=60,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrent_requests,
+                max_keepalive_connections=self.max_concurrent_requests
+            )
+        )
+    
+    async def _amake_request(self, client: httpx.AsyncClient, endpoint: str,
+                             payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Make async HTTP request to LMStudio"""
+        try:
+            response = await client.post(f"/{endpoint}", json=payload)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            print(f"Error making request to LMStudio: {e}")
+            raise
+    
     def _strip_thinking_tags(self, text: str) -> str:
         """Remove thinking content from LLM response"""
         if not text:
@@ -119,6 +153,34 @@ class LMStudioClient:
             print(f"Error in chat completion: {e}")
             return "I apologize, but I encountered an error processing your request."
     
+    async def aembed_batch(self, client: httpx.AsyncClient, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for a single batch of texts"""
+        payload = {
+            "model": self.embedding_model,
+            "input": texts
+        }
+        response = await self._amake_request(client, "v1/embeddings", payload)
+        return [item["embedding"] for item in response["data"]]
+    
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings concurrently, one request per batch of texts"""
+        if not texts:
+            return []
+        
+        batch_size = self.embedding_batch_size
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        
+        try:
+            async with self._async_client() as client:
+                results = await asyncio.gather(
+                    *[self.aembed_batch(client, batch) for batch in batches]
+                )
+            return [embedding for batch in results for embedding in batch]
+        except Exception as e:
+            print(f"Error generating embeddings: {e}")
+            # Return zero embeddings as fallback
+            return [[0.0] * 384 for _ in texts]  # Assuming 384-dim embeddings
+    
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings using LMStudio"""
         if not texts:
@@ -150,4 +212,4 @@ class LMStudioClient:
             return bool(response and len(response) > 0)
         except Exception as e:
             print(f"LMStudio connection test failed: {e}")
-            return False
\ No newline at end of file
+            return False
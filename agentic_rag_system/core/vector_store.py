@@ -1,4 +1,5 @@
 import chromadb
+import asyncio
 import os
 import uuid
 from typing import List, Dict, Any, Optional, Tuple
@@ -48,7 +49,8 @@ class VectorStore:
         
         try:
             print(f"Generating embeddings for {len(documents)} documents...")
-            embeddings = self.llm_client.get_embeddings(documents)
+            # Batches are embedded concurrently rather than in one blocking request
+            embeddings = asyncio.run(self.llm_client.aget_embeddings(documents))
             
             if not embeddings or len(embeddings) != len(documents):
                 print("Failed to generate embeddings")
@@ -4,20 +4,23 @@ Streamlit Web Interface for Agentic RAG System
 """
 
 import streamlit as st
+import pandas as pd
 import os
 import sys
+import pickle
 from pathlib import Path
-import time
 from typing import Optional, Dict, Any, List
-import tempfile
-import shutil
 
 # Add the project root to Python path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 from config import Config
-from core import AgentGraph, LMStudioClient, VectorStore, ConversationHandler
+from prompts import SystemPrompts
+
+# Last known collection info and document statistics, shown before the backend is ready;
+# kept beside the vector store rather than among the user's documents
+SNAPSHOT_PATH = Path(Config.CHROMA_DB_PATH).parent / "system_snapshot.pkl"
 
 # Page configuration
 st.set_page_config(
@@ -77,6 +80,79 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_data(ttl=300, show_spinner=False)
+def _diagnostic_probe(agent_id: int) -> bool:
+    """Run a single probe query through the agent graph, cached per agent instance"""
+    result = st.session_state.agent_graph.process_query_sync("ping")
+    return bool(result.get("final_response"))
+
+class _UncachedAnswer(Exception):
+    """Carries an agent result out of the cached function without caching it"""
+    
+    def __init__(self, result: Dict[str, Any]):
+        super().__init__("uncached agent answer")
+        self.result = result
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _cached_agent_answer(_graph, query: str) -> Dict[str, Any]:
+    """Run a standalone query through the agent graph, deduplicating identical query strings
+    
+    Error responses are raised instead of returned, since st.cache_data does not
+    keep results of calls that raise.
+    """
+    result = _graph.process_query_sync(query)
+    response = result.get("final_response", "")
+    if any(response.startswith(error) for error in SystemPrompts.ERROR_PROMPTS.values()):
+        raise _UncachedAnswer(result)
+    return result
+
+def _agent_answer(graph, query: str, standalone: bool) -> Dict[str, Any]:
+    """Run a query through the agent graph, reusing answers to identical standalone queries
+    
+    Follow-ups depend on the session's conversation, so they always run the graph.
+    """
+    if not standalone:
+        return graph.process_query_sync(query)
+    try:
+        return _cached_agent_answer(graph, query)
+    except _UncachedAnswer as e:
+        return e.result
+
+@st.cache_data(ttl=15, show_spinner=False)
+def _lmstudio_ok(_client) -> bool:
+    """Test the LMStudio connection, reusing the result for consecutive probes"""
+    return _client.test_connection()
+
+@st.cache_data(show_spinner=False)
+def _sidebar_collection_md(name: str, count: int, files: int) -> str:
+    """Render the sidebar collection summary"""
+    return f"**Collection:** {name}\n**Total Chunks:** {count}\n**Files Indexed:** {files}"
+
+@st.cache_data(show_spinner=False)
+def _sidebar_model_md(chat_model: str, embedding_model: str, top_k: int, chunk_size: int) -> str:
+    """Render the sidebar model configuration summary"""
+    return (
+        f"**Chat Model:** {chat_model}\n**Embedding Model:** {embedding_model}\n"
+        f"**Top-K Results:** {top_k}\n**Chunk Size:** {chunk_size}"
+    )
+
+@st.cache_data(show_spinner=False)
+def _files_df(files: tuple) -> pd.DataFrame:
+    """Build the indexed-files table from (filename, chunks) pairs"""
+    rows = [
+        (filename, chunks, filename.split('.')[-1].upper() if '.' in filename else "Unknown")
+        for filename, chunks in files
+    ]
+    return pd.DataFrame(rows, columns=["Filename", "Chunks", "Type"])
+
+@st.cache_data(show_spinner=False)
+def _config_df(settings: tuple) -> pd.DataFrame:
+    """Build the configuration table from (setting, value) pairs"""
+    return pd.DataFrame(
+        [(name, str(value)) for name, value in settings],
+        columns=["Setting", "Value"]
+    )
+
 class StreamlitRAGApp:
     """Streamlit application for the Agentic RAG System"""
     
@@ -95,6 +171,32 @@ class StreamlitRAGApp:
             st.session_state.system_status = "Not initialized"
             st.session_state.collection_info = {}
             st.session_state.doc_stats = {}
+            self.load_system_snapshot()
+    
+    def load_system_snapshot(self):
+        """Load cached system information from the on-disk snapshot"""
+        if not SNAPSHOT_PATH.exists():
+            return
+        
+        try:
+            with open(SNAPSHOT_PATH, "rb") as f:
+                snapshot = pickle.load(f)
+            st.session_state.collection_info = snapshot.get("collection_info", {})
+            st.session_state.doc_stats = snapshot.get("doc_stats", {})
+        except Exception as e:
+            print(f"Failed to load system snapshot: {e}")
+    
+    def save_system_snapshot(self):
+        """Persist current system information to the on-disk snapshot"""
+        try:
+            SNAPSHOT_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with open(SNAPSHOT_PATH, "wb") as f:
+                pickle.dump({
+                    "collection_info": st.session_state.collection_info,
+                    "doc_stats": st.session_state.doc_stats
+                }, f)
+        except Exception as e:
+            print(f"Failed to save system snapshot: {e}")
     
     def initialize_system(self) -> bool:
         """Initialize the RAG system components"""
@@ -103,6 +205,9 @@ class StreamlitRAGApp:
         
         with st.spinner("🚀 Initializing Agentic RAG System..."):
             try:
+                # Imported here so the UI renders before the RAG backend loads
+                from core import AgentGraph, LMStudioClient, VectorStore, ConversationHandler
+                
                 # Validate configuration
                 if not Config.validate():
                     st.error("❌ Configuration validation failed!")
@@ -111,7 +216,7 @@ class StreamlitRAGApp:
                 # Initialize LLM client
                 st.session_state.llm_client = LMStudioClient()
                 
-                if not st.session_state.llm_client.test_connection():
+                if not _lmstudio_ok(st.session_state.llm_client):
                     st.error("❌ Failed to connect to LMStudio. Please ensure it's running on http://localhost:1234")
                     return False
                 
@@ -146,67 +251,79 @@ class StreamlitRAGApp:
         if st.session_state.vector_store:
             st.session_state.collection_info = st.session_state.vector_store.get_collection_info()
             st.session_state.doc_stats = st.session_state.vector_store.get_document_statistics()
+            self.save_system_snapshot()
+        
+        # Cached answers may have been built from documents that changed since
+        _cached_agent_answer.clear()
     
     def render_header(self):
         """Render the application header"""
         st.markdown('<h1 class="main-header">🤖 Agentic RAG System</h1>', unsafe_allow_html=True)
         st.markdown("---")
     
+    @st.fragment
     def render_sidebar(self):
         """Render the sidebar with system information and controls"""
-        with st.sidebar:
-            st.header("📊 System Status")
+        st.header("📊 System Status")
+        
+        # System status indicator
+        if st.session_state.initialized:
+            st.success(f"✅ {st.session_state.system_status}")
+        else:
+            st.warning(f"⚠️ {st.session_state.system_status}")
+        
+        if st.button("🔄 Initialize System", disabled=st.session_state.initialized):
+            self.initialize_system()
+            st.rerun()
+        
+        collection_info = st.session_state.collection_info
+        doc_stats = st.session_state.doc_stats
+        
+        # Before initialization, show the snapshot from the last session
+        if st.session_state.initialized or collection_info:
+            st.markdown("---")
             
-            # System status indicator
-            if st.session_state.initialized:
-                st.success(f"✅ {st.session_state.system_status}")
-            else:
-                st.warning(f"⚠️ {st.session_state.system_status}")
+            # Collection information
+            st.subheader("📚 Document Collection")
+            if not st.session_state.initialized:
+                st.caption("🕒 Cached from the last session")
             
-            if st.button("🔄 Initialize System", disabled=st.session_state.initialized):
-                self.initialize_system()
+            if collection_info:
+                st.info(_sidebar_collection_md(
+                    collection_info.get('name', 'Unknown'),
+                    collection_info.get('document_count', 0),
+                    len(doc_stats.get('files', {}))
+                ))
+        
+        if st.session_state.initialized:
+            # Model information
+            st.subheader("🤖 Model Configuration")
+            st.info(_sidebar_model_md(
+                Config.CHAT_MODEL,
+                Config.EMBEDDING_MODEL,
+                Config.TOP_K_RESULTS,
+                Config.CHUNK_SIZE
+            ))
+            
+            st.markdown("---")
+            
+            # Quick actions
+            st.subheader("⚡ Quick Actions")
+            
+            if st.button("🗑️ Clear Chat History"):
+                st.session_state.chat_history = []
+                if st.session_state.conversation_handler:
+                    st.session_state.conversation_handler.clear_history()
+                _cached_agent_answer.clear()
+                st.success("Chat history cleared!")
+                # The chat tab lives outside this fragment, so refresh the whole app
                 st.rerun()
             
-            if st.session_state.initialized:
-                st.markdown("---")
-                
-                # Collection information
-                st.subheader("📚 Document Collection")
-                collection_info = st.session_state.collection_info
-                doc_stats = st.session_state.doc_stats
-                
-                if collection_info:
-                    st.info(f"""
-                    **Collection:** {collection_info.get('name', 'Unknown')}
-                    **Total Chunks:** {collection_info.get('document_count', 0)}
-                    **Files Indexed:** {len(doc_stats.get('files', {}))}
-                    """)
-                
-                # Model information
-                st.subheader("🤖 Model Configuration")
-                st.info(f"""
-                **Chat Model:** {Config.CHAT_MODEL}
-                **Embedding Model:** {Config.EMBEDDING_MODEL}
-                **Top-K Results:** {Config.TOP_K_RESULTS}
-                **Chunk Size:** {Config.CHUNK_SIZE}
-                """)
-                
-                st.markdown("---")
-                
-                # Quick actions
-                st.subheader("⚡ Quick Actions")
-                
-                if st.button("🗑️ Clear Chat History"):
-                    st.session_state.chat_history = []
-                    if st.session_state.conversation_handler:
-                        st.session_state.conversation_handler.clear_history()
-                    st.success("Chat history cleared!")
-                    st.rerun()
-                
-                if st.button("🔄 Refresh System Info"):
-                    self.update_system_info()
-                    st.success("System info refreshed!")
-                    st.rerun()
+            if st.button("🔄 Refresh System Info"):
+                self.update_system_info()
+                st.success("System info refreshed!")
+                # The document tab shows the same statistics, so refresh the whole app
+                st.rerun()
     
     def render_chat_interface(self):
         """Render the main chat interface"""
@@ -263,11 +380,14 @@ class StreamlitRAGApp:
         # Show processing indicator
         with st.spinner("🤖 Thinking..."):
             try:
+                # Only the first question of a conversation is answered from the cache
+                standalone = not st.session_state.conversation_handler.conversation_history
+                
                 # Add user message to conversation handler
                 st.session_state.conversation_handler.add_message("user", user_input)
                 
                 # Process through agent graph
-                result = st.session_state.agent_graph.process_query_sync(user_input)
+                result = _agent_answer(st.session_state.agent_graph, user_input, standalone)
                 
                 # Get response
                 response = result.get("final_response", "No response generated")
@@ -295,52 +415,24 @@ class StreamlitRAGApp:
                     "content": f"❌ {error_message}"
                 })
     
+    @st.fragment
     def render_document_manager(self):
         """Render document management interface"""
         st.header("📁 Document Management")
         
-        if not st.session_state.initialized:
-            st.warning("⚠️ Please initialize the system first.")
-            return
-        
         # Current document statistics
         doc_stats = st.session_state.doc_stats
-        collection_info = st.session_state.collection_info
         
-        if doc_stats.get('total_chunks', 0) > 0:
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Total Chunks", doc_stats['total_chunks'])
-            with col2:
-                st.metric("Files Indexed", len(doc_stats.get('files', {})))
-            with col3:
-                st.metric("File Types", len(doc_stats.get('file_types', {})))
-            
-            # File breakdown
-            if doc_stats.get('files'):
-                st.subheader("📋 Indexed Files")
-                file_data = []
-                for filename, chunks in doc_stats['files'].items():
-                    file_data.append({
-                        "Filename": filename,
-                        "Chunks": chunks,
-                        "Type": filename.split('.')[-1].upper() if '.' in filename else "Unknown"
-                    })
-                st.dataframe(file_data, use_container_width=True)
+        if not st.session_state.initialized:
+            st.warning("⚠️ Please initialize the system first.")
             
-            # File type breakdown
-            if doc_stats.get('file_types'):
-                st.subheader("📊 File Type Distribution")
-                file_type_data = []
-                total_chunks = doc_stats['total_chunks']
-                for file_type, count in doc_stats['file_types'].items():
-                    percentage = (count / total_chunks) * 100
-                    file_type_data.append({
-                        "File Type": file_type.upper(),
-                        "Chunks": count,
-                        "Percentage": f"{percentage:.1f}%"
-                    })
-                st.dataframe(file_type_data, use_container_width=True)
+            # Before initialization, show the snapshot from the last session
+            if doc_stats.get('total_chunks', 0) > 0:
+                st.caption("🕒 Statistics cached from the last session")
+                self.render_document_statistics(doc_stats)
+            return
+        
+        self.render_document_statistics(doc_stats)
         
         st.markdown("---")
         
@@ -383,6 +475,7 @@ class StreamlitRAGApp:
             if st.button("🔄 Refresh Statistics"):
                 self.update_system_info()
                 st.success("Statistics refreshed!")
+                # The sidebar shows the same statistics, so refresh the whole app
                 st.rerun()
         
         with col2:
@@ -400,8 +493,42 @@ class StreamlitRAGApp:
                     st.warning("⚠️ Click again to confirm database clearing")
                     st.rerun()
     
+    def render_document_statistics(self, doc_stats: Dict[str, Any]):
+        """Render chunk, file and file type statistics for the indexed documents"""
+        if doc_stats.get('total_chunks', 0) == 0:
+            return
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Total Chunks", doc_stats['total_chunks'])
+        with col2:
+            st.metric("Files Indexed", len(doc_stats.get('files', {})))
+        with col3:
+            st.metric("File Types", len(doc_stats.get('file_types', {})))
+        
+        # File breakdown
+        if doc_stats.get('files'):
+            st.subheader("📋 Indexed Files")
+            st.dataframe(_files_df(tuple(doc_stats['files'].items())), use_container_width=True)
+        
+        # File type breakdown
+        if doc_stats.get('file_types'):
+            st.subheader("📊 File Type Distribution")
+            file_type_data = []
+            total_chunks = doc_stats['total_chunks']
+            for file_type, count in doc_stats['file_types'].items():
+                percentage = (count / total_chunks) * 100
+                file_type_data.append({
+                    "File Type": file_type.upper(),
+                    "Chunks": count,
+                    "Percentage": f"{percentage:.1f}%"
+                })
+            st.dataframe(file_type_data, use_container_width=True)
+    
     def process_uploaded_files(self, uploaded_files):
         """Process uploaded files"""
+        import tempfile
+        
         with st.spinner("📤 Processing uploaded files..."):
             try:
                 # Create temporary directory
@@ -418,6 +545,7 @@ class StreamlitRAGApp:
                     if success:
                         self.update_system_info()
                         st.success(f"✅ Successfully processed {len(uploaded_files)} file(s)!")
+                        # New documents change the sidebar counts too, so refresh the whole app
                         st.rerun()
                     else:
                         st.error("❌ Failed to process uploaded files")
@@ -434,6 +562,7 @@ class StreamlitRAGApp:
                 if success:
                     self.update_system_info()
                     st.success("✅ Documents loaded successfully!")
+                    # New documents change the sidebar counts too, so refresh the whole app
                     st.rerun()
                 else:
                     st.error("❌ Failed to load documents")
@@ -448,32 +577,19 @@ class StreamlitRAGApp:
         # Configuration display
         st.subheader("📋 Current Configuration")
         
-        config_data = {
-            "Setting": [
-                "Chat Model",
-                "Embedding Model", 
-                "LMStudio URL",
-                "Top-K Results",
-                "Similarity Threshold",
-                "Chunk Size",
-                "Chunk Overlap",
-                "Temperature",
-                "Max Tokens"
-            ],
-            "Value": [
-                Config.CHAT_MODEL,
-                Config.EMBEDDING_MODEL,
-                Config.LMSTUDIO_BASE_URL,
-                Config.TOP_K_RESULTS,
-                Config.SIMILARITY_THRESHOLD,
-                Config.CHUNK_SIZE,
-                Config.CHUNK_OVERLAP,
-                Config.TEMPERATURE,
-                Config.MAX_TOKENS
-            ]
-        }
+        config_data = (
+            ("Chat Model", Config.CHAT_MODEL),
+            ("Embedding Model", Config.EMBEDDING_MODEL),
+            ("LMStudio URL", Config.LMSTUDIO_BASE_URL),
+            ("Top-K Results", Config.TOP_K_RESULTS),
+            ("Similarity Threshold", Config.SIMILARITY_THRESHOLD),
+            ("Chunk Size", Config.CHUNK_SIZE),
+            ("Chunk Overlap", Config.CHUNK_OVERLAP),
+            ("Temperature", Config.TEMPERATURE),
+            ("Max Tokens", Config.MAX_TOKENS)
+        )
         
-        st.dataframe(config_data, use_container_width=True)
+        st.dataframe(_config_df(config_data), use_container_width=True)
         
         st.markdown("---")
         
@@ -489,7 +605,7 @@ class StreamlitRAGApp:
         
         # Test LMStudio connection
         with st.spinner("Testing LMStudio connection..."):
-            if st.session_state.llm_client and st.session_state.llm_client.test_connection():
+            if st.session_state.llm_client and _lmstudio_ok(st.session_state.llm_client):
                 st.success("✅ LMStudio connection: OK")
             else:
                 st.error("❌ LMStudio connection: FAILED")
@@ -513,9 +629,8 @@ class StreamlitRAGApp:
         # Test agent graph
         with st.spinner("Testing agent graph..."):
             try:
-                test_query = "test query"
-                result = st.session_state.agent_graph.process_query_sync(test_query)
-                if result.get("final_response"):
+                # Cached on the agent's identity so a rebuilt agent is probed again
+                if _diagnostic_probe(id(st.session_state.agent_graph)):
                     st.success("✅ Agent graph: OK")
                 else:
                     st.warning("⚠️ Agent graph: Response generation issue")
@@ -525,7 +640,9 @@ class StreamlitRAGApp:
     def run(self):
         """Main application runner"""
         self.render_header()
-        self.render_sidebar()
+        
+        with st.sidebar:
+            self.render_sidebar()
         
         # Main content area with tabs
         tab1, tab2, tab3 = st.tabs(["💬 Chat", "📁 Documents", "⚙️ Settings"])
@@ -7,12 +7,13 @@ import streamlit as st
 import yaml
 import logging
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from typing import Dict, Any, List
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
 import os
 import sys
-from datetime import datetime
+import secrets
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
 
 # Add src to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
@@ -20,6 +21,28 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 from src.agents.orchestrator import BiChatbotOrchestrator
 from src.utils import load_config, setup_logging
 
+# Bar charts beyond this many categories keep only the largest ones; the SQL
+# agent sends no chart at all for results over 1000 rows
+MAX_BAR_CATEGORIES = 500
+
+EXAMPLE_QUERIES = {
+    "📊 Data Analysis": [
+        "What were our total sales last month?",
+        "Show me the top 5 customers by revenue",
+        "How many new customers this quarter?"
+    ],
+    "📄 Document Search": [
+        "What does our policy say about remote work?",
+        "Show me the Q3 performance highlights",
+        "Find information about our product features"
+    ],
+    "❓ General Questions": [
+        "What is a KPI?",
+        "Explain data visualization best practices",
+        "How does business intelligence work?"
+    ]
+}
+
 # Configure logging
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -100,60 +123,107 @@ def display_chat_message(message: Dict[str, Any], is_user: bool = False):
         </div>
         """, unsafe_allow_html=True)
 
-def display_visualization(viz_data: Dict[str, Any]):
-    """Display visualization if available"""
+def _top_bars(df: pd.DataFrame, value_col: str) -> pd.DataFrame:
+    """Keep only the largest bars so the chart stays readable and light"""
+    if pd.api.types.is_numeric_dtype(df[value_col]):
+        return df.nlargest(MAX_BAR_CATEGORIES, value_col)
+    return df.head(MAX_BAR_CATEGORIES)
+
+@st.cache_data(show_spinner=False)
+def build_figure(viz_data: Dict[str, Any]) -> Optional["go.Figure"]:
+    """Build a Plotly figure from visualization data
+    
+    Cached on the payload, so a repeated chart is not rebuilt through Plotly Express.
+    """
+    chart_type = viz_data.get('type', 'bar')
+    data = viz_data.get('data', {})
+    
+    if not data:
+        return None
+    
+    # Plotly is only loaded once a conversation actually produces a chart
+    import plotly.express as px
+        
+    df = pd.DataFrame(data)
+    
+    if chart_type == 'bar':
+        if len(df.columns) >= 2:
+            if len(df) > MAX_BAR_CATEGORIES:
+                df = _top_bars(df, df.columns[1])
+            return px.bar(df, x=df.columns[0], y=df.columns[1], 
+                          title=viz_data.get('title', 'Data Visualization'))
+    elif chart_type == 'line':
+        if len(df.columns) >= 2:
+            return px.line(df, x=df.columns[0], y=df.columns[1], 
+                           title=viz_data.get('title', 'Trend Analysis'))
+    elif chart_type == 'scatter':
+        if len(df.columns) >= 2:
+            return px.scatter(df, x=df.columns[0], y=df.columns[1], 
+                              title=viz_data.get('title', 'Scatter Plot'))
+    else:
+        # Default to bar chart
+        return px.bar(df, x=df.columns[0], y=df.columns[1] if len(df.columns) > 1 else df.columns[0])
+    
+    return None
+
+def display_visualization(viz_data: Dict[str, Any], message: Optional[Dict[str, Any]] = None):
+    """Display visualization if available
+    
+    When the owning chat message is given, the built figure is kept on it under
+    '_fig' so later reruns redraw it without rebuilding through Plotly Express.
+    """
     if not viz_data:
         return
     
     try:
-        chart_type = viz_data.get('type', 'bar')
-        data = viz_data.get('data', {})
+        fig = message.get('_fig') if message is not None else None
         
-        if not data:
-            return
-            
-        df = pd.DataFrame(data)
+        if fig is None:
+            fig = build_figure(viz_data)
+            if message is not None:
+                message['_fig'] = fig
         
-        if chart_type == 'bar':
-            if len(df.columns) >= 2:
-                fig = px.bar(df, x=df.columns[0], y=df.columns[1], 
-                           title=viz_data.get('title', 'Data Visualization'))
-        elif chart_type == 'line':
-            if len(df.columns) >= 2:
-                fig = px.line(df, x=df.columns[0], y=df.columns[1], 
-                            title=viz_data.get('title', 'Trend Analysis'))
-        elif chart_type == 'scatter':
-            if len(df.columns) >= 2:
-                fig = px.scatter(df, x=df.columns[0], y=df.columns[1], 
-                               title=viz_data.get('title', 'Scatter Plot'))
-        else:
-            # Default to bar chart
-            fig = px.bar(df, x=df.columns[0], y=df.columns[1] if len(df.columns) > 1 else df.columns[0])
-        
-        st.plotly_chart(fig, use_container_width=True)
+        if fig is not None:
+            st.plotly_chart(fig, use_container_width=True)
         
     except Exception as e:
         st.error(f"Error displaying visualization: {str(e)}")
 
+@st.cache_data(show_spinner=False)
+def _results_frame(results: Dict[str, Any]) -> pd.DataFrame:
+    """Build the results DataFrame once per result set
+    
+    Results arrive column-wise ({'columns': [...], 'data': [one list per column]}),
+    so pandas builds each column in one allocation.
+    """
+    columns = results.get('columns', [])
+    return pd.DataFrame(dict(zip(columns, results.get('data', []))), columns=columns, copy=False)
+
 def display_data_table(data: Dict[str, Any]):
     """Display data table if available"""
     if not data or 'results' not in data:
         return
     
     results = data['results']
-    if not results:
+    if not results or not results.get('columns'):
         return
     
     try:
-        df = pd.DataFrame(results)
+        df = _results_frame(results)
         if not df.empty:
             st.subheader("Query Results")
+            
+            # The SQL agent only ships the first rows of large results
+            row_count = data.get('row_count', len(df))
+            if row_count > len(df):
+                st.caption(f"Showing the first {len(df)} of {row_count} rows")
+            
             st.dataframe(df, use_container_width=True)
             
             # Show summary stats
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Rows", len(df))
+                st.metric("Rows", row_count)
             with col2:
                 st.metric("Columns", len(df.columns))
             with col3:
@@ -181,6 +251,47 @@ def display_context_info(context: Dict[str, Any]):
             st.write("**SQL Query:**")
             st.code(context['sql'], language='sql')
 
+def display_message(message: Dict[str, Any]):
+    """Display a stored chat message with its visualization, data and context"""
+    if message['role'] == 'user':
+        display_chat_message({'content': message['content']}, is_user=True)
+        return
+    
+    display_chat_message({
+        'content': message['content'],
+        'intent': message.get('intent', 'general')
+    })
+    
+    # Display additional data if available
+    if message.get('visualization'):
+        display_visualization(message['visualization'], message)
+    
+    if message.get('data'):
+        display_data_table(message['data'])
+    
+    if message.get('context'):
+        display_context_info(message['context'])
+
+def _select_example(query: str):
+    """Queue an example query for the next full run"""
+    st.session_state.example_query = query
+    st.session_state.example_clicked = True
+
+@st.fragment
+def render_example_queries():
+    """Example query buttons, rerendered on their own when clicked"""
+    st.subheader("Example Queries")
+    
+    for cat_idx, (category, queries) in enumerate(EXAMPLE_QUERIES.items()):
+        with st.expander(category):
+            for q_idx, query in enumerate(queries):
+                st.button(query, key=f"ex_{cat_idx}_{q_idx}",
+                          on_click=_select_example, args=(query,))
+    
+    # A click only reruns this fragment; escalate once so main() sends the query
+    if st.session_state.pop('example_clicked', False):
+        st.rerun()
+
 def main():
     """Main Streamlit app"""
     
@@ -208,30 +319,7 @@ def main():
             st.rerun()
         
         # Example queries
-        st.subheader("Example Queries")
-        examples = {
-            "📊 Data Analysis": [
-                "What were our total sales last month?",
-                "Show me the top 5 customers by revenue",
-                "How many new customers this quarter?"
-            ],
-            "📄 Document Search": [
-                "What does our policy say about remote work?",
-                "Show me the Q3 performance highlights",
-                "Find information about our product features"
-            ],
-            "❓ General Questions": [
-                "What is a KPI?",
-                "Explain data visualization best practices",
-                "How does business intelligence work?"
-            ]
-        }
-        
-        for category, queries in examples.items():
-            with st.expander(category):
-                for query in queries:
-                    if st.button(query, key=f"example_{hash(query)}"):
-                        st.session_state.example_query = query
+        render_example_queries()
         
         # Debug info
         with st.expander("Debug Info", expanded=False):
@@ -243,30 +331,15 @@ def main():
         st.session_state.messages = []
     
     if 'session_id' not in st.session_state:
-        st.session_state.session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        # Random rather than timestamped, so sessions started in the same second stay apart
+        st.session_state.session_id = f"session_{secrets.token_urlsafe(9)}"
     
     # Display chat history
     chat_container = st.container()
     
     with chat_container:
-        for i, message in enumerate(st.session_state.messages):
-            if message['role'] == 'user':
-                display_chat_message({'content': message['content']}, is_user=True)
-            else:
-                display_chat_message({
-                    'content': message['content'],
-                    'intent': message.get('intent', 'general')
-                })
-                
-                # Display additional data if available
-                if message.get('visualization'):
-                    display_visualization(message['visualization'])
-                
-                if message.get('data'):
-                    display_data_table(message['data'])
-                
-                if message.get('context'):
-                    display_context_info(message['context'])
+        for message in st.session_state.messages:
+            display_message(message)
     
     # Chat input
     user_input = st.chat_input("Ask me anything about your data or documents...")
@@ -278,62 +351,55 @@ def main():
     
     if user_input:
         # Add user message to chat
-        st.session_state.messages.append({
+        user_message = {
             'role': 'user',
             'content': user_input
-        })
-        
-        # Show user message immediately
-        with chat_container:
-            display_chat_message({'content': user_input}, is_user=True)
+        }
+        st.session_state.messages.append(user_message)
         
-        # Process with chatbot
-        with st.spinner("Thinking..."):
-            try:
-                response = orchestrator.chat(user_input, st.session_state.session_id)
-                
-                # Add bot response to chat
-                bot_message = {
-                    'role': 'assistant',
-                    'content': response['response'],
-                    'intent': response.get('intent', 'general')
-                }
-                
-                # Add additional data if available
-                if response.get('visualization'):
-                    bot_message['visualization'] = response['visualization']
-                
-                if response.get('context'):
-                    bot_message['context'] = response['context']
-                
-                # For SQL queries, include data
-                if response.get('intent') == 'sql' and 'context' in response:
-                    context = response['context']
-                    if isinstance(context, dict) and 'results' in context:
-                        bot_message['data'] = context
+        # The history above was drawn before this turn was appended, so the new
+        # turn is rendered here exactly once, with the same path as the replay
+        try:
+            with chat_container:
+                display_message(user_message)
                 
-                st.session_state.messages.append(bot_message)
-                
-                # Display bot response
-                with chat_container:
-                    display_chat_message({
-                        'content': response['response'],
-                        'intent': response.get('intent', 'general')
-                    })
-                    
-                    # Display additional data
-                    if bot_message.get('visualization'):
-                        display_visualization(bot_message['visualization'])
-                    
-                    if bot_message.get('data'):
-                        display_data_table(bot_message['data'])
-                    
-                    if bot_message.get('context'):
-                        display_context_info(bot_message['context'])
-                
-            except Exception as e:
-                st.error(f"Error processing your request: {str(e)}")
-                logger.error(f"Chat processing error: {str(e)}")
+                # Stream tokens as they arrive
+                placeholder = st.empty()
+                placeholder.write_stream(
+                    orchestrator.chat_stream(user_input, st.session_state.session_id)
+                )
+            
+            response = orchestrator.get_stream_result(st.session_state.session_id)
+            
+            # Add bot response to chat
+            bot_message = {
+                'role': 'assistant',
+                'content': response['response'],
+                'intent': response.get('intent', 'general')
+            }
+            
+            # Add additional data if available
+            if response.get('visualization'):
+                bot_message['visualization'] = response['visualization']
+            
+            if response.get('context'):
+                bot_message['context'] = response['context']
+            
+            # For SQL queries, include data
+            if response.get('intent') == 'sql' and 'context' in response:
+                context = response['context']
+                if isinstance(context, dict) and 'results' in context:
+                    bot_message['data'] = context
+            
+            st.session_state.messages.append(bot_message)
+            
+            # Replace the streamed text with the styled bot response
+            with placeholder.container():
+                display_message(bot_message)
+            
+        except Exception as e:
+            st.error(f"Error processing your request: {str(e)}")
+            logger.error(f"Chat processing error: {str(e)}")
     
     # Footer
     st.markdown("---")
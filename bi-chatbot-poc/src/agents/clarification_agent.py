@@ -3,12 +3,60 @@ Clarification Agent for handling vague queries and asking follow-up questions.
 Helps users refine their queries for better results.
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+from collections import OrderedDict
+from functools import lru_cache
+from string import Template
+import asyncio
 import logging
+import re
+import threading
 from ..core.lm_studio_client import LMStudioClient
+from ..utils import compile_keyword_pattern, format_history, loads_lenient_json
 
 logger = logging.getLogger(__name__)
 
+# Matches the intent field as soon as it has streamed in, before the rest of the JSON
+_LIKELY_INTENT_RE = re.compile(r'"likely_intent"\s*:\s*"(rag|sql|general)"')
+
+HistoryKey = Tuple[Tuple[str, str], ...]
+
+_BASE_CLARIFICATION = "I'd be happy to help you with that! To give you the most relevant information, I need a bit more detail."
+
+_FALLBACK_QUESTIONS = {
+    'rag': (
+        "What specific topic or document are you looking for?",
+        "Are you looking for information from reports, policies, or other documents?"
+    ),
+    'sql': (
+        "What specific data or metrics are you interested in?",
+        "Are you looking for sales data, customer information, or something else?",
+        "What time period should I focus on?"
+    ),
+    'general': (
+        "What specific information are you looking for?",
+        "Are you asking about company data or general information?"
+    )
+}
+
+_EXAMPLE_QUERIES = {
+    'rag': """For example, you could ask:
+• "What does our employee handbook say about vacation policies?"
+• "Show me information about our Q3 performance report"
+• "What are the key findings from the market research document?"
+""",
+    'sql': """For example, you could ask:
+• "What were our total sales last month?"
+• "Show me the top 5 customers by revenue"
+• "How many new customers did we acquire this quarter?"
+""",
+    'general': """For example, you could ask:
+• "What is business intelligence and how does it work?"
+• "Explain the difference between KPIs and metrics"
+• "What are best practices for data visualization?"
+"""
+}
+
 class ClarificationAgent:
     """Agent for handling vague queries and providing clarifications"""
     
@@ -20,10 +68,85 @@ class ClarificationAgent:
             'information', 'data', 'report', 'analysis'
         ]
         
+        # Keyword sets are compiled once so each check is a single regex scan
+        self._guess_rag_re = compile_keyword_pattern(['document', 'report', 'file', 'pdf'])
+        self._guess_sql_re = compile_keyword_pattern(['data', 'sales', 'revenue', 'customer', 'analytics'])
+        # Anchored with match(), so this is a single-pass startswith over all prefixes
+        self._general_prefix_re = compile_keyword_pattern([
+            'what', 'how', 'why', 'tell me about', 'show me', 'help me with',
+            'i want', 'i need', 'can you', 'give me', 'find', 'search'
+        ])
+        self._specific_re = compile_keyword_pattern([
+            'sales', 'revenue', 'customer', 'product', 'report', 'document',
+            'last month', 'this year', 'quarterly', 'top', 'best', 'worst',
+            'how many', 'how much', 'what is the', 'show me the'
+        ])
+        self._clue_rag_re = compile_keyword_pattern(
+            ['document', 'report', 'file', 'policy', 'handbook', 'paper', 'study']
+        )
+        self._clue_sql_re = compile_keyword_pattern(
+            ['data', 'sales', 'revenue', 'customer', 'metric', 'analytics', 'number']
+        )
+        
+        # Prompt templates are parsed once and filled per call
+        self._analyze_tpl = Template("""Analyze this user query to understand what clarifications are needed.
+
+Previous conversation:
+$context
+
+Current user query: "$user_input"
+
+Analyze:
+1. What type of information is the user likely looking for? (documents, data analysis, general knowledge)
+2. What specific details are missing?
+3. What clarification questions would help?
+
+Respond in JSON format:
+{
+    "likely_intent": "rag|sql|general",
+    "missing_details": ["detail1", "detail2"],
+    "suggested_questions": ["question1", "question2", "question3"],
+    "vagueness_level": "high|medium|low",
+    "context_available": true/false
+}
+""")
+        self._clarify_tpl = Template("""You are a helpful BI assistant. The user has asked a vague question that needs clarification.
+
+Previous conversation:
+$context
+
+User's vague query: "$user_input"
+
+Analysis shows:
+- Likely intent: $likely_intent
+- Missing details: $missing_details
+
+Suggested clarification questions:
+$suggested_questions
+
+Instructions:
+1. Acknowledge the user's request warmly
+2. Explain briefly why you need more information
+3. Ask 2-3 specific clarification questions
+4. Provide examples if helpful
+5. Be encouraging and helpful
+6. If you can guess the intent, mention what you can help with
+
+Generate a friendly clarification response:""")
+        
+        # Raw LLM analyses keyed on (normalized input, recent history), least recent first
+        self._analysis_cache: "OrderedDict[Tuple[str, HistoryKey], str]" = OrderedDict()
+        self._analysis_cache_size = 2048
+        self._analysis_cache_lock = threading.Lock()
+        
     def process(self, user_input: str, conversation_history: List[Dict[str, str]], 
                 clarification_questions: Optional[List[str]] = None) -> str:
         """Process vague query and generate clarification questions"""
         try:
+            fast_response = self._fast_path_response(user_input, clarification_questions)
+            if fast_response is not None:
+                return fast_response
+            
             # Analyze the vague query
             analysis = self._analyze_vague_query(user_input, conversation_history)
             
@@ -41,121 +164,248 @@ class ClarificationAgent:
             logger.error(f"Error in clarification processing: {str(e)}")
             return "I'd like to help you better. Could you please provide more specific details about what you're looking for?"
     
+    def process_stream(self, user_input: str, conversation_history: List[Dict[str, str]], 
+                       clarification_questions: Optional[List[str]] = None) -> Iterator[str]:
+        """Process vague query, yielding the clarification response as it is generated"""
+        try:
+            fast_response = self._fast_path_response(user_input, clarification_questions)
+            if fast_response is not None:
+                yield fast_response
+                return
+            
+            analysis = self._analyze_vague_query(user_input, conversation_history)
+            
+            yield from self._generate_clarification_response_stream(
+                user_input, 
+                analysis, 
+                conversation_history,
+                clarification_questions
+            )
+            
+        except Exception as e:
+            logger.error(f"Error in clarification processing: {str(e)}")
+            yield "I'd like to help you better. Could you please provide more specific details about what you're looking for?"
+    
+    async def aprocess(self, user_input: str, conversation_history: List[Dict[str, str]], 
+                       clarification_questions: Optional[List[str]] = None) -> str:
+        """Async version of process
+        
+        Streams the vague-query analysis and starts a speculative response as
+        soon as its likely_intent field arrives, overlapping the response call
+        with the rest of the analysis. The response is only regenerated when
+        the completed analysis settles on a different intent.
+        """
+        try:
+            fast_response = self._fast_path_response(user_input, clarification_questions)
+            if fast_response is not None:
+                return fast_response
+            
+            loop = asyncio.get_running_loop()
+            intent_future = loop.create_future()
+            analysis_task = asyncio.create_task(
+                self._astream_analysis(user_input, conversation_history, intent_future)
+            )
+            await asyncio.wait({intent_future, analysis_task}, return_when=asyncio.FIRST_COMPLETED)
+            
+            speculative_task = None
+            if intent_future.done() and not analysis_task.done():
+                speculative_task = asyncio.create_task(
+                    self._agenerate_clarification_response(
+                        user_input, 
+                        {"likely_intent": intent_future.result(), "missing_details": []}, 
+                        conversation_history,
+                        clarification_questions
+                    )
+                )
+            
+            analysis = await analysis_task
+            
+            if speculative_task is not None:
+                if analysis.get('likely_intent', 'general') == intent_future.result():
+                    return await speculative_task
+                speculative_task.cancel()
+            
+            return await self._agenerate_clarification_response(
+                user_input, 
+                analysis, 
+                conversation_history,
+                clarification_questions
+            )
+            
+        except Exception as e:
+            logger.error(f"Error in clarification processing: {str(e)}")
+            return "I'd like to help you better. Could you please provide more specific details about what you're looking for?"
+    
+    def _fast_path_response(self, user_input: str, 
+                            clarification_questions: Optional[List[str]] = None) -> Optional[str]:
+        """Static clarification for queries whose intent keywords are already clear
+        
+        Questions from the intent classifier are asked when there are any. Returns
+        None when the LLM path should be used instead.
+        """
+        if not self.config.get('clarification_fast_path_enabled', True):
+            logger.info("clarification_path=llm")
+            return None
+        
+        clues = self.extract_intent_clues(user_input)
+        if clues['confidence'] >= 0.7:
+            logger.info(f"clarification_path=fastpath intent={clues['possible_intent']}")
+            return self._generate_fallback_clarification(
+                user_input, clues['possible_intent'], clarification_questions
+            )
+        
+        logger.info("clarification_path=llm")
+        return None
+    
+    def _history_key(self, history: List[Dict[str, str]]) -> HistoryKey:
+        """Hashable form of the last two exchanges, used in the analysis prompt and cache key"""
+        return tuple((h.get('user', ''), h.get('bot', '')) for h in history[-2:])
+    
+    def _build_analysis_prompt(self, user_input: str, history_key: HistoryKey) -> str:
+        """Build the prompt for analyzing a vague query"""
+        return self._analyze_tpl.substitute(
+            context=format_history(history_key, bot_label="Bot"),
+            user_input=user_input
+        )
+    
+    def _parse_analysis(self, response: str, user_input: str, history: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Parse the LLM analysis response, falling back to a keyword-based analysis"""
+        try:
+            return loads_lenient_json(response)
+        except ValueError:
+            # Fallback analysis
+            return {
+                "likely_intent": self._guess_intent(user_input),
+                "missing_details": ["specific topic", "time period", "data type"],
+                "suggested_questions": [
+                    "What specific information are you looking for?",
+                    "Are you asking about company data or general information?",
+                    "What time period are you interested in?"
+                ],
+                "vagueness_level": "high",
+                "context_available": len(history) > 0
+            }
+    
+    def _default_analysis(self) -> Dict[str, Any]:
+        """Analysis used when the LLM call fails"""
+        return {
+            "likely_intent": "general",
+            "missing_details": ["specifics"],
+            "suggested_questions": ["Could you be more specific?"],
+            "vagueness_level": "high",
+            "context_available": False
+        }
+    
+    def _get_cached_analysis(self, key: Tuple[str, HistoryKey]) -> Optional[str]:
+        """Look up a raw analysis, marking it as recently used"""
+        with self._analysis_cache_lock:
+            response = self._analysis_cache.get(key)
+            if response is not None:
+                self._analysis_cache.move_to_end(key)
+            return response
+    
+    def _cache_analysis(self, key: Tuple[str, HistoryKey], response: str):
+        """Store a raw analysis, evicting the least recently used one when full"""
+        with self._analysis_cache_lock:
+            self._analysis_cache[key] = response
+            self._analysis_cache.move_to_end(key)
+            if len(self._analysis_cache) > self._analysis_cache_size:
+                self._analysis_cache.popitem(last=False)
+    
+    def _request_analysis(self, user_input_norm: str, history_key: HistoryKey) -> str:
+        """Get the raw JSON analysis from the cache or the LLM"""
+        key = (user_input_norm, history_key)
+        response = self._get_cached_analysis(key)
+        
+        if response is None:
+            prompt = self._build_analysis_prompt(user_input_norm, history_key)
+            response = self.llm_client.generate_batched(prompt, max_tokens=300, temperature=0.3)
+            self._cache_analysis(key, response)
+        
+        return response
+    
     def _analyze_vague_query(self, user_input: str, history: List[Dict[str, str]]) -> Dict[str, Any]:
         """Analyze what makes the query vague and what clarifications are needed"""
+        try:
+            response = self._request_analysis(user_input.lower().strip(), self._history_key(history))
+            return self._parse_analysis(response, user_input, history)
+                
+        except Exception as e:
+            logger.error(f"Error analyzing vague query: {str(e)}")
+            return self._default_analysis()
+    
+    async def _astream_analysis(self, user_input: str, history: List[Dict[str, str]], 
+                                intent_future: "asyncio.Future[str]") -> Dict[str, Any]:
+        """Async, streaming version of _analyze_vague_query
         
-        # Build context from conversation
-        context = ""
-        if history:
-            context = "\n".join([f"User: {h.get('user', '')}\nBot: {h.get('bot', '')}" for h in history[-2:]])
+        Resolves intent_future with the likely intent as soon as it appears in
+        the stream. Cached analyses resolve it immediately.
+        """
+        key = (user_input.lower().strip(), self._history_key(history))
         
-        prompt = f"""Analyze this user query to understand what clarifications are needed.
-
-Previous conversation:
-{context}
-
-Current user query: "{user_input}"
-
-Analyze:
-1. What type of information is the user likely looking for? (documents, data analysis, general knowledge)
-2. What specific details are missing?
-3. What clarification questions would help?
-
-Respond in JSON format:
-{{
-    "likely_intent": "rag|sql|general",
-    "missing_details": ["detail1", "detail2"],
-    "suggested_questions": ["question1", "question2", "question3"],
-    "vagueness_level": "high|medium|low",
-    "context_available": true/false
-}}
-"""
-
         try:
-            response = self.llm_client.generate(prompt, max_tokens=300, temperature=0.3)
+            response = self._get_cached_analysis(key)
             
-            # Parse JSON response (simplified)
-            import json
-            try:
-                analysis = json.loads(response.strip())
-                return analysis
-            except:
-                # Fallback analysis
-                return {
-                    "likely_intent": self._guess_intent(user_input),
-                    "missing_details": ["specific topic", "time period", "data type"],
-                    "suggested_questions": [
-                        "What specific information are you looking for?",
-                        "Are you asking about company data or general information?",
-                        "What time period are you interested in?"
-                    ],
-                    "vagueness_level": "high",
-                    "context_available": len(history) > 0
-                }
+            if response is None:
+                prompt = self._build_analysis_prompt(*key)
+                response = ""
+                
+                async for chunk in self.llm_client.agenerate_stream(prompt, max_tokens=300, temperature=0.3):
+                    response += chunk
+                    if not intent_future.done():
+                        match = _LIKELY_INTENT_RE.search(response)
+                        if match:
+                            intent_future.set_result(match.group(1))
                 
+                self._cache_analysis(key, response)
+            
+            analysis = self._parse_analysis(response, user_input, history)
+            
         except Exception as e:
             logger.error(f"Error analyzing vague query: {str(e)}")
-            return {
-                "likely_intent": "general",
-                "missing_details": ["specifics"],
-                "suggested_questions": ["Could you be more specific?"],
-                "vagueness_level": "high",
-                "context_available": False
-            }
+            analysis = self._default_analysis()
+        
+        if not intent_future.done():
+            intent_future.set_result(analysis.get('likely_intent', 'general'))
+        
+        return analysis
     
     def _guess_intent(self, user_input: str) -> str:
         """Simple intent guessing based on keywords"""
         user_lower = user_input.lower()
         
-        if any(word in user_lower for word in ['document', 'report', 'file', 'pdf']):
+        if self._guess_rag_re.search(user_lower):
             return 'rag'
-        elif any(word in user_lower for word in ['data', 'sales', 'revenue', 'customer', 'analytics']):
+        elif self._guess_sql_re.search(user_lower):
             return 'sql'
         else:
             return 'general'
     
+    def _build_clarification_prompt(self, user_input: str, analysis: Dict[str, Any], 
+                                    history: List[Dict[str, str]], 
+                                    predefined_questions: Optional[List[str]] = None) -> str:
+        """Build the prompt for a clarification response"""
+        
+        likely_intent = analysis.get('likely_intent', 'general')
+        suggested_questions = predefined_questions or analysis.get('suggested_questions', [])
+        
+        return self._clarify_tpl.substitute(
+            context=format_history(self._history_key(history)),
+            user_input=user_input,
+            likely_intent=likely_intent,
+            missing_details=', '.join(analysis.get('missing_details', [])),
+            suggested_questions="\n".join(f"- {q}" for q in suggested_questions[:3])
+        )
+    
     def _generate_clarification_response(self, user_input: str, analysis: Dict[str, Any], 
                                        history: List[Dict[str, str]], 
                                        predefined_questions: Optional[List[str]] = None) -> str:
         """Generate helpful clarification response"""
-        
         likely_intent = analysis.get('likely_intent', 'general')
-        suggested_questions = predefined_questions or analysis.get('suggested_questions', [])
-        
-        # Build conversation context
-        conversation_context = ""
-        if history:
-            conversation_context = "\n".join([
-                f"User: {h.get('user', '')}\nAssistant: {h.get('bot', '')}" 
-                for h in history[-2:]
-            ])
+        prompt = self._build_clarification_prompt(user_input, analysis, history, predefined_questions)
         
-        prompt = f"""You are a helpful BI assistant. The user has asked a vague question that needs clarification.
-
-Previous conversation:
-{conversation_context}
-
-User's vague query: "{user_input}"
-
-Analysis shows:
-- Likely intent: {likely_intent}
-- Missing details: {', '.join(analysis.get('missing_details', []))}
-
-Suggested clarification questions:
-{chr(10).join(f"- {q}" for q in suggested_questions[:3])}
-
-Instructions:
-1. Acknowledge the user's request warmly
-2. Explain briefly why you need more information
-3. Ask 2-3 specific clarification questions
-4. Provide examples if helpful
-5. Be encouraging and helpful
-6. If you can guess the intent, mention what you can help with
-
-Generate a friendly clarification response:"""
-
         try:
-            response = self.llm_client.generate(
+            response = self.llm_client.generate_batched(
                 prompt, 
                 max_tokens=self.config.get('max_response_tokens', 300),
                 temperature=0.4
@@ -167,62 +417,77 @@ Generate a friendly clarification response:"""
             logger.error(f"Error generating clarification response: {str(e)}")
             
             # Fallback clarification response
-            return self._generate_fallback_clarification(user_input, likely_intent)
+            return self._generate_fallback_clarification(user_input, likely_intent, predefined_questions)
     
-    def _generate_fallback_clarification(self, user_input: str, likely_intent: str) -> str:
-        """Generate a simple fallback clarification response"""
-        
-        base_response = "I'd be happy to help you with that! To give you the most relevant information, I need a bit more detail."
+    async def _agenerate_clarification_response(self, user_input: str, analysis: Dict[str, Any], 
+                                                history: List[Dict[str, str]], 
+                                                predefined_questions: Optional[List[str]] = None) -> str:
+        """Async version of _generate_clarification_response"""
+        likely_intent = analysis.get('likely_intent', 'general')
+        prompt = self._build_clarification_prompt(user_input, analysis, history, predefined_questions)
         
-        if likely_intent == 'rag':
-            specific_questions = [
-                "What specific topic or document are you looking for?",
-                "Are you looking for information from reports, policies, or other documents?"
-            ]
-        elif likely_intent == 'sql':
-            specific_questions = [
-                "What specific data or metrics are you interested in?",
-                "Are you looking for sales data, customer information, or something else?",
-                "What time period should I focus on?"
-            ]
-        else:
-            specific_questions = [
-                "What specific information are you looking for?",
-                "Are you asking about company data or general information?"
-            ]
+        try:
+            response = await self.llm_client.agenerate(
+                prompt, 
+                max_tokens=self.config.get('max_response_tokens', 300),
+                temperature=0.4
+            )
+            
+            return response.strip()
+            
+        except Exception as e:
+            logger.error(f"Error generating clarification response: {str(e)}")
+            return self._generate_fallback_clarification(user_input, likely_intent, predefined_questions)
+    
+    def _generate_clarification_response_stream(self, user_input: str, analysis: Dict[str, Any], 
+                                                history: List[Dict[str, str]], 
+                                                predefined_questions: Optional[List[str]] = None) -> Iterator[str]:
+        """Streaming counterpart of _generate_clarification_response"""
+        likely_intent = analysis.get('likely_intent', 'general')
+        prompt = self._build_clarification_prompt(user_input, analysis, history, predefined_questions)
         
-        questions_text = "\n".join(f"• {q}" for q in specific_questions[:2])
+        try:
+            yield from self.llm_client.generate_stream(
+                prompt, 
+                max_tokens=self.config.get('max_response_tokens', 300),
+                temperature=0.4
+            )
+            
+        except Exception as e:
+            logger.error(f"Error generating clarification response: {str(e)}")
+            yield self._generate_fallback_clarification(user_input, likely_intent, predefined_questions)
+    
+    def _generate_fallback_clarification(self, user_input: str, likely_intent: str, 
+                                         questions: Optional[List[str]] = None) -> str:
+        """Generate a simple fallback clarification response, asking the given questions if any"""
+        if questions:
+            return self._format_clarification(questions, likely_intent)
+        return self._fallback_clarification(likely_intent)
+    
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def _fallback_clarification(likely_intent: str) -> str:
+        """Fallback clarification text; it depends only on the intent, so it is built once per intent"""
+        specific_questions = _FALLBACK_QUESTIONS.get(likely_intent, _FALLBACK_QUESTIONS['general'])
+        return ClarificationAgent._format_clarification(specific_questions, likely_intent)
+    
+    @staticmethod
+    def _format_clarification(questions: List[str], likely_intent: str) -> str:
+        """Clarification text asking the first two questions, with example queries for the intent"""
+        questions_text = "\n".join(f"• {q}" for q in questions[:2])
         
-        examples = self._get_example_queries(likely_intent)
+        examples = ClarificationAgent._get_example_queries(likely_intent)
         
-        return f"""{base_response}
+        return f"""{_BASE_CLARIFICATION}
 
 {questions_text}
 
 {examples}"""
     
-    def _get_example_queries(self, intent: str) -> str:
+    @staticmethod
+    def _get_example_queries(intent: str) -> str:
         """Get example queries for different intents"""
-        
-        examples = {
-            'rag': """For example, you could ask:
-• "What does our employee handbook say about vacation policies?"
-• "Show me information about our Q3 performance report"
-• "What are the key findings from the market research document?"
-""",
-            'sql': """For example, you could ask:
-• "What were our total sales last month?"
-• "Show me the top 5 customers by revenue"
-• "How many new customers did we acquire this quarter?"
-""",
-            'general': """For example, you could ask:
-• "What is business intelligence and how does it work?"
-• "Explain the difference between KPIs and metrics"
-• "What are best practices for data visualization?"
-"""
-        }
-        
-        return examples.get(intent, "Let me know what specific information you're looking for!")
+        return _EXAMPLE_QUERIES.get(intent, "Let me know what specific information you're looking for!")
     
     def is_query_vague(self, user_input: str) -> bool:
         """Determine if a query is too vague and needs clarification"""
@@ -232,22 +497,11 @@ Generate a friendly clarification response:"""
         if len(user_input.split()) <= 2:
             return True
         
-        # Contains only very general terms
-        general_only_patterns = [
-            'what', 'how', 'why', 'tell me about', 'show me', 'help me with',
-            'i want', 'i need', 'can you', 'give me', 'find', 'search'
-        ]
-        
-        starts_with_general = any(user_lower.startswith(pattern) for pattern in general_only_patterns)
+        # Starts with only very general terms
+        starts_with_general = self._general_prefix_re.match(user_lower) is not None
         
         # Check if it contains specific enough content
-        specific_indicators = [
-            'sales', 'revenue', 'customer', 'product', 'report', 'document',
-            'last month', 'this year', 'quarterly', 'top', 'best', 'worst',
-            'how many', 'how much', 'what is the', 'show me the'
-        ]
-        
-        has_specifics = any(indicator in user_lower for indicator in specific_indicators)
+        has_specifics = self._specific_re.search(user_lower) is not None
         
         # Query is vague if it starts with general terms but lacks specifics
         return starts_with_general and not has_specifics
@@ -262,13 +516,11 @@ Generate a friendly clarification response:"""
             'confidence': 0.5
         }
         
-        # Document/RAG keywords
-        rag_keywords = ['document', 'report', 'file', 'policy', 'handbook', 'paper', 'study']
-        found_rag = [kw for kw in rag_keywords if kw in user_lower]
+        # Document/RAG keywords, deduplicated in order of appearance
+        found_rag = list(dict.fromkeys(self._clue_rag_re.findall(user_lower)))
         
         # Data/SQL keywords  
-        sql_keywords = ['data', 'sales', 'revenue', 'customer', 'metric', 'analytics', 'number']
-        found_sql = [kw for kw in sql_keywords if kw in user_lower]
+        found_sql = list(dict.fromkeys(self._clue_sql_re.findall(user_lower)))
         
         if found_rag:
             clues['possible_intent'] = 'rag'
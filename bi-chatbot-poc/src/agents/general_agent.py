@@ -3,9 +3,11 @@ General Agent for handling general knowledge queries.
 Uses LLM for broad questions not related to company-specific data.
 """
 
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterator
+from string import Template
 import logging
 from ..core.lm_studio_client import LMStudioClient
+from ..utils import compile_keyword_pattern, format_history
 
 logger = logging.getLogger(__name__)
 
@@ -15,35 +17,20 @@ class GeneralAgent:
     def __init__(self, config: Dict[str, Any], llm_client: LMStudioClient):
         self.config = config
         self.llm_client = llm_client
+        self._bi_keywords_re = compile_keyword_pattern([
+            'data', 'analytics', 'report', 'dashboard', 'metric', 'kpi', 
+            'business intelligence', 'visualization', 'chart', 'graph',
+            'sales', 'revenue', 'profit', 'customer', 'performance',
+            'trend', 'analysis', 'insight', 'database', 'query'
+        ])
         
-    def process(self, user_input: str, conversation_history: List[Dict[str, str]]) -> str:
-        """Process general knowledge query"""
-        try:
-            response = self._generate_response(user_input, conversation_history)
-            return response
-            
-        except Exception as e:
-            logger.error(f"Error in general processing: {str(e)}")
-            return "I apologize, but I encountered an error while processing your question. Please try again."
-    
-    def _generate_response(self, user_input: str, history: List[Dict[str, str]]) -> str:
-        """Generate response for general knowledge queries"""
-        
-        # Build conversation context
-        conversation_context = ""
-        if history:
-            recent_history = history[-3:]  # Last 3 exchanges
-            conversation_context = "\n".join([
-                f"User: {h.get('user', '')}\nAssistant: {h.get('bot', '')}" 
-                for h in recent_history
-            ])
-        
-        prompt = f"""You are a helpful BI assistant. While your main expertise is in business intelligence and data analysis, you can also help with general questions.
+        # Prompt template is parsed once and filled per call
+        self._prompt_tpl = Template("""You are a helpful BI assistant. While your main expertise is in business intelligence and data analysis, you can also help with general questions.
 
 Previous conversation:
-{conversation_context}
+$context
 
-User's question: {user_input}
+User's question: $user_input
 
 Instructions:
 1. Answer the user's question clearly and helpfully
@@ -54,10 +41,44 @@ Instructions:
 6. If the question could relate to data analysis, suggest how it might be relevant to BI
 7. Don't make up specific facts or statistics
 
-Response:"""
-
+Response:""")
+        
+    def process(self, user_input: str, conversation_history: List[Dict[str, str]]) -> str:
+        """Process general knowledge query"""
+        try:
+            response = self._generate_response(user_input, conversation_history)
+            return response
+            
+        except Exception as e:
+            logger.error(f"Error in general processing: {str(e)}")
+            return "I apologize, but I encountered an error while processing your question. Please try again."
+    
+    def process_stream(self, user_input: str, conversation_history: List[Dict[str, str]]) -> Iterator[str]:
+        """Process general knowledge query, yielding response tokens as they arrive"""
+        try:
+            yield from self._generate_response_stream(user_input, conversation_history)
+            
+        except Exception as e:
+            logger.error(f"Error in general processing: {str(e)}")
+            yield "I apologize, but I encountered an error while processing your question. Please try again."
+    
+    def _build_prompt(self, user_input: str, history: List[Dict[str, str]]) -> str:
+        """Build the prompt for general knowledge queries"""
+        
+        # Last 3 exchanges
+        recent_history = [(h.get('user', ''), h.get('bot', '')) for h in history[-3:]]
+        
+        return self._prompt_tpl.substitute(
+            context=format_history(recent_history),
+            user_input=user_input
+        )
+    
+    def _generate_response(self, user_input: str, history: List[Dict[str, str]]) -> str:
+        """Generate response for general knowledge queries"""
+        prompt = self._build_prompt(user_input, history)
+        
         try:
-            response = self.llm_client.generate(
+            response = self.llm_client.generate_batched(
                 prompt, 
                 max_tokens=self.config.get('max_response_tokens', 400),
                 temperature=0.4
@@ -69,17 +90,24 @@ Response:"""
             logger.error(f"Error generating general response: {str(e)}")
             return "I'm having trouble generating a response right now. Could you please try rephrasing your question?"
     
+    def _generate_response_stream(self, user_input: str, history: List[Dict[str, str]]) -> Iterator[str]:
+        """Streaming counterpart of _generate_response"""
+        prompt = self._build_prompt(user_input, history)
+        
+        try:
+            yield from self.llm_client.generate_stream(
+                prompt, 
+                max_tokens=self.config.get('max_response_tokens', 400),
+                temperature=0.4
+            )
+            
+        except Exception as e:
+            logger.error(f"Error generating general response: {str(e)}")
+            yield "I'm having trouble generating a response right now. Could you please try rephrasing your question?"
+    
     def is_bi_related(self, user_input: str) -> bool:
         """Check if the query might be BI-related for potential routing suggestions"""
-        bi_keywords = [
-            'data', 'analytics', 'report', 'dashboard', 'metric', 'kpi', 
-            'business intelligence', 'visualization', 'chart', 'graph',
-            'sales', 'revenue', 'profit', 'customer', 'performance',
-            'trend', 'analysis', 'insight', 'database', 'query'
-        ]
-        
-        user_lower = user_input.lower()
-        return any(keyword in user_lower for keyword in bi_keywords)
+        return self._bi_keywords_re.search(user_input.lower()) is not None
     
     def suggest_bi_alternative(self, user_input: str) -> str:
         """Suggest how the query might be answered with BI data"""
@@ -3,9 +3,17 @@ Main orchestrator using LangGraph for BI chatbot workflow.
 Determines which agent to route queries to and manages conversation flow.
 """
 
-from typing import TypedDict, List, Any, Dict
+from typing import TypedDict, List, Any, Dict, Iterator, Optional, Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+import hashlib
+import json
+import queue
+import re
+import threading
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolExecutor
+import asyncio
 import logging
 
 from .rag_agent import RAGAgent
@@ -14,20 +22,160 @@ from .general_agent import GeneralAgent
 from .clarification_agent import ClarificationAgent
 from ..core.conversation_memory import ConversationMemory
 from ..core.lm_studio_client import LMStudioClient
+from ..utils import TTLCache, loads_lenient_json, select_relevant_history
 
 logger = logging.getLogger(__name__)
 
+# Exchanges kept in the conversation history
+MAX_HISTORY_EXCHANGES = 10
+
+# Static instructions lead the classification prompt so every call shares a byte-identical prefix
+_CLASSIFY_PREFIX = """Analyze the user's query and classify it into one of these categories:
+1. "rag" - Questions about documents, reports, unstructured data
+2. "sql" - Questions about data analysis, metrics, structured data queries
+3. "general" - General knowledge questions not related to company data
+4. "clarification" - Vague queries that need clarification
+
+Respond with JSON format:
+{
+    "intent": "rag|sql|general|clarification",
+    "confidence": 0.8,
+    "needs_clarification": false,
+    "clarification_questions": []
+}
+"""
+
+# Constrains the classification reply to the JSON above, so it stays short and parseable
+_CLASSIFY_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "intent_classification",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "intent": {"type": "string", "enum": ["rag", "sql", "general", "clarification"]},
+                "confidence": {"type": "number"},
+                "needs_clarification": {"type": "boolean"},
+                "clarification_questions": {"type": "array", "items": {"type": "string"}, "maxItems": 2}
+            },
+            "required": ["intent", "confidence", "needs_clarification", "clarification_questions"]
+        }
+    }
+}
+
+# Phrasings that unambiguously ask for data or for documents; a query matching
+# exactly one of them is routed without an LLM call. A data query needs both an
+# aggregation and a metric, so "show me the highlights" or "step by step" still
+# go to the LLM, and so does "show me data", which needs clarification
+_SQL_QUERY_RE = re.compile(r"\b(show|list|top|average|avg|sum|total|count|how many|trend)\b", re.I)
+_SQL_METRIC_RE = re.compile(
+    r"\b(sales|revenue|orders?|customers?|products?|profit|margin|units|quantity|spend|transactions?)\b",
+    re.I
+)
+_RAG_QUERY_RE = re.compile(r"\b(report|document|policy|memo|pdf|article|what does .* say)\b", re.I)
+
+# Static instructions for the single routing call: the model answers general
+# questions itself and calls a tool for everything that needs another agent
+_ROUTE_INSTRUCTIONS = """You are a helpful BI assistant. While your main expertise is in business intelligence and data analysis, you can also help with general questions.
+
+Decide how to handle the user's query:
+- Questions about documents, reports, unstructured data: call route_to_rag
+- Questions about data analysis, metrics, structured data queries: call route_to_sql
+- Vague queries that need clarification: call ask_clarification
+- General knowledge questions not related to company data: answer directly
+
+When answering directly:
+1. Answer the user's question clearly and helpfully
+2. For general questions, give accurate and concise answers
+3. If you're not sure about something, acknowledge the uncertainty
+4. Keep your tone professional but friendly
+5. Don't make up specific facts or statistics
+"""
+
+_CONFIDENCE_PARAMETERS = {
+    "type": "object",
+    "properties": {
+        "confidence": {
+            "type": "number",
+            "description": "How sure you are that this is the right route, from 0 to 1"
+        }
+    },
+    "required": ["confidence"]
+}
+
+# Tools offered to the routing call, keyed back to the intent each one selects
+_ROUTING_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "route_to_rag",
+            "description": "Answer from company documents, reports and other unstructured data",
+            "parameters": _CONFIDENCE_PARAMETERS
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "route_to_sql",
+            "description": "Answer by querying company data: metrics, aggregations, structured data",
+            "parameters": _CONFIDENCE_PARAMETERS
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "route_to_general",
+            "description": "Hand a general knowledge question to the general assistant instead of answering it here",
+            "parameters": {"type": "object", "properties": {}}
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "ask_clarification",
+            "description": "Ask the user to clarify a vague query",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "questions": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Specific questions to ask the user"
+                    }
+                }
+            }
+        }
+    }
+]
+_TOOL_INTENTS = {
+    "route_to_rag": "rag",
+    "route_to_sql": "sql",
+    "route_to_general": "general",
+    "ask_clarification": "clarification"
+}
+
+# Context keys carrying full payloads; history keeps only the lightweight references around them
+_BULKY_CONTEXT_KEYS = ("results", "snippets")
+
 class ChatState(TypedDict):
-    """State object for LangGraph workflow"""
+    """State object for LangGraph workflow
+    
+    Nodes read the fields they use more than once into locals on entry. When
+    token_sink is set, handlers that can stream pass their tokens to it as they
+    are generated.
+    """
     user_input: str
     conversation_history: List[Dict[str, str]]
     current_intent: str
+    intent_confidence: float
     needs_clarification: bool
     clarification_questions: List[str]
     response: str
     context_data: Dict[str, Any]
     visualization_data: Dict[str, Any]
     error: str
+    token_sink: Optional[Callable[[str], None]]
 
 class BiChatbotOrchestrator:
     """Main orchestrator class using LangGraph for workflow management"""
@@ -37,39 +185,102 @@ class BiChatbotOrchestrator:
         self.llm_client = LMStudioClient(config['lm_studio'])
         self.memory = ConversationMemory()
         
-        # Initialize agents
-        self.rag_agent = RAGAgent(config, self.llm_client)
-        self.sql_agent = SQLAgent(config, self.llm_client)
-        self.general_agent = GeneralAgent(config, self.llm_client)
-        self.clarification_agent = ClarificationAgent(config, self.llm_client)
+        # One tool-calling request routes the query and answers general questions;
+        # disable for models without tool support to use the classification prompt
+        self.tool_routing_enabled = config.get('tool_routing_enabled', True)
+        
+        # Obvious data or document queries skip the routing call entirely
+        self.intent_prefilter_enabled = config.get('intent_prefilter_enabled', True)
+        
+        # The classification reply is a tiny JSON object; schema-constrained
+        # decoding can be turned off for servers that reject response_format
+        self.classification_max_tokens = config.get('classification_max_tokens', 60)
+        self.classification_json_schema = config.get('classification_json_schema', True)
+        
+        # RAG and SQL run side by side when the classifier cannot decide between them
+        self.speculative_threshold = config.get('speculative_fanout_threshold', 0.7)
+        self._fanout_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="agent-fanout")
+        
+        # Parsed intent classifications keyed by a hash of the exact prompt
+        self._classification_cache = TTLCache(
+            maxsize=config.get('classification_cache_size', 1024),
+            ttl=config.get('classification_cache_ttl', 3600)
+        )
+        self.stats = {
+            "classification_cache_hits": 0,
+            "classification_cache_misses": 0,
+            "classification_prefilter_hits": 0
+        }
+        
+        # Final results of streamed chats, keyed by session
+        self._stream_results: Dict[str, Dict[str, Any]] = {}
+        
+        # Async agent calls share one long-lived event loop, so the LM Studio
+        # client keeps a single pooled async connection set across turns
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_loop_lock = threading.Lock()
         
         # Build the workflow graph
         self.workflow = self._build_workflow()
         
+    # Agents are built on first use, so a session that never needs the
+    # RAG or SQL pipelines never loads them
+    
+    @cached_property
+    def rag_agent(self) -> RAGAgent:
+        return RAGAgent(self.config, self.llm_client)
+    
+    @cached_property
+    def sql_agent(self) -> SQLAgent:
+        return SQLAgent(self.config, self.llm_client)
+    
+    @cached_property
+    def general_agent(self) -> GeneralAgent:
+        return GeneralAgent(self.config, self.llm_client)
+    
+    @cached_property
+    def clarification_agent(self) -> ClarificationAgent:
+        return ClarificationAgent(self.config, self.llm_client)
+    
+    def _run_async(self, coro):
+        """Run a coroutine on the orchestrator's event loop and wait for its result"""
+        with self._async_loop_lock:
+            if self._async_loop is None:
+                self._async_loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._async_loop.run_forever, name="orchestrator-loop", daemon=True
+                ).start()
+        
+        # The loop runs on its own thread, so this also works when the caller has a loop running
+        return asyncio.run_coroutine_threadsafe(coro, self._async_loop).result()
+    
     def _build_workflow(self) -> StateGraph:
         """Build the LangGraph workflow"""
         workflow = StateGraph(ChatState)
         
         # Add nodes
-        workflow.add_node("classify_intent", self._classify_intent)
+        workflow.add_node("route_or_answer", self._route_or_answer)
         workflow.add_node("clarification", self._handle_clarification)
         workflow.add_node("rag_processing", self._handle_rag)
         workflow.add_node("sql_processing", self._handle_sql)
         workflow.add_node("general_processing", self._handle_general)
+        workflow.add_node("speculative_fanout", self._handle_speculative_fanout)
         workflow.add_node("finalize_response", self._finalize_response)
         
         # Set entry point
-        workflow.set_entry_point("classify_intent")
+        workflow.set_entry_point("route_or_answer")
         
         # Add conditional edges
         workflow.add_conditional_edges(
-            "classify_intent",
+            "route_or_answer",
             self._route_after_classification,
             {
+                "answered": "finalize_response",
                 "clarification": "clarification",
                 "rag": "rag_processing",
                 "sql": "sql_processing",
-                "general": "general_processing"
+                "general": "general_processing",
+                "speculative": "speculative_fanout"
             }
         )
         
@@ -78,12 +289,102 @@ class BiChatbotOrchestrator:
         workflow.add_edge("rag_processing", "finalize_response")
         workflow.add_edge("sql_processing", "finalize_response")
         workflow.add_edge("general_processing", "finalize_response")
+        workflow.add_edge("speculative_fanout", "finalize_response")
         
         # End after finalization
         workflow.add_edge("finalize_response", END)
         
         return workflow.compile()
     
+    def _route_or_answer(self, state: ChatState) -> ChatState:
+        """Route the query with a single tool-calling request that answers general questions inline
+        
+        Falls back to the classification prompt when tool routing is disabled or fails.
+        """
+        # Follow-up questions depend on the conversation, which only the LLM sees
+        if self.intent_prefilter_enabled and not state.get("conversation_history"):
+            intent = self._prefilter_intent(state["user_input"])
+            if intent is not None:
+                self.stats["classification_prefilter_hits"] += 1
+                state["current_intent"] = intent
+                state["intent_confidence"] = 1.0
+                state["needs_clarification"] = False
+                logger.info(f"Routed intent: {intent} (prefilter)")
+                return state
+        
+        if not self.tool_routing_enabled:
+            return self._classify_intent(state)
+        
+        try:
+            routing_result = self._get_routing_decision(state["user_input"], state.get("conversation_history", []))
+            
+            state["current_intent"] = routing_result["intent"]
+            state["intent_confidence"] = float(routing_result.get("confidence", 0.5))
+            state["needs_clarification"] = routing_result["needs_clarification"]
+            state["clarification_questions"] = routing_result.get("clarification_questions", [])
+            state["response"] = routing_result.get("response", "")
+            
+        except Exception as e:
+            logger.warning(f"Tool routing failed, falling back to classification: {str(e)}")
+            return self._classify_intent(state)
+        
+        logger.info(f"Routed intent: {routing_result['intent']}" + (" (answered inline)" if state["response"] else ""))
+        
+        return state
+    
+    def _prefilter_intent(self, user_input: str) -> Optional[str]:
+        """Intent of an obvious data or document query, or None when the LLM has to decide"""
+        is_sql = _SQL_QUERY_RE.search(user_input) is not None and _SQL_METRIC_RE.search(user_input) is not None
+        is_rag = _RAG_QUERY_RE.search(user_input) is not None
+        
+        if is_sql and not is_rag:
+            return "sql"
+        if is_rag and not is_sql:
+            return "rag"
+        return None
+    
+    def _get_routing_decision(self, user_input: str, history: List[Dict]) -> Dict[str, Any]:
+        """Ask the LLM to either answer directly or call a routing tool"""
+        context = ""
+        if history:
+            context = "\n".join([
+                f"User: {h.get('user', '')}\nBot: {h.get('bot', '')}"
+                for h in select_relevant_history(user_input, history, k=3)
+            ])
+        
+        prompt = _ROUTE_INSTRUCTIONS + f"""
+Previous conversation:
+{context}
+
+User's question: {user_input}
+"""
+        
+        # Not cached: the call samples at the answering temperature, so one
+        # decision (and its confidence) must not be pinned for every repeat
+        result = self.llm_client.generate_with_tools(
+            prompt,
+            tools=_ROUTING_TOOLS,
+            max_tokens=self.config.get('max_response_tokens', 400),
+            temperature=0.4
+        )
+        
+        for call in result["tool_calls"]:
+            intent = _TOOL_INTENTS.get(call["name"])
+            if intent is None:
+                continue
+            arguments = call["arguments"]
+            return {
+                "intent": intent,
+                "confidence": arguments.get("confidence", 0.5) if intent in ("rag", "sql") else 1.0,
+                "needs_clarification": intent == "clarification",
+                "clarification_questions": arguments.get("questions", []) if intent == "clarification" else []
+            }
+        
+        if not result["content"]:
+            raise ValueError("Routing call returned neither a tool call nor an answer")
+        
+        return {"intent": "general", "needs_clarification": False, "response": result["content"]}
+    
     def _classify_intent(self, state: ChatState) -> ChatState:
         """Classify user intent to determine routing"""
         try:
@@ -94,6 +395,8 @@ class BiChatbotOrchestrator:
             classification_result = self._get_intent_classification(user_input, history)
             
             state["current_intent"] = classification_result["intent"]
+            # Keyword fallbacks carry no confidence and count as uncertain
+            state["intent_confidence"] = float(classification_result.get("confidence", 0.5))
             state["needs_clarification"] = classification_result["needs_clarification"]
             state["clarification_questions"] = classification_result.get("clarification_questions", [])
             
@@ -110,38 +413,47 @@ class BiChatbotOrchestrator:
         """Use LLM to classify user intent"""
         context = ""
         if history:
-            context = "\n".join([f"User: {h.get('user', '')}\nBot: {h.get('bot', '')}" for h in history[-3:]])
-        
-        prompt = f"""
-        Analyze the user's query and classify it into one of these categories:
-        1. "rag" - Questions about documents, reports, unstructured data
-        2. "sql" - Questions about data analysis, metrics, structured data queries
-        3. "general" - General knowledge questions not related to company data
-        4. "clarification" - Vague queries that need clarification
-        
-        Context from previous conversation:
-        {context}
-        
-        Current user query: "{user_input}"
-        
-        Respond with JSON format:
-        {{
-            "intent": "rag|sql|general|clarification",
-            "confidence": 0.8,
-            "needs_clarification": false,
-            "clarification_questions": [],
-            "reasoning": "brief explanation"
-        }}
-        """
+            context = "\n".join([
+                f"User: {h.get('user', '')}\nBot: {h.get('bot', '')}"
+                for h in select_relevant_history(user_input, history, k=3)
+            ])
         
-        response = self.llm_client.generate(prompt, max_tokens=200)
+        prompt = _CLASSIFY_PREFIX + f"""
+Context from previous conversation:
+{context}
+
+Current user query: "{user_input}"
+"""
+        
+        # Classification runs at temperature 0, so the same prompt always gets the same answer
+        cache_key = hashlib.sha256(json.dumps(
+            {"model": self.llm_client.model, "prompt": prompt, "temperature": 0},
+            sort_keys=True
+        ).encode()).hexdigest()
+        
+        cached = self._classification_cache.get(cache_key)
+        if cached is not None:
+            self.stats["classification_cache_hits"] += 1
+            return dict(cached)
         
-        # Parse JSON response (simplified - in production, use proper JSON parsing)
+        self.stats["classification_cache_misses"] += 1
+        extra = {"response_format": _CLASSIFY_RESPONSE_FORMAT} if self.classification_json_schema else {}
+        result = self._parse_intent_classification(
+            self.llm_client.generate(
+                prompt, max_tokens=self.classification_max_tokens, temperature=0.0, **extra
+            )
+        )
+        self._classification_cache.set(cache_key, result)
+        return dict(result)
+    
+    def _parse_intent_classification(self, response: str) -> Dict[str, Any]:
+        """Parse the classifier's reply, falling back to keyword matching"""
         try:
-            import json
-            result = json.loads(response.strip())
+            result = loads_lenient_json(response)
+            if not isinstance(result, dict) or "intent" not in result:
+                raise ValueError("Classification JSON has no intent")
             return result
-        except:
+        except ValueError:
             # Fallback if JSON parsing fails
             if "rag" in response.lower() or "document" in response.lower():
                 return {"intent": "rag", "needs_clarification": False}
@@ -158,7 +470,14 @@ class BiChatbotOrchestrator:
             return "clarification"
         
         intent = state["current_intent"]
-        if intent == "rag":
+        
+        # The routing call already answered a general question
+        if intent == "general" and state.get("response"):
+            return "answered"
+        
+        if intent in ("rag", "sql") and state.get("intent_confidence", 1.0) < self.speculative_threshold:
+            return "speculative"
+        elif intent == "rag":
             return "rag"
         elif intent == "sql":
             return "sql"
@@ -168,11 +487,11 @@ class BiChatbotOrchestrator:
     def _handle_clarification(self, state: ChatState) -> ChatState:
         """Handle clarification requests"""
         try:
-            response = self.clarification_agent.process(
+            response = self._run_async(self.clarification_agent.aprocess(
                 state["user_input"],
                 state["conversation_history"],
                 state.get("clarification_questions", [])
-            )
+            ))
             state["response"] = response
         except Exception as e:
             logger.error(f"Error in clarification processing: {str(e)}")
@@ -181,15 +500,31 @@ class BiChatbotOrchestrator:
         
         return state
     
+    def _pipe_stream(self, sink: Callable[[str], None], stream: Iterator[str]) -> Tuple[List[str], Any]:
+        """Pass every chunk of a stream to the sink, returning the chunks and the generator's return value"""
+        chunks = []
+        while True:
+            try:
+                chunk = next(stream)
+            except StopIteration as stop:
+                return chunks, stop.value
+            chunks.append(chunk)
+            sink(chunk)
+    
     def _handle_rag(self, state: ChatState) -> ChatState:
         """Handle RAG processing for unstructured data"""
         try:
-            result = self.rag_agent.process(
-                state["user_input"],
-                state["conversation_history"]
-            )
-            state["response"] = result["response"]
-            state["context_data"] = result.get("context", {})
+            sink = state.get("token_sink")
+            if sink is not None:
+                _, result = self._pipe_stream(
+                    sink, self.rag_agent.process_stream(state["user_input"], state["conversation_history"])
+                )
+            else:
+                result = self.rag_agent.process(
+                    state["user_input"],
+                    state["conversation_history"]
+                )
+            self._apply_rag_result(state, result)
         except Exception as e:
             logger.error(f"Error in RAG processing: {str(e)}")
             state["error"] = f"RAG processing error: {str(e)}"
@@ -200,13 +535,17 @@ class BiChatbotOrchestrator:
     def _handle_sql(self, state: ChatState) -> ChatState:
         """Handle SQL processing for structured data"""
         try:
-            result = self.sql_agent.process(
-                state["user_input"],
-                state["conversation_history"]
-            )
-            state["response"] = result["response"]
-            state["visualization_data"] = result.get("visualization", {})
-            state["context_data"] = result.get("data", {})
+            sink = state.get("token_sink")
+            if sink is not None:
+                _, result = self._pipe_stream(
+                    sink, self.sql_agent.process_stream(state["user_input"], state["conversation_history"])
+                )
+            else:
+                result = self.sql_agent.process(
+                    state["user_input"],
+                    state["conversation_history"]
+                )
+            self._apply_sql_result(state, result)
         except Exception as e:
             logger.error(f"Error in SQL processing: {str(e)}")
             state["error"] = f"SQL processing error: {str(e)}"
@@ -214,13 +553,76 @@ class BiChatbotOrchestrator:
         
         return state
     
+    def _apply_rag_result(self, state: ChatState, result: Dict[str, Any]):
+        """Copy a RAG agent result into the workflow state"""
+        state["response"] = result["response"]
+        state["context_data"] = result.get("context", {})
+    
+    def _apply_sql_result(self, state: ChatState, result: Dict[str, Any]):
+        """Copy a SQL agent result into the workflow state"""
+        state["response"] = result["response"]
+        state["visualization_data"] = result.get("visualization", {})
+        state["context_data"] = result.get("data", {})
+    
+    def _handle_speculative_fanout(self, state: ChatState) -> ChatState:
+        """Run RAG and SQL concurrently for an uncertain rag/sql intent and keep the better answer
+        
+        The classified intent wins unless its agent came back empty or failed
+        while the other one produced a result.
+        """
+        try:
+            user_input, history = state["user_input"], state["conversation_history"]
+            rag_future = self._fanout_executor.submit(self.rag_agent.process, user_input, history)
+            sql_future = self._fanout_executor.submit(self.sql_agent.process, user_input, history)
+            rag_result, sql_result = rag_future.result(), sql_future.result()
+            
+            candidates = [
+                ("rag", rag_result, self._rag_result_found(rag_result)),
+                ("sql", sql_result, self._sql_result_found(sql_result))
+            ]
+            if state["current_intent"] == "sql":
+                candidates.reverse()
+            
+            intent, result, _ = next((c for c in candidates if c[2]), candidates[0])
+            
+            state["current_intent"] = intent
+            if intent == "rag":
+                self._apply_rag_result(state, result)
+            else:
+                self._apply_sql_result(state, result)
+            
+            logger.info(f"Speculative fan-out kept {intent} result")
+            
+        except Exception as e:
+            logger.error(f"Error in speculative processing: {str(e)}")
+            state["error"] = f"Speculative processing error: {str(e)}"
+            state["response"] = "I encountered an error while processing your question. Please try rephrasing it."
+        
+        return state
+    
+    def _rag_result_found(self, result: Dict[str, Any]) -> bool:
+        """Whether a RAG result is backed by retrieved documents"""
+        return result.get("context", {}).get("retrieved_docs", 0) > 0
+    
+    def _sql_result_found(self, result: Dict[str, Any]) -> bool:
+        """Whether a SQL result returned rows without an error"""
+        data = result.get("data", {})
+        return not data.get("error") and data.get("row_count", 0) > 0
+    
     def _handle_general(self, state: ChatState) -> ChatState:
         """Handle general knowledge queries"""
         try:
-            response = self.general_agent.process(
-                state["user_input"],
-                state["conversation_history"]
-            )
+            sink = state.get("token_sink")
+            if sink is not None:
+                chunks, _ = self._pipe_stream(
+                    sink, self.general_agent.process_stream(state["user_input"], state["conversation_history"])
+                )
+                response = "".join(chunks).strip()
+            else:
+                response = self.general_agent.process(
+                    state["user_input"],
+                    state["conversation_history"]
+                )
             state["response"] = response
         except Exception as e:
             logger.error(f"Error in general processing: {str(e)}")
@@ -232,32 +634,72 @@ class BiChatbotOrchestrator:
     def _finalize_response(self, state: ChatState) -> ChatState:
         """Finalize the response and update conversation memory"""
         try:
+            intent = state["current_intent"]
+            context_data = state.get("context_data")
+            visualization = state.get("visualization_data")
+            
             # Update conversation history
             conversation_entry = {
                 "user": state["user_input"],
                 "bot": state["response"],
-                "intent": state["current_intent"],
+                "intent": intent,
                 "timestamp": self.memory.get_timestamp()
             }
             
-            # Add context data if available
-            if state.get("context_data"):
-                conversation_entry["context"] = state["context_data"]
-            if state.get("visualization_data"):
-                conversation_entry["visualization"] = state["visualization_data"]
+            # Add references to context data if available; the full payloads go
+            # back to the caller but are not carried or persisted in history
+            if context_data:
+                conversation_entry["context"] = {
+                    key: value for key, value in context_data.items()
+                    if key not in _BULKY_CONTEXT_KEYS
+                }
+            if visualization:
+                conversation_entry["visualization"] = {
+                    "type": visualization.get("type"),
+                    "title": visualization.get("title")
+                }
             
-            # Update memory
-            updated_history = state.get("conversation_history", [])
-            updated_history.append(conversation_entry)
-            state["conversation_history"] = updated_history[-10:]  # Keep last 10 exchanges
+            # Update memory, trimming in place instead of copying a slice
+            history = state.get("conversation_history", [])
+            history.append(conversation_entry)
+            if len(history) > MAX_HISTORY_EXCHANGES:
+                del history[:len(history) - MAX_HISTORY_EXCHANGES]
+            state["conversation_history"] = history
             
-            logger.info(f"Finalized response for intent: {state['current_intent']}")
+            logger.info(f"Finalized response for intent: {intent}")
             
         except Exception as e:
             logger.error(f"Error in response finalization: {str(e)}")
         
         return state
     
+    def _new_state(self, user_input: str, history: List[Dict[str, str]],
+                   token_sink: Optional[Callable[[str], None]] = None) -> ChatState:
+        """Initial workflow state for a user turn"""
+        return ChatState(
+            user_input=user_input,
+            conversation_history=history,
+            current_intent="",
+            intent_confidence=1.0,
+            needs_clarification=False,
+            clarification_questions=[],
+            response="",
+            context_data={},
+            visualization_data={},
+            error="",
+            token_sink=token_sink
+        )
+    
+    def _chat_result(self, state: ChatState) -> Dict[str, Any]:
+        """Caller-facing result of a finished workflow state"""
+        return {
+            "response": state["response"],
+            "intent": state["current_intent"],
+            "visualization": state.get("visualization_data"),
+            "context": state.get("context_data"),
+            "error": state.get("error")
+        }
+    
     def chat(self, user_input: str, session_id: str = "default") -> Dict[str, Any]:
         """Main chat interface"""
         try:
@@ -265,17 +707,7 @@ class BiChatbotOrchestrator:
             history = self.memory.get_conversation(session_id)
             
             # Initialize state
-            initial_state = ChatState(
-                user_input=user_input,
-                conversation_history=history,
-                current_intent="",
-                needs_clarification=False,
-                clarification_questions=[],
-                response="",
-                context_data={},
-                visualization_data={},
-                error=""
-            )
+            initial_state = self._new_state(user_input, history)
             
             # Run the workflow
             final_state = self.workflow.invoke(initial_state)
@@ -284,13 +716,7 @@ class BiChatbotOrchestrator:
             self.memory.update_conversation(session_id, final_state["conversation_history"])
             
             # Return response
-            return {
-                "response": final_state["response"],
-                "intent": final_state["current_intent"],
-                "visualization": final_state.get("visualization_data"),
-                "context": final_state.get("context_data"),
-                "error": final_state.get("error")
-            }
+            return self._chat_result(final_state)
             
         except Exception as e:
             logger.error(f"Error in chat processing: {str(e)}")
@@ -300,6 +726,70 @@ class BiChatbotOrchestrator:
                 "error": str(e)
             }
     
+    def chat_stream(self, user_input: str, session_id: str = "default") -> Iterator[str]:
+        """Streaming chat interface
+        
+        Runs the same workflow as chat() on a worker thread. The general, RAG and
+        SQL handlers stream their tokens through the state's token_sink; responses
+        produced whole, such as answers given by the routing call itself,
+        clarifications and speculative fan-out results, are yielded once the
+        workflow finishes. The full result is available from get_stream_result
+        once the stream is exhausted.
+        """
+        tokens: "queue.Queue" = queue.Queue()
+        finished = object()
+        outcome: Dict[str, Any] = {}
+        
+        def run():
+            try:
+                history = self.memory.get_conversation(session_id)
+                initial_state = self._new_state(user_input, history, token_sink=tokens.put)
+                outcome["state"] = self.workflow.invoke(initial_state)
+                self.memory.update_conversation(session_id, outcome["state"]["conversation_history"])
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                tokens.put(finished)
+        
+        threading.Thread(target=run, name="chat-stream", daemon=True).start()
+        
+        streamed = False
+        for token in iter(tokens.get, finished):
+            streamed = True
+            yield token
+        
+        if "error" in outcome:
+            logger.error(f"Error in chat processing: {str(outcome['error'])}")
+            message = "I encountered an error processing your request. Please try again."
+            self._stream_results[session_id] = {
+                "response": message,
+                "intent": "error",
+                "error": str(outcome["error"])
+            }
+            yield message
+            return
+        
+        final_state = outcome["state"]
+        if not streamed:
+            yield final_state["response"]
+        
+        self._stream_results[session_id] = self._chat_result(final_state)
+    
+    def get_stream_result(self, session_id: str = "default") -> Dict[str, Any]:
+        """Get the full result of the last streamed chat for a session"""
+        return self._stream_results.pop(session_id, {})
+    
+    def close(self):
+        """Release pooled LM Studio connections, the fan-out worker threads and the event loop"""
+        self._fanout_executor.shutdown(wait=False)
+        with self._async_loop_lock:
+            loop, self._async_loop = self._async_loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self.llm_client.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+        else:
+            self.llm_client.close()
+    
     def reset_conversation(self, session_id: str = "default"):
         """Reset conversation for a session"""
         self.memory.clear_conversation(session_id)
\ No newline at end of file
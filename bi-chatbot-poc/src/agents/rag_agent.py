@@ -3,13 +3,28 @@ RAG Agent for handling unstructured data queries.
 Uses document retrieval and generation for answering questions.
 """
 
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Generator, Tuple
 import logging
+import threading
+import numpy as np
 from ..core.rag_pipeline import RAGPipeline
 from ..core.lm_studio_client import LMStudioClient
+from ..utils import select_relevant_history
 
 logger = logging.getLogger(__name__)
 
+# Static instructions lead the prompt so every call shares a byte-identical prefix
+_RAG_INSTRUCTIONS = """You are a helpful BI assistant that answers questions based on company documents and data. 
+
+Instructions:
+1. Answer the user's question based on the provided documents
+2. Be specific and cite which documents you're referencing
+3. If the documents don't contain enough information, say so clearly
+4. Keep your response conversational but professional
+5. If relevant, mention document sources
+6. If the user is asking a follow-up question, connect it to the previous conversation
+"""
+
 class RAGAgent:
     """Agent for handling unstructured data queries using RAG"""
     
@@ -18,72 +33,201 @@ class RAGAgent:
         self.llm_client = llm_client
         self.rag_pipeline = RAGPipeline(config['rag'])
         
+        # Answers to earlier standalone questions, matched by embedding similarity
+        self.semantic_cache_threshold = config.get('semantic_cache_threshold', 0.92)
+        self.semantic_cache_size = config.get('semantic_cache_size', 512)
+        self._cache_embeddings: List[np.ndarray] = []  # unit vectors, least recently used first
+        self._cache_results: List[Dict[str, Any]] = []
+        self._cache_matrix: Optional[np.ndarray] = None
+        self._cache_lock = threading.Lock()
+        
+        # Turned off for good once the loaded model turns out unable to embed
+        self._semantic_cache_enabled = config.get('semantic_cache_enabled', True)
+        
     def process(self, user_input: str, conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
         """Process user query using RAG pipeline"""
         try:
-            # Get relevant documents
-            retrieved_docs = self.rag_pipeline.retrieve(user_input, top_k=5)
-            
-            if not retrieved_docs:
-                return {
-                    "response": "I couldn't find any relevant documents for your query. Please try rephrasing your question or check if the documents are properly indexed.",
-                    "context": {"retrieved_docs": 0}
-                }
+            result, query_embedding, retrieved_docs = self._retrieve(user_input, conversation_history)
+            if result is not None:
+                return result
             
             # Build context from retrieved documents
             context = self._build_context(retrieved_docs)
             
             # Generate response using LLM
-            response = self._generate_response(user_input, context, conversation_history)
+            response, generated = self._generate_response(user_input, context, conversation_history)
             
-            return {
-                "response": response,
-                "context": {
-                    "retrieved_docs": len(retrieved_docs),
-                    "sources": [doc.get("source", "Unknown") for doc in retrieved_docs],
-                    "snippets": [doc.get("content", "")[:200] + "..." for doc in retrieved_docs]
-                }
-            }
+            return self._build_result(response, retrieved_docs, query_embedding if generated else None)
+            
+        except Exception as e:
+            logger.error(f"Error in RAG processing: {str(e)}")
+            return self._error_result(e)
+    
+    def process_stream(self, user_input: str, 
+                       conversation_history: List[Dict[str, str]]) -> Generator[str, None, Dict[str, Any]]:
+        """Process user query using RAG pipeline, yielding the answer as it is generated
+        
+        The generator's return value is the same result dict process() returns.
+        """
+        try:
+            result, query_embedding, retrieved_docs = self._retrieve(user_input, conversation_history)
+            if result is not None:
+                yield result["response"]
+                return result
+            
+            context = self._build_context(retrieved_docs)
+            
+            chunks = []
+            generated = yield from self._collect_stream(
+                self._generate_response_stream(user_input, context, conversation_history), chunks
+            )
+            
+            return self._build_result(
+                "".join(chunks).strip(), retrieved_docs, query_embedding if generated else None
+            )
             
         except Exception as e:
             logger.error(f"Error in RAG processing: {str(e)}")
+            result = self._error_result(e)
+            yield result["response"]
+            return result
+    
+    def _retrieve(self, user_input: str, 
+                  conversation_history: List[Dict[str, str]]) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray], List[Dict[str, Any]]]:
+        """Check the semantic cache, then retrieve documents
+        
+        Returns (result, query_embedding, retrieved_docs); result is set when the
+        query is already answered, from the cache or because nothing was found.
+        """
+        # Follow-ups depend on the conversation, so only standalone questions use the cache
+        query_embedding = None
+        if not conversation_history and self._semantic_cache_enabled:
+            query_embedding = self._embed_query(user_input)
+            if query_embedding is not None:
+                cached = self._lookup_semantic_cache(query_embedding)
+                if cached is not None:
+                    logger.info("Semantic cache hit for RAG query")
+                    return cached, None, []
+        
+        # Get relevant documents
+        retrieved_docs = self.rag_pipeline.retrieve(user_input, top_k=5)
+        
+        if not retrieved_docs:
             return {
-                "response": "I encountered an error while searching through the documents. Please try again.",
-                "context": {"error": str(e)}
+                "response": "I couldn't find any relevant documents for your query. Please try rephrasing your question or check if the documents are properly indexed.",
+                "context": {"retrieved_docs": 0}
+            }, None, []
+        
+        return None, query_embedding, retrieved_docs
+    
+    def _build_result(self, response: str, retrieved_docs: List[Dict[str, Any]], 
+                      query_embedding: Optional[np.ndarray]) -> Dict[str, Any]:
+        """Assemble the result for an answer, caching it when a query embedding is given
+        
+        Callers pass no embedding for follow-ups and for answers whose generation failed.
+        """
+        result = {
+            "response": response,
+            "context": {
+                "retrieved_docs": len(retrieved_docs),
+                "sources": [doc.get("source", "Unknown") for doc in retrieved_docs],
+                "snippets": [doc.get("content", "")[:200] + "..." for doc in retrieved_docs]
             }
+        }
+        
+        if query_embedding is not None:
+            self._store_semantic_cache(query_embedding, result)
+        
+        return result
+    
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """Result returned when RAG processing fails"""
+        return {
+            "response": "I encountered an error while searching through the documents. Please try again.",
+            "context": {"error": str(error)}
+        }
+    
+    def _embed_query(self, user_input: str) -> Optional[np.ndarray]:
+        """Embed a query as a unit vector for the semantic cache
+        
+        A single attempt is made, so a model that cannot embed does not cost
+        retries and backoff before every retrieval; the first failure turns the
+        cache off.
+        """
+        try:
+            embedding = self.llm_client.get_embeddings_array([user_input], max_retries=1)[0]
+            norm = np.linalg.norm(embedding)
+            return embedding / norm if norm > 0 else None
+        except RuntimeError as e:
+            logger.warning(f"Could not embed query, disabling the semantic cache: {str(e)}")
+            self._semantic_cache_enabled = False
+            return None
+    
+    def _lookup_semantic_cache(self, query_embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Return the cached result of the most similar earlier query above the threshold"""
+        with self._cache_lock:
+            if not self._cache_results:
+                return None
+            
+            if self._cache_matrix is None:
+                self._cache_matrix = np.vstack(self._cache_embeddings)
+            
+            # Rows and query are unit vectors, so the dot product is the cosine similarity
+            similarities = self._cache_matrix @ query_embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.semantic_cache_threshold:
+                return None
+            
+            # Mark as most recently used
+            self._cache_embeddings.append(self._cache_embeddings.pop(best))
+            self._cache_results.append(self._cache_results.pop(best))
+            self._cache_matrix = None
+            
+            return self._cache_results[-1]
+    
+    def _store_semantic_cache(self, query_embedding: np.ndarray, result: Dict[str, Any]):
+        """Cache a result, evicting the least recently used one when full"""
+        with self._cache_lock:
+            self._cache_embeddings.append(query_embedding)
+            self._cache_results.append(result)
+            
+            if len(self._cache_results) > self.semantic_cache_size:
+                self._cache_embeddings.pop(0)
+                self._cache_results.pop(0)
+            
+            self._cache_matrix = None
     
     def _build_context(self, retrieved_docs: List[Dict[str, Any]]) -> str:
         """Build context string from retrieved documents"""
+        # Document contents are appended as-is rather than formatted into a
+        # per-document string, so each one is copied only once by the final join
         context_parts = []
         
         for i, doc in enumerate(retrieved_docs, 1):
             source = doc.get("source", "Unknown")
-            content = doc.get("content", "")
             score = doc.get("score", 0.0)
             
-            context_part = f"""
-Document {i} (Source: {source}, Relevance: {score:.2f}):
-{content}
----
-"""
-            context_parts.append(context_part)
+            if i > 1:
+                context_parts.append("\n")
+            context_parts.append(f"\nDocument {i} (Source: {source}, Relevance: {score:.2f}):\n")
+            context_parts.append(doc.get("content", ""))
+            context_parts.append("\n---\n")
         
-        return "\n".join(context_parts)
+        return "".join(context_parts)
     
-    def _generate_response(self, user_input: str, context: str, history: List[Dict[str, str]]) -> str:
-        """Generate response using LLM with retrieved context"""
+    def _build_prompt(self, user_input: str, context: str, history: List[Dict[str, str]]) -> str:
+        """Build the answer prompt from retrieved context"""
         
         # Build conversation context
         conversation_context = ""
         if history:
-            recent_history = history[-3:]  # Last 3 exchanges
+            recent_history = select_relevant_history(user_input, history, k=3)
             conversation_context = "\n".join([
                 f"User: {h.get('user', '')}\nAssistant: {h.get('bot', '')}" 
                 for h in recent_history
             ])
         
-        prompt = f"""You are a helpful BI assistant that answers questions based on company documents and data. 
-
+        return _RAG_INSTRUCTIONS + f"""
 Previous conversation:
 {conversation_context}
 
@@ -92,16 +236,27 @@ User's current question: {user_input}
 Relevant documents:
 {context}
 
-Instructions:
-1. Answer the user's question based on the provided documents
-2. Be specific and cite which documents you're referencing
-3. If the documents don't contain enough information, say so clearly
-4. Keep your response conversational but professional
-5. If relevant, mention document sources
-6. If the user is asking a follow-up question, connect it to the previous conversation
-
 Response:"""
-
+    
+    def _collect_stream(self, stream: Generator[str, None, bool], chunks: List[str]) -> Generator[str, None, bool]:
+        """Re-yield a response stream, collecting its chunks and returning its success flag"""
+        while True:
+            try:
+                chunk = next(stream)
+            except StopIteration as stop:
+                return stop.value
+            chunks.append(chunk)
+            yield chunk
+    
+    def _generate_response(self, user_input: str, context: str, 
+                           history: List[Dict[str, str]]) -> Tuple[str, bool]:
+        """Generate response using LLM with retrieved context
+        
+        Returns the response and whether the LLM produced it, as opposed to the
+        apology returned when generation failed.
+        """
+        prompt = self._build_prompt(user_input, context, history)
+        
         try:
             response = self.llm_client.generate(
                 prompt, 
@@ -109,19 +264,49 @@ Response:"""
                 temperature=0.3
             )
             
-            return response.strip()
+            return response.strip(), True
             
         except Exception as e:
             logger.error(f"Error generating RAG response: {str(e)}")
-            return "I apologize, but I encountered an error while generating a response based on the documents."
+            return "I apologize, but I encountered an error while generating a response based on the documents.", False
+    
+    def _generate_response_stream(self, user_input: str, context: str, 
+                                  history: List[Dict[str, str]]) -> Generator[str, None, bool]:
+        """Streaming counterpart of _generate_response; the generator returns the success flag"""
+        prompt = self._build_prompt(user_input, context, history)
+        
+        try:
+            yield from self.llm_client.generate_stream(
+                prompt, 
+                max_tokens=self.config.get('max_response_tokens', 500),
+                temperature=0.3
+            )
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error generating RAG response: {str(e)}")
+            yield "I apologize, but I encountered an error while generating a response based on the documents."
+            return False
     
     def add_documents(self, documents: List[Dict[str, Any]]) -> bool:
         """Add new documents to the RAG pipeline"""
         try:
-            return self.rag_pipeline.add_documents(documents)
+            added = self.rag_pipeline.add_documents(documents)
         except Exception as e:
             logger.error(f"Error adding documents: {str(e)}")
             return False
+        
+        # Cached answers were built from the old index
+        if added:
+            self.clear_semantic_cache()
+        return added
+    
+    def clear_semantic_cache(self):
+        """Forget cached responses, e.g. after the document index changed"""
+        with self._cache_lock:
+            self._cache_embeddings.clear()
+            self._cache_results.clear()
+            self._cache_matrix = None
     
     def get_document_stats(self) -> Dict[str, Any]:
         """Get statistics about indexed documents"""
@@ -3,8 +3,10 @@ SQL Agent for handling structured data queries.
 Converts natural language to SQL and generates insights with visualizations.
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator, Generator, Tuple
 import logging
+import re
+import time
 import pandas as pd
 from ..core.sql_generator import SQLGenerator
 from ..core.data_dictionary import DataDictionary
@@ -14,6 +16,28 @@ from ..utils import execute_sql_query
 
 logger = logging.getLogger(__name__)
 
+# Whole-word write/DDL keywords, so names like updated_orders or created_at are not flagged
+_DANGEROUS_SQL_RE = re.compile(r'\b(drop|delete|truncate|alter|create|insert|update)\b')
+# Quoted string literals, removed before the keyword scan so values like 'delete' are not flagged
+_SQL_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+
+# Query phrasings that ask for a line or a bar chart
+_TREND_RE = re.compile(r"\btrend|\bover time\b|\btimeline\b|\bhistory\b", re.I)
+_COMPARE_RE = re.compile(r"\bcompare|\bvs\b|\bversus\b", re.I)
+
+# Static instructions lead the prompt so every call shares a byte-identical prefix
+_INSIGHTS_INSTRUCTIONS = """You are a BI assistant analyzing data query results. 
+
+Instructions:
+1. Provide insights based on the data results
+2. Answer the user's specific question directly
+3. Highlight key findings or patterns
+4. Keep response conversational and business-focused
+5. If numbers are involved, provide context
+6. Suggest follow-up questions if relevant
+7. Don't repeat the SQL query in your response
+"""
+
 class SQLAgent:
     """Agent for handling structured data queries using SQL generation"""
     
@@ -24,65 +48,164 @@ class SQLAgent:
         self.data_dictionary = DataDictionary(config['database'])
         self.chart_generator = ChartGenerator()
         
+        # Rows shipped back with a response; larger results are truncated
+        self.max_result_rows = config['sql'].get('max_result_rows', 200)
+        
+        # Schema summary and the monotonic time it was fetched; the schema rarely changes
+        self.schema_cache_ttl = config['sql'].get('schema_cache_ttl', 300)
+        self._schema_cache: Tuple[Optional[str], float] = (None, 0.0)
+        
     def process(self, user_input: str, conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
         """Process user query by generating and executing SQL"""
         try:
-            # Get data dictionary for context
-            schema_info = self.data_dictionary.get_schema_summary()
-            
-            # Generate SQL query
-            sql_result = self.sql_generator.generate_sql(
-                user_input, 
-                schema_info, 
-                conversation_history
-            )
+            result, sql_result, df = self._run_query(user_input, conversation_history)
+            if result is not None:
+                return result
             
-            if not sql_result.get("sql"):
-                return {
-                    "response": "I couldn't generate a valid SQL query for your request. Could you please rephrase your question or be more specific about what data you're looking for?",
-                    "data": {}
-                }
-            
-            # Execute SQL query
-            query_result = self._execute_query(sql_result["sql"])
-            
-            if query_result.get("error"):
-                return {
-                    "response": f"I generated a SQL query but encountered an error: {query_result['error']}. Let me know if you'd like me to try a different approach.",
-                    "data": {"sql": sql_result["sql"], "error": query_result["error"]}
-                }
-            
-            # Process results
-            df = query_result["data"]
+            # Partition columns by dtype once for the summary and the chart heuristics
+            numeric_cols, categorical_cols = self._partition_columns(df)
             
             # Generate insights and response
             response = self._generate_insights_response(
                 user_input, 
                 sql_result["sql"], 
                 df, 
-                conversation_history
+                conversation_history,
+                numeric_cols,
+                categorical_cols
             )
             
-            # Generate visualization if appropriate
-            visualization = self._create_visualization(df, user_input, sql_result.get("chart_type"))
+            return self._build_result(response, sql_result, df, user_input, numeric_cols, categorical_cols)
             
-            return {
-                "response": response,
-                "data": {
-                    "sql": sql_result["sql"],
-                    "results": df.to_dict('records') if not df.empty else [],
-                    "row_count": len(df),
-                    "columns": df.columns.tolist() if not df.empty else []
-                },
-                "visualization": visualization
-            }
+        except Exception as e:
+            logger.error(f"Error in SQL processing: {str(e)}")
+            return self._error_result(e)
+    
+    def process_stream(self, user_input: str, 
+                       conversation_history: List[Dict[str, str]]) -> Generator[str, None, Dict[str, Any]]:
+        """Process user query by generating and executing SQL, yielding the insights as they are generated
+        
+        The generator's return value is the same result dict process() returns.
+        """
+        try:
+            result, sql_result, df = self._run_query(user_input, conversation_history)
+            if result is not None:
+                yield result["response"]
+                return result
+            
+            numeric_cols, categorical_cols = self._partition_columns(df)
+            
+            chunks = []
+            for chunk in self._generate_insights_response_stream(user_input, sql_result["sql"], df, 
+                                                                  conversation_history,
+                                                                  numeric_cols, categorical_cols):
+                chunks.append(chunk)
+                yield chunk
+            
+            return self._build_result("".join(chunks).strip(), sql_result, df, user_input, 
+                                      numeric_cols, categorical_cols)
             
         except Exception as e:
             logger.error(f"Error in SQL processing: {str(e)}")
+            result = self._error_result(e)
+            yield result["response"]
+            return result
+    
+    def _run_query(self, user_input: str, 
+                   conversation_history: List[Dict[str, str]]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[pd.DataFrame]]:
+        """Generate and execute SQL
+        
+        Returns (result, sql_result, df); result is set when no SQL could be generated
+        or the query failed.
+        """
+        # Get data dictionary for context
+        schema_info = self._get_schema_summary()
+        
+        # Generate SQL query
+        sql_result = self.sql_generator.generate_sql(
+            user_input, 
+            schema_info, 
+            conversation_history
+        )
+        
+        if not sql_result.get("sql"):
             return {
-                "response": "I encountered an error while processing your data query. Please try rephrasing your question or check if it relates to available data.",
-                "data": {"error": str(e)}
-            }
+                "response": "I couldn't generate a valid SQL query for your request. Could you please rephrase your question or be more specific about what data you're looking for?",
+                "data": {}
+            }, None, None
+        
+        # Execute SQL query
+        query_result = self._execute_query(sql_result["sql"])
+        
+        if query_result.get("error"):
+            return {
+                "response": f"I generated a SQL query but encountered an error: {query_result['error']}. Let me know if you'd like me to try a different approach.",
+                "data": {"sql": sql_result["sql"], "error": query_result["error"]}
+            }, None, None
+        
+        return None, sql_result, query_result["data"]
+    
+    def _build_result(self, response: str, sql_result: Dict[str, Any], df: pd.DataFrame, user_input: str, 
+                      numeric_cols: pd.Index, categorical_cols: pd.Index) -> Dict[str, Any]:
+        """Assemble the result for a successfully executed query"""
+        # Generate visualization if appropriate
+        visualization = self._create_visualization(
+            df, user_input, numeric_cols, categorical_cols, sql_result.get("chart_type")
+        )
+        
+        return {
+            "response": response,
+            "data": {
+                "sql": sql_result["sql"],
+                "results": self._columnar_results(df),
+                "row_count": len(df),
+                "truncated": len(df) > self.max_result_rows,
+                "columns": df.columns.tolist() if not df.empty else []
+            },
+            "visualization": visualization
+        }
+    
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """Result returned when SQL processing fails"""
+        return {
+            "response": "I encountered an error while processing your data query. Please try rephrasing your question or check if it relates to available data.",
+            "data": {"error": str(error)}
+        }
+    
+    def _partition_columns(self, df: pd.DataFrame) -> Tuple[pd.Index, pd.Index]:
+        """Numeric and categorical (object) columns of a result"""
+        return (
+            df.select_dtypes(include=['number']).columns,
+            df.select_dtypes(include=['object']).columns
+        )
+    
+    def _get_schema_summary(self) -> str:
+        """Schema summary for SQL generation, refetched at most every schema_cache_ttl seconds"""
+        summary, fetched_at = self._schema_cache
+        now = time.monotonic()
+        
+        if summary is None or now - fetched_at >= self.schema_cache_ttl:
+            summary = self.data_dictionary.get_schema_summary()
+            self._schema_cache = (summary, now)
+        
+        return summary
+    
+    def invalidate_schema_cache(self):
+        """Force the next query to refetch the schema summary, e.g. after a schema change"""
+        self._schema_cache = (None, 0.0)
+    
+    def _columnar_results(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Column-wise payload of the first max_result_rows rows
+        
+        One list per column instead of one dict per row avoids a small dict
+        allocation for every row and keeps the payload compact.
+        """
+        if df.empty:
+            return {"columns": [], "data": []}
+        
+        head = df.head(self.max_result_rows)
+        columns = head.columns.tolist()
+        return {"columns": columns, "data": [head[col].tolist() for col in columns]}
     
     def _execute_query(self, sql: str) -> Dict[str, Any]:
         """Execute SQL query and return results"""
@@ -93,15 +216,9 @@ class SQLAgent:
             logger.error(f"SQL execution error: {str(e)}")
             return {"data": pd.DataFrame(), "error": str(e)}
     
-    def _generate_insights_response(self, user_input: str, sql: str, df: pd.DataFrame, 
-                                  history: List[Dict[str, str]]) -> str:
-        """Generate natural language response with insights from query results"""
-        
-        if df.empty:
-            return "Your query returned no results. You might want to try different criteria or check if the data exists."
-        
-        # Create summary of results
-        summary = self._create_data_summary(df)
+    def _build_insights_prompt(self, user_input: str, sql: str, summary: str, 
+                               history: List[Dict[str, str]]) -> str:
+        """Build the insights prompt from a summary of the query results"""
         
         # Build conversation context
         conversation_context = ""
@@ -112,8 +229,7 @@ class SQLAgent:
                 for h in recent_history
             ])
         
-        prompt = f"""You are a BI assistant analyzing data query results. 
-
+        return _INSIGHTS_INSTRUCTIONS + f"""
 Previous conversation:
 {conversation_context}
 
@@ -124,16 +240,19 @@ SQL Query executed: {sql}
 Data summary:
 {summary}
 
-Instructions:
-1. Provide insights based on the data results
-2. Answer the user's specific question directly
-3. Highlight key findings or patterns
-4. Keep response conversational and business-focused
-5. If numbers are involved, provide context
-6. Suggest follow-up questions if relevant
-7. Don't repeat the SQL query in your response
-
 Response:"""
+    
+    def _generate_insights_response(self, user_input: str, sql: str, df: pd.DataFrame, 
+                                  history: List[Dict[str, str]], 
+                                  numeric_cols: pd.Index, categorical_cols: pd.Index) -> str:
+        """Generate natural language response with insights from query results"""
+        
+        if df.empty:
+            return "Your query returned no results. You might want to try different criteria or check if the data exists."
+        
+        # Create summary of results
+        summary = self._create_data_summary(df, numeric_cols, categorical_cols)
+        prompt = self._build_insights_prompt(user_input, sql, summary, history)
 
         try:
             response = self.llm_client.generate(
@@ -148,7 +267,31 @@ Response:"""
             logger.error(f"Error generating SQL insights response: {str(e)}")
             return f"I found {len(df)} records matching your query, but encountered an error generating insights. Here's what I found: {summary}"
     
-    def _create_data_summary(self, df: pd.DataFrame) -> str:
+    def _generate_insights_response_stream(self, user_input: str, sql: str, df: pd.DataFrame, 
+                                           history: List[Dict[str, str]], 
+                                           numeric_cols: pd.Index, categorical_cols: pd.Index) -> Iterator[str]:
+        """Streaming counterpart of _generate_insights_response"""
+        
+        if df.empty:
+            yield "Your query returned no results. You might want to try different criteria or check if the data exists."
+            return
+        
+        summary = self._create_data_summary(df, numeric_cols, categorical_cols)
+        prompt = self._build_insights_prompt(user_input, sql, summary, history)
+
+        try:
+            yield from self.llm_client.generate_stream(
+                prompt, 
+                max_tokens=self.config.get('max_response_tokens', 400),
+                temperature=0.2
+            )
+            
+        except Exception as e:
+            logger.error(f"Error generating SQL insights response: {str(e)}")
+            yield f"I found {len(df)} records matching your query, but encountered an error generating insights. Here's what I found: {summary}"
+    
+    def _create_data_summary(self, df: pd.DataFrame, 
+                             numeric_cols: pd.Index, categorical_cols: pd.Index) -> str:
         """Create a summary of the dataframe"""
         if df.empty:
             return "No data found."
@@ -158,19 +301,22 @@ Response:"""
         # Add column info
         summary_parts.append(f"Columns: {', '.join(df.columns.tolist())}")
         
-        # Add key statistics for numeric columns
-        numeric_cols = df.select_dtypes(include=['number']).columns
+        # Add key statistics for numeric columns, limited to the first 3,
+        # computed for all of them in one vectorized aggregation
+        numeric_cols = numeric_cols[:3]
         if not numeric_cols.empty:
-            for col in numeric_cols[:3]:  # Limit to first 3 numeric columns
-                if col in df.columns:
-                    stats = f"{col}: min={df[col].min()}, max={df[col].max()}, avg={df[col].mean():.2f}"
-                    summary_parts.append(stats)
+            stats = df[numeric_cols].agg(['min', 'max', 'mean'])
+            for col in numeric_cols:
+                summary_parts.append(
+                    f"{col}: min={stats.at['min', col]}, max={stats.at['max', col]}, avg={stats.at['mean', col]:.2f}"
+                )
         
-        # Add sample of categorical data
-        categorical_cols = df.select_dtypes(include=['object']).columns
+        # Add sample of categorical data, limited to the first 2 categorical columns
+        categorical_cols = categorical_cols[:2]
         if not categorical_cols.empty:
-            for col in categorical_cols[:2]:  # Limit to first 2 categorical columns
-                unique_values = df[col].nunique()
+            unique_counts = df[categorical_cols].nunique()
+            for col in categorical_cols:
+                unique_values = unique_counts[col]
                 if unique_values <= 10:
                     values = ', '.join(df[col].unique()[:5].astype(str))
                     summary_parts.append(f"{col} values: {values}")
@@ -180,6 +326,7 @@ Response:"""
         return "\n".join(summary_parts)
     
     def _create_visualization(self, df: pd.DataFrame, user_input: str, 
+                            numeric_cols: pd.Index, categorical_cols: pd.Index,
                             suggested_chart_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Create visualization if appropriate"""
         try:
@@ -187,7 +334,9 @@ Response:"""
                 return None
             
             # Determine chart type
-            chart_type = suggested_chart_type or self._suggest_chart_type(df, user_input)
+            chart_type = suggested_chart_type or self._suggest_chart_type(
+                df, user_input, numeric_cols, categorical_cols
+            )
             
             if not chart_type:
                 return None
@@ -201,20 +350,16 @@ Response:"""
             logger.error(f"Error creating visualization: {str(e)}")
             return None
     
-    def _suggest_chart_type(self, df: pd.DataFrame, user_input: str) -> Optional[str]:
+    def _suggest_chart_type(self, df: pd.DataFrame, user_input: str, 
+                            numeric_cols: pd.Index, categorical_cols: pd.Index) -> Optional[str]:
         """Suggest appropriate chart type based on data and query"""
         if len(df) < 2:
             return None
         
-        numeric_cols = df.select_dtypes(include=['number']).columns
-        categorical_cols = df.select_dtypes(include=['object']).columns
-        
         # Simple heuristics for chart type
-        query_lower = user_input.lower()
-        
-        if 'trend' in query_lower or 'over time' in query_lower:
+        if _TREND_RE.search(user_input):
             return 'line'
-        elif 'compare' in query_lower or 'vs' in query_lower:
+        elif _COMPARE_RE.search(user_input):
             return 'bar'
         elif len(numeric_cols) >= 1 and len(categorical_cols) >= 1:
             if len(df) <= 20:
@@ -240,11 +385,10 @@ Response:"""
             # Basic SQL validation (can be enhanced)
             sql_lower = sql.lower().strip()
             
-            # Check for dangerous operations
-            dangerous_keywords = ['drop', 'delete', 'truncate', 'alter', 'create', 'insert', 'update']
-            for keyword in dangerous_keywords:
-                if keyword in sql_lower:
-                    return {"valid": False, "error": f"Query contains potentially dangerous keyword: {keyword}"}
+            # Check for dangerous operations in a single scan
+            match = _DANGEROUS_SQL_RE.search(_SQL_STRING_RE.sub("''", sql_lower))
+            if match:
+                return {"valid": False, "error": f"Query contains potentially dangerous keyword: {match.group(1)}"}
             
             # Check if it's a SELECT query
             if not sql_lower.startswith('select'):
@@ -3,29 +3,107 @@ Conversation memory management for multi-turn conversations.
 Handles session storage and conversation context.
 """
 
+import atexit
+import functools
+import hashlib
 import json
 import os
 import logging
-from typing import Dict, List, Any, Optional
+import re
+import threading
+import time
+from typing import Dict, List, Any, Optional, Set
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# Message payloads at least this long, or inline images, are stored as blob files
+# and referenced from the history, so they are not re-serialized on every save
+BLOB_SPILL_CHARS = 64 * 1024
+_ATTACHMENT_RE = re.compile(r'\[attachment:([0-9a-f]{32})\]')
+
+# Text fields of stored messages and conversation entries that may be spilled, and
+# dict fields whose values may be: add_message writes content and metadata, the
+# orchestrator's conversation entries carry user, bot and context
+_SPILL_TEXT_FIELDS = ('content', 'user', 'bot')
+_SPILL_DICT_FIELDS = ('metadata', 'context')
+
+
+def _dumps_session(session_data: Dict[str, Any]) -> bytes:
+    """Serialize a session as indented UTF-8 JSON, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(session_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(session_data, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def _loads_session(raw: bytes) -> Dict[str, Any]:
+    """Parse a serialized session"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode('utf-8'))
+
+
+def _synchronized(method):
+    """Run a ConversationMemory method while holding the instance lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _empty_stats() -> Dict[str, Any]:
+    """Session stats for an empty conversation; intents is a plain dict so it round-trips through JSON"""
+    return {
+        'total_messages': 0,
+        'user_messages': 0,
+        'bot_messages': 0,
+        'intents': {}
+    }
+
+
 class ConversationMemory:
     """Manages conversation history and context for multi-turn interactions"""
     
-    def __init__(self, storage_path: str = "data/conversations", max_sessions: int = 100):
+    def __init__(self, storage_path: str = "data/conversations", max_sessions: int = 100,
+                 flush_interval: float = 0.2):
         self.storage_path = storage_path
         self.max_sessions = max_sessions
         self.max_history_length = 20  # Maximum turns per conversation
         self.session_timeout = timedelta(hours=24)  # Sessions expire after 24 hours
         
-        # In-memory storage for active sessions
-        self.sessions: Dict[str, Dict[str, Any]] = {}
+        # In-memory storage for active sessions, least recently used first; sessions
+        # beyond max_sessions are evicted to disk and reloaded when used again
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        
+        # Guards the sessions and their bookkeeping, which the background flusher
+        # reads and serializes while request threads mutate them
+        self._lock = threading.RLock()
+        
+        # Changed sessions are written by a background flusher, at most once
+        # per flush_interval seconds, instead of on every update
+        self.flush_interval = flush_interval
+        self._dirty: Set[str] = set()
+        self._flush_requested = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+        
+        # Hash of the payload last written per session, to skip unchanged rewrites
+        self._saved_hashes: Dict[str, int] = {}
         
-        # Ensure storage directory exists
-        os.makedirs(storage_path, exist_ok=True)
+        # Epoch seconds of each live session's last activity, mirroring the ISO
+        # 'last_activity' field so expiry sweeps compare floats instead of parsing
+        self._activity_ts: Dict[str, float] = {}
+        
+        # Ensure storage directories exist
+        self.blob_path = os.path.join(storage_path, "blobs")
+        os.makedirs(self.blob_path, exist_ok=True)
         
         # Load existing sessions
         self._load_sessions()
@@ -33,79 +111,254 @@ class ConversationMemory:
         logger.info(f"Initialized conversation memory with {len(self.sessions)} sessions")
     
     def _load_sessions(self):
-        """Load existing sessions from storage"""
+        """Load the most recently active sessions from storage"""
+        loaded = []
         try:
             for filename in os.listdir(self.storage_path):
                 if filename.endswith('.json'):
                     session_id = filename[:-5]  # Remove .json extension
-                    file_path = os.path.join(self.storage_path, filename)
-                    
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            session_data = json.load(f)
-                        
-                        # Check if session is not expired
-                        last_activity = datetime.fromisoformat(session_data.get('last_activity', ''))
-                        if datetime.now() - last_activity < self.session_timeout:
-                            self.sessions[session_id] = session_data
-                        else:
-                            # Remove expired session file
-                            os.remove(file_path)
-                            
-                    except Exception as e:
-                        logger.warning(f"Error loading session {session_id}: {str(e)}")
+                    session_data = self._load_session_file(session_id)
+                    if session_data is not None:
+                        loaded.append((session_data.get('last_activity', ''), session_id, session_data))
                         
         except Exception as e:
             logger.error(f"Error loading sessions: {str(e)}")
+        
+        # ISO timestamps sort chronologically; the rest stay on disk until used
+        loaded.sort(key=lambda item: item[0])
+        for _, session_id, session_data in loaded[-self.max_sessions:]:
+            self._insert(session_id, session_data)
+    
+    def _load_session_file(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Read a session file, removing it instead if the session has expired"""
+        file_path = os.path.join(self.storage_path, f"{session_id}.json")
+        try:
+            with open(file_path, 'rb') as f:
+                session_data = _loads_session(f.read())
+            
+            # Check if session is not expired
+            last_activity = datetime.fromisoformat(session_data.get('last_activity', ''))
+            if datetime.now() - last_activity < self.session_timeout:
+                return session_data
+            
+            # Remove expired session file
+            os.remove(file_path)
+            
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Error loading session {session_id}: {str(e)}")
+        
+        return None
+    
+    def _touch(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Live session data, marked most recently used and reloaded from disk if it was evicted"""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            self.sessions.move_to_end(session_id)
+            return session
+        
+        session = self._load_session_file(session_id)
+        if session is not None:
+            self._insert(session_id, session)
+        return session
+    
+    def _insert(self, session_id: str, session_data: Dict[str, Any]):
+        """Add a live session, persisting and evicting the least recently used beyond max_sessions"""
+        self.sessions[session_id] = session_data
+        self.sessions.move_to_end(session_id)
+        self._activity_ts[session_id] = datetime.fromisoformat(session_data['last_activity']).timestamp()
+        
+        while len(self.sessions) > self.max_sessions:
+            evicted_id, evicted_data = self.sessions.popitem(last=False)
+            self._dirty.discard(evicted_id)
+            self._save_session_data(evicted_id, evicted_data)
+            self._saved_hashes.pop(evicted_id, None)
+            self._activity_ts.pop(evicted_id, None)
+    
+    def _record_activity(self, session_id: str, session: Dict[str, Any]) -> str:
+        """Stamp a session as active now, returning the ISO timestamp for reuse"""
+        now = datetime.now()
+        timestamp = now.isoformat()
+        session['last_activity'] = timestamp
+        self._activity_ts[session_id] = now.timestamp()
+        return timestamp
     
     def _save_session(self, session_id: str):
-        """Save session to persistent storage"""
+        """Save session to persistent storage
+        
+        The file is replaced atomically, so a crash never leaves half-written
+        JSON behind, and is not rewritten when the content has not changed.
+        """
+        session_data = self.sessions.get(session_id)
+        if session_data is not None:
+            self._save_session_data(session_id, session_data)
+    
+    def _save_session_data(self, session_id: str, session_data: Dict[str, Any]):
+        """Write session data to its file"""
         try:
-            if session_id in self.sessions:
-                file_path = os.path.join(self.storage_path, f"{session_id}.json")
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.sessions[session_id], f, indent=2, ensure_ascii=False)
+            payload = _dumps_session(session_data)
+            payload_hash = hash(payload)
+            if self._saved_hashes.get(session_id) == payload_hash:
+                return
+            
+            file_path = os.path.join(self.storage_path, f"{session_id}.json")
+            tmp_path = f"{file_path}.tmp.{os.getpid()}.{threading.get_ident()}"
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, file_path)
+            self._saved_hashes[session_id] = payload_hash
         except Exception as e:
             logger.error(f"Error saving session {session_id}: {str(e)}")
     
+    def _mark_dirty(self, session_id: str):
+        """Queue a session for the next background flush"""
+        with self._lock:
+            self._dirty.add(session_id)
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name="conversation-flusher", daemon=True
+                )
+                self._flusher.start()
+        self._flush_requested.set()
+    
+    def _flush_loop(self):
+        """Write dirty sessions, letting updates accumulate for flush_interval first"""
+        while True:
+            self._flush_requested.wait()
+            time.sleep(self.flush_interval)
+            self._flush_requested.clear()
+            self.flush()
+    
+    @_synchronized
+    def flush(self):
+        """Write every session changed since the last flush
+        
+        Sessions are serialized and written under the lock, so a flush never
+        sees a half-applied update or races an eviction writing the same file.
+        """
+        dirty, self._dirty = self._dirty, set()
+        for session_id in dirty:
+            self._save_session(session_id)
+    
+    @_synchronized
     def create_session(self, session_id: str, user_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Create a new conversation session"""
+        now = datetime.now().isoformat()
         session_data = {
             'session_id': session_id,
-            'created_at': datetime.now().isoformat(),
-            'last_activity': datetime.now().isoformat(),
+            'created_at': now,
+            'last_activity': now,
             'conversation_history': [],
             'context': {},
             'user_info': user_info or {},
-            'session_stats': {
-                'total_messages': 0,
-                'user_messages': 0,
-                'bot_messages': 0,
-                'intents': defaultdict(int)
-            }
+            'session_stats': _empty_stats()
         }
         
-        self.sessions[session_id] = session_data
-        self._save_session(session_id)
+        self._insert(session_id, session_data)
+        self._mark_dirty(session_id)
         
         logger.info(f"Created new session: {session_id}")
         return session_data
     
+    @_synchronized
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get session data"""
-        if session_id in self.sessions:
+        session = self._touch(session_id)
+        if session is not None:
             # Update last activity
-            self.sessions[session_id]['last_activity'] = datetime.now().isoformat()
-            return self.sessions[session_id]
-        return None
+            self._record_activity(session_id, session)
+        return session
     
+    @_synchronized
     def get_conversation(self, session_id: str) -> List[Dict[str, Any]]:
-        """Get conversation history for a session"""
+        """Get conversation history for a session, with attachments rehydrated"""
         session = self.get_session(session_id)
         if session:
-            return session.get('conversation_history', [])
+            return self._resolve_blobs(session.get('conversation_history', []))
         return []
     
+    def _spill_large_blob(self, value: Any) -> Any:
+        """Store a large string in a blob file and return its pointer; other values pass through"""
+        if not isinstance(value, str) or (len(value) < BLOB_SPILL_CHARS and not value.startswith('data:image')):
+            return value
+        
+        data = value.encode('utf-8')
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        blob_file = os.path.join(self.blob_path, f"{digest}.bin")
+        
+        # Blobs are content-addressed, so an existing file already holds this payload
+        if not os.path.exists(blob_file):
+            tmp_path = f"{blob_file}.tmp.{os.getpid()}.{threading.get_ident()}"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, blob_file)
+        
+        return f"[attachment:{digest}]"
+    
+    def _spill_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Message with large text fields and large values of its dict fields spilled to blob files
+        
+        The message is copied only when something was spilled.
+        """
+        spilled = self._map_message_values(message, self._spill_large_blob)
+        return message if not spilled else {**message, **spilled}
+    
+    @staticmethod
+    def _map_message_values(message: Dict[str, Any], func) -> Dict[str, Any]:
+        """Fields of a message whose spillable values func changed, with the changed values"""
+        changed = {}
+        for field in _SPILL_TEXT_FIELDS:
+            value = message.get(field)
+            mapped = func(value)
+            if mapped is not value:
+                changed[field] = mapped
+        
+        for field in _SPILL_DICT_FIELDS:
+            values = message.get(field)
+            if not isinstance(values, dict):
+                continue
+            mapped = {key: func(value) for key, value in values.items()}
+            if any(mapped[key] is not value for key, value in values.items()):
+                changed[field] = mapped
+        
+        return changed
+    
+    def _resolve_blob(self, value: Any) -> Any:
+        """Payload behind an attachment pointer; other values pass through"""
+        if not isinstance(value, str) or not value.startswith('[attachment:'):
+            return value
+        
+        match = _ATTACHMENT_RE.fullmatch(value)
+        if match is None:
+            return value
+        
+        try:
+            with open(os.path.join(self.blob_path, f"{match.group(1)}.bin"), 'rb') as f:
+                return f.read().decode('utf-8')
+        except OSError as e:
+            logger.warning(f"Missing attachment {match.group(1)}: {str(e)}")
+            return value
+    
+    def _resolve_blobs(self, history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """History with attachment pointers replaced by their payloads
+        
+        Returns the stored list itself when nothing was spilled, and copies of
+        only the affected messages otherwise.
+        """
+        resolved = None
+        for i, message in enumerate(history):
+            changed = self._map_message_values(message, self._resolve_blob)
+            if not changed:
+                continue
+            
+            if resolved is None:
+                resolved = list(history)
+            resolved[i] = {**message, **changed}
+        
+        return history if resolved is None else resolved
+    
+    @_synchronized
     def add_message(self, 
                    session_id: str, 
                    role: str, 
@@ -115,18 +368,18 @@ class ConversationMemory:
         """Add a message to conversation history"""
         
         # Create session if it doesn't exist
-        if session_id not in self.sessions:
-            self.create_session(session_id)
+        session = self._touch(session_id) or self.create_session(session_id)
         
-        session = self.sessions[session_id]
+        # One clock read stamps both the message and the session's last activity
+        timestamp = self._record_activity(session_id, session)
         
-        message = {
+        message = self._spill_message({
             'role': role,
             'content': content,
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': timestamp,
             'intent': intent,
             'metadata': metadata or {}
-        }
+        })
         
         # Add to conversation history
         session['conversation_history'].append(message)
@@ -143,39 +396,47 @@ class ConversationMemory:
             session['session_stats']['bot_messages'] += 1
         
         if intent:
-            session['session_stats']['intents'][intent] += 1
-        
-        # Update last activity
-        session['last_activity'] = datetime.now().isoformat()
+            intents = session['session_stats']['intents']
+            intents[intent] = intents.get(intent, 0) + 1
         
         # Save session
-        self._save_session(session_id)
+        self._mark_dirty(session_id)
         
         logger.debug(f"Added {role} message to session {session_id}")
     
+    @_synchronized
     def update_conversation(self, session_id: str, conversation_history: List[Dict[str, Any]]):
         """Update entire conversation history"""
-        if session_id not in self.sessions:
-            self.create_session(session_id)
-        
-        self.sessions[session_id]['conversation_history'] = conversation_history[-self.max_history_length:]
-        self.sessions[session_id]['last_activity'] = datetime.now().isoformat()
+        session = self._touch(session_id) or self.create_session(session_id)
         
-        # Update stats
-        stats = self.sessions[session_id]['session_stats']
-        stats['total_messages'] = len(conversation_history)
-        stats['user_messages'] = sum(1 for msg in conversation_history if msg.get('role') == 'user')
-        stats['bot_messages'] = sum(1 for msg in conversation_history if msg.get('role') == 'assistant')
+        session['conversation_history'] = [
+            self._spill_message(msg) for msg in conversation_history[-self.max_history_length:]
+        ]
+        self._record_activity(session_id, session)
         
-        # Count intents
-        intents = defaultdict(int)
+        # Update stats in a single pass over the history
+        user_messages = bot_messages = 0
+        intents: Dict[str, int] = {}
         for msg in conversation_history:
-            if msg.get('intent'):
-                intents[msg['intent']] += 1
-        stats['intents'] = dict(intents)
+            role = msg.get('role')
+            if role == 'user':
+                user_messages += 1
+            elif role == 'assistant':
+                bot_messages += 1
+            
+            intent = msg.get('intent')
+            if intent:
+                intents[intent] = intents.get(intent, 0) + 1
         
-        self._save_session(session_id)
+        stats = session['session_stats']
+        stats['total_messages'] = len(conversation_history)
+        stats['user_messages'] = user_messages
+        stats['bot_messages'] = bot_messages
+        stats['intents'] = intents
+        
+        self._mark_dirty(session_id)
     
+    @_synchronized
     def get_context(self, session_id: str) -> Dict[str, Any]:
         """Get conversation context for a session"""
         session = self.get_session(session_id)
@@ -183,22 +444,22 @@ class ConversationMemory:
             return session.get('context', {})
         return {}
     
+    @_synchronized
     def update_context(self, session_id: str, context_updates: Dict[str, Any]):
         """Update conversation context"""
-        if session_id not in self.sessions:
-            self.create_session(session_id)
-        
-        session = self.sessions[session_id]
+        session = self._touch(session_id) or self.create_session(session_id)
         session['context'].update(context_updates)
-        session['last_activity'] = datetime.now().isoformat()
+        self._record_activity(session_id, session)
         
-        self._save_session(session_id)
+        self._mark_dirty(session_id)
     
+    @_synchronized
     def get_recent_messages(self, session_id: str, count: int = 5) -> List[Dict[str, Any]]:
         """Get recent messages from conversation"""
         conversation = self.get_conversation(session_id)
         return conversation[-count:] if conversation else []
     
+    @_synchronized
     def get_conversation_summary(self, session_id: str) -> Dict[str, Any]:
         """Get summary of conversation"""
         session = self.get_session(session_id)
@@ -224,52 +485,56 @@ class ConversationMemory:
             'recent_topics': recent_content[:200] + '...' if len(recent_content) > 200 else recent_content
         }
     
+    @_synchronized
     def clear_conversation(self, session_id: str):
         """Clear conversation history for a session"""
-        if session_id in self.sessions:
-            self.sessions[session_id]['conversation_history'] = []
-            self.sessions[session_id]['context'] = {}
-            self.sessions[session_id]['session_stats'] = {
-                'total_messages': 0,
-                'user_messages': 0,
-                'bot_messages': 0,
-                'intents': defaultdict(int)
-            }
-            self.sessions[session_id]['last_activity'] = datetime.now().isoformat()
-            self._save_session(session_id)
+        session = self._touch(session_id)
+        if session is not None:
+            session['conversation_history'] = []
+            session['context'] = {}
+            session['session_stats'] = _empty_stats()
+            self._record_activity(session_id, session)
+            self._mark_dirty(session_id)
             
             logger.info(f"Cleared conversation for session: {session_id}")
     
+    @_synchronized
     def delete_session(self, session_id: str):
         """Delete a session completely"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        # Evicted sessions exist only on disk
+        file_path = os.path.join(self.storage_path, f"{session_id}.json")
+        if session_id in self.sessions or os.path.exists(file_path):
+            self.sessions.pop(session_id, None)
+            self._dirty.discard(session_id)
+            self._saved_hashes.pop(session_id, None)
+            self._activity_ts.pop(session_id, None)
             
             # Remove file
-            file_path = os.path.join(self.storage_path, f"{session_id}.json")
             if os.path.exists(file_path):
                 os.remove(file_path)
             
             logger.info(f"Deleted session: {session_id}")
     
+    @_synchronized
     def cleanup_expired_sessions(self):
         """Remove expired sessions"""
-        current_time = datetime.now()
-        expired_sessions = []
-        
-        for session_id, session_data in self.sessions.items():
-            last_activity = datetime.fromisoformat(session_data.get('last_activity', ''))
-            if current_time - last_activity > self.session_timeout:
-                expired_sessions.append(session_id)
+        now = time.time()
+        timeout = self.session_timeout.total_seconds()
+        expired_sessions = [
+            session_id for session_id, last_activity in self._activity_ts.items()
+            if now - last_activity > timeout
+        ]
         
         for session_id in expired_sessions:
             self.delete_session(session_id)
         
         logger.info(f"Cleaned up {len(expired_sessions)} expired sessions")
     
+    @_synchronized
     def get_all_sessions(self) -> List[Dict[str, Any]]:
         """Get summary of all active sessions"""
-        return [self.get_conversation_summary(session_id) for session_id in self.sessions.keys()]
+        # Snapshot the ids, since reading a session moves it to the end of the LRU order
+        return [self.get_conversation_summary(session_id) for session_id in list(self.sessions)]
     
     def get_timestamp(self) -> str:
         """Get current timestamp in ISO format"""
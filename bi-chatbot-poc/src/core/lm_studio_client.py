@@ -4,13 +4,59 @@ Provides a simple interface to communicate with LM Studio server.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
+import asyncio
+import numpy as np
 import json
 import logging
-from typing import Dict, Any, Optional, List
+import random
+import re
+from typing import Dict, Any, Optional, List, Iterator, AsyncIterator, Tuple
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+import queue
+import threading
 import time
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+# JSON embedded in a reply: a ```json fenced block, or the outermost braces
+_JSON_FENCE_RE = re.compile(r'```json\s*(.*?)\s*```', re.DOTALL)
+_JSON_OBJ_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+# Ceiling on a single retry sleep, in seconds
+_MAX_BACKOFF = 5.0
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff so concurrent retries don't reconnect in lockstep"""
+    return min(_MAX_BACKOFF, 2 ** attempt) * random.random()
+
+
+def _sse_delta(line: str) -> Tuple[bool, Optional[str]]:
+    """Parse one server-sent event line of a streamed completion into (done, content)
+    
+    LM Studio streams "data: {...}" lines ending with "data: [DONE]".
+    """
+    if not line or not line.startswith('data:'):
+        return False, None
+    
+    payload = line[len('data:'):].strip()
+    if payload == '[DONE]':
+        return True, None
+    
+    chunk = _json_loads(payload)
+    if chunk.get('choices'):
+        return False, chunk['choices'][0].get('delta', {}).get('content')
+    return False, None
+
 class LMStudioClient:
     """Client for interacting with LM Studio local server"""
     
@@ -19,7 +65,13 @@ class LMStudioClient:
         self.api_key = config.get('api_key', '')  # Usually not needed for local
         self.model = config.get('model', 'local-model')
         self.timeout = config.get('timeout', 30)
+        self.connect_timeout = config.get('connect_timeout', 1.0)
         self.max_retries = config.get('max_retries', 3)
+        self.max_connections = config.get('max_connections', 32)
+        
+        # Model context size; chat histories are trimmed to fit it with room for the reply
+        self.context_window = config.get('context_window', 4096)
+        self._encoding = None
         
         # Default generation parameters
         self.default_params = {
@@ -29,11 +81,31 @@ class LMStudioClient:
             'stream': False
         }
         
+        # Shared session keeps connections to the server alive between calls; one
+        # adapter serves both schemes since every request goes to the same server
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_connections)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers.update(self._headers())
+        
+        # Async HTTP client, bound to the event loop it was created on
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Optional coalescing of concurrent single-prompt completions
+        self.batcher: Optional[LMStudioBatcher] = None
+        if config.get('batching_enabled', False):
+            self.batcher = LMStudioBatcher(
+                self,
+                batch_size=config.get('batch_size', 8),
+                coalesce_window_ms=config.get('coalesce_window_ms', 20)
+            )
+        
         logger.info(f"Initialized LM Studio client for {self.base_url}")
     
-    def _make_request(self, endpoint: str, data: Dict[str, Any]) -> requests.Response:
-        """Make HTTP request to LM Studio server with retries"""
-        url = f"{self.base_url}{endpoint}"
+    def _headers(self) -> Dict[str, str]:
+        """Request headers shared by the sync and async clients"""
         headers = {
             'Content-Type': 'application/json'
         }
@@ -41,25 +113,143 @@ class LMStudioClient:
         if self.api_key:
             headers['Authorization'] = f'Bearer {self.api_key}'
         
-        for attempt in range(self.max_retries):
+        return headers
+    
+    def close(self):
+        """Close pooled connections; the async client can only be closed with aclose on its own loop"""
+        self._session.close()
+        self._async_client = None
+        self._async_client_loop = None
+    
+    async def aclose(self):
+        """Close pooled connections, including the async client of the running event loop"""
+        client = self._async_client
+        if client is not None and self._async_client_loop is asyncio.get_running_loop():
+            await client.aclose()
+        self.close()
+    
+    def _make_request(self, endpoint: str, data: Dict[str, Any], stream: bool = False,
+                      max_retries: Optional[int] = None) -> requests.Response:
+        """Make HTTP request to LM Studio server with retries
+        
+        max_retries overrides the configured number of attempts for this request.
+        """
+        url = f"{self.base_url}{endpoint}"
+        attempts = self.max_retries if max_retries is None else max_retries
+        deadline = time.monotonic() + self.timeout * attempts
+        
+        for attempt in range(attempts):
             try:
-                response = requests.post(
+                response = self._session.post(
                     url, 
-                    headers=headers, 
                     json=data, 
-                    timeout=self.timeout
+                    timeout=(self.connect_timeout, self.timeout),
+                    stream=stream
                 )
                 response.raise_for_status()
                 return response
                 
             except requests.exceptions.RequestException as e:
                 logger.warning(f"Request attempt {attempt + 1} failed: {str(e)}")
-                if attempt == self.max_retries - 1:
+                delay = _backoff_delay(attempt)
+                if attempt == attempts - 1 or time.monotonic() + delay >= deadline:
+                    raise
+                time.sleep(delay)
+        
+        raise Exception("Max retries exceeded")
+    
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Get the pooled async HTTP client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        
+        # Pooled connections cannot outlive their loop, so each loop gets its own client
+        if self._async_client is None or self._async_client_loop is not loop:
+            if self._async_client is not None:
+                self._close_stale_async_client(self._async_client, self._async_client_loop)
+            self._async_client = httpx.AsyncClient(
+                headers=self._headers(),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=16
+                )
+            )
+            self._async_client_loop = loop
+        
+        return self._async_client
+    
+    @staticmethod
+    def _close_stale_async_client(client: httpx.AsyncClient, loop: asyncio.AbstractEventLoop):
+        """Close the async client left behind by a previous event loop"""
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            return
+        
+        async def close_quietly():
+            try:
+                await client.aclose()
+            except Exception as e:
+                # Connections bound to a closed loop are released when collected
+                logger.debug(f"Could not close stale async client: {str(e)}")
+        
+        asyncio.get_running_loop().create_task(close_quietly())
+    
+    async def _amake_request(self, endpoint: str, data: Dict[str, Any]) -> httpx.Response:
+        """Make async HTTP request to LM Studio server with retries"""
+        url = f"{self.base_url}{endpoint}"
+        client = self._get_async_client()
+        deadline = time.monotonic() + self.timeout * self.max_retries
+        
+        for attempt in range(self.max_retries):
+            try:
+                response = await client.post(url, json=data)
+                response.raise_for_status()
+                return response
+                
+            except httpx.HTTPError as e:
+                logger.warning(f"Request attempt {attempt + 1} failed: {str(e)}")
+                delay = _backoff_delay(attempt)
+                if attempt == self.max_retries - 1 or time.monotonic() + delay >= deadline:
                     raise
-                time.sleep(2 ** attempt)  # Exponential backoff
+                await asyncio.sleep(delay)
         
         raise Exception("Max retries exceeded")
     
+    def _build_request_data(self,
+                            prompt: str,
+                            system_prompt: Optional[str] = None,
+                            temperature: Optional[float] = None,
+                            max_tokens: Optional[int] = None,
+                            stream: bool = False,
+                            **kwargs) -> Dict[str, Any]:
+        """Build chat completion request data for a single prompt"""
+        messages = []
+        
+        if system_prompt:
+            messages.append({
+                "role": "system",
+                "content": system_prompt
+            })
+        
+        messages.append({
+            "role": "user", 
+            "content": prompt
+        })
+        
+        request_data = {
+            "model": self.model,
+            "messages": messages,
+            # An explicit temperature of 0 is valid, so only None falls back to the default
+            "temperature": self.default_params['temperature'] if temperature is None else temperature,
+            "max_tokens": max_tokens or self.default_params['max_tokens'],
+            "top_p": self.default_params['top_p'],
+            "stream": stream
+        }
+        
+        # Add any additional parameters
+        request_data.update(kwargs)
+        return request_data
+    
     def generate(self, 
                 prompt: str, 
                 system_prompt: Optional[str] = None,
@@ -69,38 +259,122 @@ class LMStudioClient:
         """Generate text completion from prompt"""
         
         try:
-            # Prepare messages for chat completion format
-            messages = []
+            request_data = self._build_request_data(
+                prompt, system_prompt, temperature, max_tokens, **kwargs
+            )
             
-            if system_prompt:
-                messages.append({
-                    "role": "system",
-                    "content": system_prompt
-                })
+            # Make request
+            response = self._make_request('/v1/chat/completions', request_data)
+            response_data = response.json()
             
-            messages.append({
-                "role": "user", 
-                "content": prompt
-            })
+            # Extract generated text
+            if 'choices' in response_data and len(response_data['choices']) > 0:
+                return response_data['choices'][0]['message']['content'].strip()
+            else:
+                raise Exception("No response generated")
+                
+        except Exception as e:
+            logger.error(f"Error in text generation: {str(e)}")
+            raise Exception(f"Failed to generate response: {str(e)}")
+    
+    def generate_with_tools(self, 
+                            prompt: str, 
+                            tools: List[Dict[str, Any]],
+                            system_prompt: Optional[str] = None,
+                            temperature: Optional[float] = None,
+                            max_tokens: Optional[int] = None,
+                            **kwargs) -> Dict[str, Any]:
+        """Generate a completion that either answers directly or calls one of the given tools
+        
+        Returns {"content": str, "tool_calls": [{"name": str, "arguments": dict}]}.
+        """
+        
+        try:
+            request_data = self._build_request_data(
+                prompt, system_prompt, temperature, max_tokens,
+                tools=tools, tool_choice="auto", **kwargs
+            )
             
-            # Prepare request data
-            request_data = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": temperature or self.default_params['temperature'],
-                "max_tokens": max_tokens or self.default_params['max_tokens'],
-                "top_p": self.default_params['top_p'],
-                "stream": False
-            }
+            response = self._make_request('/v1/chat/completions', request_data)
+            response_data = response.json()
             
-            # Add any additional parameters
-            request_data.update(kwargs)
+            if not response_data.get('choices'):
+                raise Exception("No response generated")
             
-            # Make request
-            response = self._make_request('/v1/chat/completions', request_data)
+            message = response_data['choices'][0]['message']
+            tool_calls = []
+            for call in message.get('tool_calls') or []:
+                function = call.get('function', {})
+                arguments = function.get('arguments') or {}
+                if isinstance(arguments, str):
+                    try:
+                        arguments = _json_loads(arguments)
+                    except ValueError:
+                        logger.warning(f"Ignoring malformed arguments for tool {function.get('name')}")
+                        arguments = {}
+                tool_calls.append({"name": function.get('name', ''), "arguments": arguments})
+            
+            return {"content": (message.get('content') or "").strip(), "tool_calls": tool_calls}
+                
+        except Exception as e:
+            logger.error(f"Error in tool-calling generation: {str(e)}")
+            raise Exception(f"Failed to generate response: {str(e)}")
+    
+    def complete_batch(self, 
+                       prompts: List[str], 
+                       max_tokens: Optional[int] = None,
+                       temperature: Optional[float] = None) -> List[str]:
+        """Complete several raw prompts in one multi-prompt /v1/completions request"""
+        
+        request_data = {
+            "model": self.model,
+            "prompt": prompts if len(prompts) > 1 else prompts[0],
+            "temperature": self.default_params['temperature'] if temperature is None else temperature,
+            "max_tokens": max_tokens or self.default_params['max_tokens'],
+            "top_p": self.default_params['top_p'],
+            "stream": False
+        }
+        
+        response = self._make_request('/v1/completions', request_data)
+        choices = response.json().get('choices', [])
+        
+        if len(choices) != len(prompts):
+            raise Exception(f"Expected {len(prompts)} completions, got {len(choices)}")
+        
+        choices = sorted(choices, key=lambda choice: choice.get('index', 0))
+        return [choice['text'].strip() for choice in choices]
+    
+    def generate_batched(self, 
+                         prompt: str, 
+                         max_tokens: Optional[int] = None,
+                         temperature: Optional[float] = None) -> str:
+        """Generate through the request batcher when enabled, otherwise like generate"""
+        
+        if self.batcher is None:
+            return self.generate(prompt, max_tokens=max_tokens, temperature=temperature)
+        
+        try:
+            return self.batcher.submit(prompt, max_tokens, temperature).result()
+        except Exception as e:
+            logger.warning(f"Batched generation failed, retrying unbatched: {str(e)}")
+            return self.generate(prompt, max_tokens=max_tokens, temperature=temperature)
+    
+    async def agenerate(self, 
+                        prompt: str, 
+                        system_prompt: Optional[str] = None,
+                        temperature: Optional[float] = None,
+                        max_tokens: Optional[int] = None,
+                        **kwargs) -> str:
+        """Async version of generate"""
+        
+        try:
+            request_data = self._build_request_data(
+                prompt, system_prompt, temperature, max_tokens, **kwargs
+            )
+            
+            response = await self._amake_request('/v1/chat/completions', request_data)
             response_data = response.json()
             
-            # Extract generated text
             if 'choices' in response_data and len(response_data['choices']) > 0:
                 return response_data['choices'][0]['message']['content'].strip()
             else:
@@ -110,11 +384,91 @@ class LMStudioClient:
             logger.error(f"Error in text generation: {str(e)}")
             raise Exception(f"Failed to generate response: {str(e)}")
     
+    def _stream_completion(self, request_data: Dict[str, Any]) -> Iterator[str]:
+        """Post a streaming chat completion and yield its content deltas"""
+        response = self._make_request('/v1/chat/completions', request_data, stream=True)
+        
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                done, content = _sse_delta(line)
+                if done:
+                    break
+                if content:
+                    yield content
+    
+    async def _astream_completion(self, request_data: Dict[str, Any]) -> AsyncIterator[str]:
+        """Async version of _stream_completion"""
+        client = self._get_async_client()
+        url = f"{self.base_url}/v1/chat/completions"
+        
+        async with client.stream('POST', url, json=request_data) as response:
+            response.raise_for_status()
+            
+            async for line in response.aiter_lines():
+                done, content = _sse_delta(line)
+                if done:
+                    break
+                if content:
+                    yield content
+    
+    def generate_stream(self, 
+                        prompt: str, 
+                        system_prompt: Optional[str] = None,
+                        temperature: Optional[float] = None,
+                        max_tokens: Optional[int] = None,
+                        **kwargs) -> Iterator[str]:
+        """Generate text completion from prompt, yielding tokens as they arrive"""
+        
+        try:
+            request_data = self._build_request_data(
+                prompt, system_prompt, temperature, max_tokens, stream=True, **kwargs
+            )
+            
+            yield from self._stream_completion(request_data)
+                            
+        except Exception as e:
+            logger.error(f"Error in streaming text generation: {str(e)}")
+            raise Exception(f"Failed to generate response: {str(e)}")
+    
+    async def agenerate_stream(self, 
+                               prompt: str, 
+                               system_prompt: Optional[str] = None,
+                               temperature: Optional[float] = None,
+                               max_tokens: Optional[int] = None,
+                               **kwargs) -> AsyncIterator[str]:
+        """Async version of generate_stream"""
+        
+        try:
+            request_data = self._build_request_data(
+                prompt, system_prompt, temperature, max_tokens, stream=True, **kwargs
+            )
+            
+            async for content in self._astream_completion(request_data):
+                yield content
+                            
+        except Exception as e:
+            logger.error(f"Error in streaming text generation: {str(e)}")
+            raise Exception(f"Failed to generate response: {str(e)}")
+    
     def generate_json(self, 
                      prompt: str, 
                      system_prompt: Optional[str] = None,
+                     schema: Optional[Dict[str, Any]] = None,
                      **kwargs) -> Dict[str, Any]:
-        """Generate JSON response with structured output"""
+        """Generate JSON response with structured output
+        
+        The reply is constrained at decode time to a JSON object, or to schema
+        when given, so the regex repair below is only a fallback.
+        """
+        
+        # LM Studio accepts json_schema rather than OpenAI's json_object type
+        kwargs.setdefault('response_format', {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "response",
+                "schema": schema or {"type": "object"}
+            }
+        })
         
         # Add JSON instruction to prompt
         json_prompt = f"{prompt}\n\nPlease respond with valid JSON only."
@@ -133,21 +487,20 @@ class LMStudioClient:
         
         try:
             # Try to parse JSON
-            return json.loads(response_text)
-        except json.JSONDecodeError as e:
+            return _json_loads(response_text)
+        except ValueError as e:
             logger.error(f"Failed to parse JSON response: {response_text}")
             # Attempt to extract JSON from response
             try:
                 # Look for JSON block in response
-                import re
-                json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
+                json_match = _JSON_FENCE_RE.search(response_text)
                 if json_match:
-                    return json.loads(json_match.group(1))
+                    return _json_loads(json_match.group(1))
                 
                 # Try to find JSON-like content
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+                json_match = _JSON_OBJ_RE.search(response_text)
                 if json_match:
-                    return json.loads(json_match.group(0))
+                    return _json_loads(json_match.group(0))
                     
             except:
                 pass
@@ -160,17 +513,7 @@ class LMStudioClient:
         """Multi-turn chat completion"""
         
         try:
-            request_data = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": self.default_params['temperature'],
-                "max_tokens": self.default_params['max_tokens'],
-                "top_p": self.default_params['top_p'],
-                "stream": False
-            }
-            
-            # Override with any provided parameters
-            request_data.update(kwargs)
+            request_data = self._build_chat_request(messages, stream=False, **kwargs)
             
             response = self._make_request('/v1/chat/completions', request_data)
             response_data = response.json()
@@ -184,10 +527,90 @@ class LMStudioClient:
             logger.error(f"Error in chat completion: {str(e)}")
             raise Exception(f"Failed to generate chat response: {str(e)}")
     
+    def chat_stream(self, 
+                    messages: List[Dict[str, str]], 
+                    **kwargs) -> Iterator[str]:
+        """Multi-turn chat completion, yielding tokens as they arrive"""
+        
+        try:
+            yield from self._stream_completion(self._build_chat_request(messages, stream=True, **kwargs))
+                
+        except Exception as e:
+            logger.error(f"Error in streaming chat completion: {str(e)}")
+            raise Exception(f"Failed to generate chat response: {str(e)}")
+    
+    async def achat_stream(self, 
+                           messages: List[Dict[str, str]], 
+                           **kwargs) -> AsyncIterator[str]:
+        """Async version of chat_stream"""
+        
+        try:
+            request_data = self._build_chat_request(messages, stream=True, **kwargs)
+            async for content in self._astream_completion(request_data):
+                yield content
+                
+        except Exception as e:
+            logger.error(f"Error in streaming chat completion: {str(e)}")
+            raise Exception(f"Failed to generate chat response: {str(e)}")
+    
+    def _build_chat_request(self, messages: List[Dict[str, str]], stream: bool, **kwargs) -> Dict[str, Any]:
+        """Build chat completion request data for a message list"""
+        request_data = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.default_params['temperature'],
+            "max_tokens": self.default_params['max_tokens'],
+            "top_p": self.default_params['top_p'],
+            "stream": stream
+        }
+        
+        # Override with any provided parameters
+        request_data.update(kwargs)
+        request_data["messages"] = self._trim_to_budget(request_data["messages"], request_data["max_tokens"])
+        return request_data
+    
+    def _count_tokens(self, text: str) -> int:
+        """Token count of text with tiktoken's cl100k_base, or about 4 characters per token without it"""
+        if self._encoding is None:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                self._encoding = False
+        
+        if self._encoding:
+            return len(self._encoding.encode(text))
+        return len(text) // 4 + 1
+    
+    def _trim_to_budget(self, messages: List[Dict[str, str]], max_reply_tokens: int) -> List[Dict[str, str]]:
+        """Keep system messages and the most recent turns that fit the context window
+        
+        The newest message is always kept.
+        """
+        budget = self.context_window - max_reply_tokens
+        
+        # Each message costs a few tokens of role and separator overhead
+        system = [m for m in messages if m.get('role') == 'system']
+        used = sum(self._count_tokens(m.get('content') or '') + 4 for m in system)
+        
+        kept = []
+        for message in reversed([m for m in messages if m.get('role') != 'system']):
+            cost = self._count_tokens(message.get('content') or '') + 4
+            if kept and used + cost > budget:
+                break
+            kept.append(message)
+            used += cost
+        
+        if len(kept) + len(system) == len(messages):
+            return messages
+        
+        logger.debug(f"Trimmed chat history from {len(messages)} to {len(kept) + len(system)} messages")
+        return system + kept[::-1]
+    
     def health_check(self) -> bool:
         """Check if LM Studio server is available"""
         try:
-            response = requests.get(f"{self.base_url}/v1/models", timeout=5)
+            response = self._session.get(f"{self.base_url}/v1/models", timeout=(self.connect_timeout, 5))
             return response.status_code == 200
         except:
             return False
@@ -195,7 +618,7 @@ class LMStudioClient:
     def get_models(self) -> List[str]:
         """Get available models from LM Studio"""
         try:
-            response = requests.get(f"{self.base_url}/v1/models", timeout=10)
+            response = self._session.get(f"{self.base_url}/v1/models", timeout=(self.connect_timeout, 10))
             response.raise_for_status()
             data = response.json()
             
@@ -208,23 +631,105 @@ class LMStudioClient:
             return []
     
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Get embeddings for texts (if supported by model)"""
+        """Get embeddings for texts (if supported by model)
+        
+        Raises RuntimeError when the server cannot embed them.
+        """
+        return [item['embedding'] for item in self._request_embeddings(texts)]
+    
+    def get_embeddings_array(self, texts: List[str], max_retries: Optional[int] = None) -> np.ndarray:
+        """Get embeddings for texts as one float32 matrix, a row per text"""
+        return np.asarray(
+            [item['embedding'] for item in self._request_embeddings(texts, max_retries)], dtype=np.float32
+        )
+    
+    def _request_embeddings(self, texts: List[str], max_retries: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Embedding entries returned by the server for texts"""
         try:
             request_data = {
                 "model": self.model,
                 "input": texts
             }
             
-            response = self._make_request('/v1/embeddings', request_data)
+            response = self._make_request('/v1/embeddings', request_data, max_retries=max_retries)
             response_data = response.json()
             
-            if 'data' in response_data:
-                return [item['embedding'] for item in response_data['data']]
+            if response_data.get('data'):
+                return response_data['data']
             else:
                 raise Exception("No embeddings returned")
                 
         except Exception as e:
             logger.warning(f"Embeddings not supported or error: {str(e)}")
-            # Return dummy embeddings for POC
-            import numpy as np
-            return [np.random.normal(0, 1, 384).tolist() for _ in texts]
\ No newline at end of file
+            raise RuntimeError(f"Failed to get embeddings: {str(e)}")
+
+
+class LMStudioBatcher:
+    """Coalesces concurrent single-prompt completions into multi-prompt requests
+    
+    A worker thread waits up to coalesce_window_ms after the first queued prompt
+    for up to batch_size prompts, then sends those sharing generation parameters
+    as one request and resolves each caller's future with its own completion.
+    """
+    
+    def __init__(self, client: LMStudioClient, batch_size: int = 8, coalesce_window_ms: int = 20):
+        self.client = client
+        self.batch_size = batch_size
+        self.coalesce_window = coalesce_window_ms / 1000
+        
+        self._queue: "queue.Queue[Tuple[str, Optional[int], Optional[float], Future]]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lmstudio-batch")
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+    
+    def submit(self, prompt: str, max_tokens: Optional[int] = None, 
+               temperature: Optional[float] = None) -> Future:
+        """Queue a prompt; the returned future resolves to its completion text"""
+        self._ensure_worker()
+        
+        future: Future = Future()
+        self._queue.put((prompt, max_tokens, temperature, future))
+        return future
+    
+    def _ensure_worker(self):
+        """Start the draining thread on first use"""
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="lmstudio-batcher", daemon=True)
+                self._worker.start()
+    
+    def _run(self):
+        """Drain the queue into batches forever"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.coalesce_window
+            
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            # Only prompts with the same generation parameters can share a request
+            groups = defaultdict(list)
+            for item in batch:
+                groups[(item[1], item[2])].append(item)
+            
+            for (max_tokens, temperature), items in groups.items():
+                self._executor.submit(self._dispatch, items, max_tokens, temperature)
+    
+    def _dispatch(self, items: List[Tuple[str, Optional[int], Optional[float], Future]], 
+                  max_tokens: Optional[int], temperature: Optional[float]):
+        """Send one batch and resolve its callers' futures"""
+        try:
+            texts = self.client.complete_batch([item[0] for item in items], max_tokens, temperature)
+            for item, text in zip(items, texts):
+                item[3].set_result(text)
+                
+        except Exception as e:
+            logger.error(f"Error in batched completion: {str(e)}")
+            for item in items:
+                item[3].set_exception(e)
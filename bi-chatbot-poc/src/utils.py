@@ -0,0 +1,148 @@
+"""
+Helper functions shared across the BI chatbot agents.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional, Pattern, Tuple
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def compile_keyword_pattern(keywords: Iterable[str]) -> Pattern:
+    """Compile keywords into one alternation regex for single-pass substring matching"""
+    # Longest keywords first so a phrase wins over any keyword it contains
+    ordered = sorted(set(keywords), key=len, reverse=True)
+    return re.compile("|".join(re.escape(keyword) for keyword in ordered))
+
+
+def loads_lenient_json(text: str) -> Any:
+    """Parse the JSON object in an LLM reply, tolerating surrounding prose and trailing commas
+    
+    Uses orjson when it is installed. Raises ValueError when no parseable
+    object is found.
+    """
+    match = _JSON_OBJECT_RE.search(text)
+    if not match:
+        raise ValueError("No JSON object found")
+    return _json_loads(_TRAILING_COMMA_RE.sub(r'\1', match.group(0)))
+
+
+@lru_cache(maxsize=1024)
+def _format_exchange(user: str, bot: str, bot_label: str) -> str:
+    """Format one conversation exchange; memoized so each turn is formatted once"""
+    return f"User: {user}\n{bot_label}: {bot}"
+
+
+def format_history(history: Iterable[Tuple[str, str]], bot_label: str = "Assistant") -> str:
+    """Join (user, bot) exchanges into the transcript block used in prompts"""
+    return "\n".join(_format_exchange(user, bot, bot_label) for user, bot in history)
+
+
+@lru_cache(maxsize=1024)
+def _content_words(text: str) -> FrozenSet[str]:
+    """Lowercased words longer than two characters, used for cheap relevance scoring"""
+    return frozenset(word for word in _WORD_RE.findall(text.lower()) if len(word) > 2)
+
+
+def select_relevant_history(user_input: str, history: List[Dict[str, Any]], k: int = 3) -> List[Dict[str, Any]]:
+    """Pick up to k exchanges for a prompt
+    
+    The latest exchange is always kept so follow-ups keep their referent; the
+    remaining slots go to the earlier exchanges sharing the most words with the
+    input. The selection is returned in chronological order.
+    """
+    if len(history) <= k:
+        return list(history)
+    
+    query_words = _content_words(user_input)
+    earlier = history[:-1]
+    
+    def relevance(index: int) -> Tuple[int, int]:
+        exchange = earlier[index]
+        words = _content_words(exchange.get('user', '')) | _content_words(exchange.get('bot', ''))
+        # Ties go to the more recent exchange
+        return len(query_words & words), index
+    
+    chosen = sorted(range(len(earlier)), key=relevance, reverse=True)[:k - 1]
+    return [earlier[index] for index in sorted(chosen)] + [history[-1]]
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ttl seconds"""
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+
+
+def setup_logging(log_level: str = "INFO"):
+    """Setup logging so request paths only enqueue records
+    
+    Records go onto a queue; a QueueListener thread formats and writes them to
+    stderr. Safe to call on every Streamlit rerun: it only configures once.
+    """
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, log_level.upper()))
+    
+    if any(isinstance(handler, QueueHandler) for handler in root.handlers):
+        return
+    
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    root.addHandler(QueueHandler(log_queue))
+    
+    # Suppress verbose logs from external libraries
+    logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -1,9 +1,25 @@
+import hashlib
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
+from config.settings import settings
 from utils.llm_client import llm_client
 from utils.file_handler import FileHandler
 
+# A fenced code block, optionally tagged json, in an LLM response
+_JSON_FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL)
+
+# Filename keywords in modification order: configuration and utilities, data
+# loading, processing/transformation, then output
+_EXECUTION_BUCKETS = (
+    ('config', 'util'),
+    ('load', 'input'),
+    ('process', 'transform'),
+    ('output', 'write'),
+)
+
 class CodeIdentifierAgent:
     def __init__(self):
         self.system_prompt = """You are a Code Identifier Agent. Your job is to analyze existing code files and identify what changes are needed based on configuration metadata.
@@ -16,35 +32,23 @@ You should:
 5. Consider dependencies between files
 
 Always provide detailed, actionable suggestions."""
+        
+        # File relevance results keyed by a hash of everything the prompt is built
+        # from, kept in memory and in CACHE_PATH so re-runs skip unchanged files
+        self._relevance_cache: Dict[str, Dict[str, Any]] = {}
+        self._relevance_cache_dir = settings.CACHE_PATH / "code_identifier"
 
     def identify_target_files(self, parsed_config: Dict[str, Any], project_path: Path) -> List[Dict[str, Any]]:
         """Identify files that need modification based on config"""
         
         # Find all relevant files in project
         python_files = FileHandler.find_files(project_path, ['.py'])
-        config_files = FileHandler.find_files(project_path, ['.json', '.yaml', '.yml'])
-        
-        target_files = []
         
-        # Analyze each Python file
-        for file_path in python_files:
-            file_info = FileHandler.get_file_info(file_path)
-            file_structure = FileHandler.parse_python_file(file_path)
-            file_content = FileHandler.read_file(file_path)
-            
-            if file_structure and file_content:
-                analysis = self._analyze_file_relevance(
-                    file_path, file_content, file_structure, parsed_config
-                )
-                
-                if analysis['needs_modification']:
-                    target_files.append({
-                        'file_path': str(file_path),
-                        'file_info': file_info,
-                        'structure': file_structure,
-                        'analysis': analysis,
-                        'priority': analysis.get('priority', 'medium')
-                    })
+        # Analyze Python files concurrently so their LLM calls overlap; map keeps
+        # the file order, so the priority sort below stays deterministic
+        with ThreadPoolExecutor(max_workers=settings.MAX_WORKERS) as executor:
+            results = executor.map(lambda file_path: self._scan_file(file_path, parsed_config), python_files)
+            target_files = [target_file for target_file in results if target_file is not None]
         
         # Sort by priority
         priority_order = {'high': 3, 'medium': 2, 'low': 1}
@@ -52,8 +56,59 @@ Always provide detailed, actionable suggestions."""
         
         return target_files
     
+    def _scan_file(self, file_path: Path, parsed_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Analyze one Python file, returning its target entry if it needs modification"""
+        file_info = FileHandler.get_file_info(file_path)
+        file_content = FileHandler.read_file(file_path)
+        file_structure = FileHandler.parse_python_source(file_content, file_path) if file_content else None
+        
+        if file_structure and file_content:
+            analysis = self._analyze_file_relevance(
+                file_path, file_content, file_structure, parsed_config
+            )
+            
+            if analysis['needs_modification']:
+                return {
+                    'file_path': str(file_path),
+                    'file_info': file_info,
+                    'structure': file_structure,
+                    'analysis': analysis,
+                    'priority': analysis.get('priority', 'medium'),
+                    # Content as analyzed, so later steps need not read the file again
+                    '_content': file_content
+                }
+        
+        return None
+    
     def _analyze_file_relevance(self, file_path: Path, content: str, structure: Dict, config: Dict[str, Any]) -> Dict[str, Any]:
-        """Analyze if a file needs modification based on config"""
+        """Analyze if a file needs modification based on config, reusing cached results"""
+        
+        # The structure is derived from the whole file, so the whole content is hashed
+        cache_key = hashlib.blake2b(
+            "\0".join([file_path.name, content, json.dumps(config, sort_keys=True)]).encode('utf-8'),
+            digest_size=16
+        ).hexdigest()
+        
+        cached = self._relevance_cache.get(cache_key)
+        if cached is None:
+            cache_file = self._relevance_cache_dir / f"{cache_key}.json"
+            if cache_file.exists():
+                cached = FileHandler.load_json(cache_file)
+                if cached is not None:
+                    self._relevance_cache[cache_key] = cached
+        if cached is not None:
+            return dict(cached)
+        
+        analysis = self._request_file_relevance(file_path, content, structure, config)
+        if analysis is not None:
+            self._relevance_cache[cache_key] = analysis
+            FileHandler.save_json(self._relevance_cache_dir / f"{cache_key}.json", analysis)
+            return dict(analysis)
+        
+        return {"needs_modification": False}
+    
+    def _request_file_relevance(self, file_path: Path, content: str, structure: Dict, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Ask the LLM whether a file needs modification; None if it gave no usable answer"""
         
         prompt = f"""
 Analyze this Python file to determine if it needs modification based on the configuration:
@@ -102,27 +157,38 @@ Return JSON:
                 cleaned_response = self._clean_json_response(response)
                 return json.loads(cleaned_response)
             
-            return {"needs_modification": False}
+            return None
             
         except Exception as e:
             print(f"Error analyzing file {file_path}: {e}")
-            return {"needs_modification": False}
+            return None
     
-    def suggest_file_changes(self, target_file: Dict[str, Any], parsed_config: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate detailed suggestions for file modifications"""
+    def suggest_file_changes(self, target_file: Dict[str, Any], parsed_config: Dict[str, Any],
+                             config_blob: Optional[str] = None) -> Dict[str, Any]:
+        """Generate detailed suggestions for file modifications
+        
+        config_blob is parsed_config already serialized, so a plan covering many
+        files encodes it once.
+        """
         
         file_path = target_file['file_path']
-        file_content = FileHandler.read_file(Path(file_path))
+        file_content = target_file.get('_content')
+        if file_content is None:
+            file_content = FileHandler.read_file(Path(file_path))
+        
+        if config_blob is None:
+            config_blob = json.dumps(parsed_config, indent=2, sort_keys=True)
+        file_excerpt = self._relevant_excerpt(file_content or "", target_file)
         
         prompt = f"""
 Generate detailed code modification suggestions for this file:
 
 File Path: {file_path}
 Current Analysis: {json.dumps(target_file['analysis'], indent=2)}
-Configuration: {json.dumps(parsed_config, indent=2)}
+Configuration: {config_blob}
 
 Current File Content:
-{file_content}
+{file_excerpt}
 
 Provide specific, actionable suggestions:
 1. Exact code changes needed
@@ -172,6 +238,45 @@ Return JSON with detailed suggestions:
             print(f"Error generating suggestions for {file_path}: {e}")
             return {"modifications": []}
     
+    def _relevant_excerpt(self, content: str, target_file: Dict[str, Any]) -> str:
+        """The imports plus the functions and classes the analysis suggested changing
+        
+        Falls back to the whole file when no suggested change names an existing
+        function or class, e.g. when only new code is to be added.
+        """
+        targets = {
+            change.get('target') for change in target_file.get('analysis', {}).get('suggested_changes', [])
+        }
+        structure = target_file.get('structure') or {}
+        blocks = sorted(
+            (node['line'], node['end_line'])
+            for node in structure.get('functions', []) + structure.get('classes', [])
+            if node.get('name') in targets and node.get('end_line')
+        )
+        if not blocks:
+            return content
+        
+        lines = content.splitlines()
+        
+        # Leading import lines give the excerpt its context
+        header = []
+        for line in lines:
+            if line.startswith(('import ', 'from ')) or not line.strip() or line.startswith('#'):
+                header.append(line)
+            else:
+                break
+        
+        parts = ["\n".join(header).strip()]
+        covered_until = 0
+        for start, end in blocks:
+            # Skip methods already inside an included class
+            if end <= covered_until:
+                continue
+            parts.append(f"# lines {start}-{end}\n" + "\n".join(lines[start - 1:end]))
+            covered_until = end
+        
+        return "\n\n".join(part for part in parts if part)
+    
     def create_modification_plan(self, target_files: List[Dict[str, Any]], parsed_config: Dict[str, Any]) -> Dict[str, Any]:
         """Create a comprehensive modification plan"""
         
@@ -184,9 +289,12 @@ Return JSON with detailed suggestions:
             "backup_required": True
         }
         
+        # The configuration is the same for every file, so it is serialized once
+        config_blob = json.dumps(parsed_config, indent=2, sort_keys=True)
+        
         # Generate suggestions for each file
         for target_file in target_files:
-            suggestions = self.suggest_file_changes(target_file, parsed_config)
+            suggestions = self.suggest_file_changes(target_file, parsed_config, config_blob)
             
             plan["files_to_modify"].append({
                 "file_path": target_file['file_path'],
@@ -209,52 +317,20 @@ Return JSON with detailed suggestions:
     def _determine_execution_order(self, files_to_modify: List[Dict[str, Any]]) -> List[str]:
         """Determine the order in which files should be modified"""
         
-        # Simple heuristic: prioritize by file type and dependencies
-        order = []
-        
-        # First: Configuration and utility files
-        for file_info in files_to_modify:
-            file_path = Path(file_info['file_path'])
-            if 'config' in file_path.name.lower() or 'util' in file_path.name.lower():
-                order.append(file_info['file_path'])
-        
-        # Second: Data loading files
-        for file_info in files_to_modify:
-            file_path = Path(file_info['file_path'])
-            if 'load' in file_path.name.lower() or 'input' in file_path.name.lower():
-                if file_info['file_path'] not in order:
-                    order.append(file_info['file_path'])
+        # Simple heuristic: prioritize by file type and dependencies. Each file gets
+        # the bucket of the first keyword group its name matches; main/pipeline
+        # files and anything else go last. The sort is stable within a bucket.
+        def bucket(file_path: str) -> int:
+            name = Path(file_path).name.lower()
+            for index, keywords in enumerate(_EXECUTION_BUCKETS):
+                if any(keyword in name for keyword in keywords):
+                    return index
+            return len(_EXECUTION_BUCKETS)
         
-        # Third: Processing/transformation files
-        for file_info in files_to_modify:
-            file_path = Path(file_info['file_path'])
-            if 'process' in file_path.name.lower() or 'transform' in file_path.name.lower():
-                if file_info['file_path'] not in order:
-                    order.append(file_info['file_path'])
-        
-        # Fourth: Output files
-        for file_info in files_to_modify:
-            file_path = Path(file_info['file_path'])
-            if 'output' in file_path.name.lower() or 'write' in file_path.name.lower():
-                if file_info['file_path'] not in order:
-                    order.append(file_info['file_path'])
-        
-        # Finally: Main/pipeline files
-        for file_info in files_to_modify:
-            if file_info['file_path'] not in order:
-                order.append(file_info['file_path'])
-        
-        return order
+        paths = list(dict.fromkeys(file_info['file_path'] for file_info in files_to_modify))
+        return sorted(paths, key=bucket)
     
     def _clean_json_response(self, response: str) -> str:
         """Clean LLM response to extract valid JSON"""
-        if "```json" in response:
-            start = response.find("```json") + 7
-            end = response.find("```", start)
-            response = response[start:end].strip()
-        elif "```" in response:
-            start = response.find("```") + 3
-            end = response.find("```", start)
-            response = response[start:end].strip()
-        
-        return response.strip
\ No newline at end of file
+        match = _JSON_FENCE_RE.search(response)
+        return (match.group(1) if match else response).strip()
@@ -3,9 +3,10 @@ Configuration package for AI Code Generator
 Contains settings and environment configurations
 """
 
-from .settings import Settings, settings
+from .settings import Settings, get_settings, settings
 
 __all__ = [
     'Settings',
+    'get_settings',
     'settings'
 ]
\ No newline at end of file
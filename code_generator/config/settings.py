@@ -1,10 +1,14 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 from pathlib import Path
 
 load_dotenv()
 
 class Settings:
+    # Values are resolved once at import; instances carry no per-instance state
+    __slots__ = ()
+    
     # LM Studio Configuration
     LM_STUDIO_BASE_URL = os.getenv("LM_STUDIO_BASE_URL", "http://localhost:1234/v1")
     LM_STUDIO_API_KEY = os.getenv("LM_STUDIO_API_KEY", "lm-studio")
@@ -13,6 +17,7 @@ class Settings:
     # Project Settings
     PROJECT_ROOT_PATH = Path(os.getenv("PROJECT_ROOT_PATH", "./examples/sample_project"))
     OUTPUT_PATH = Path(os.getenv("OUTPUT_PATH", "./output/generated_code"))
+    CACHE_PATH = Path(os.getenv("CACHE_PATH", "./.cache"))
     MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 1048576))
     SUPPORTED_EXTENSIONS = os.getenv("SUPPORTED_EXTENSIONS", ".py,.json,.yaml,.yml,.txt,.md").split(",")
     
@@ -21,10 +26,16 @@ class Settings:
     TIMEOUT_SECONDS = int(os.getenv("TIMEOUT_SECONDS", 30))
     TEMPERATURE = float(os.getenv("TEMPERATURE", 0.1))
     MAX_TOKENS = int(os.getenv("MAX_TOKENS", 4000))
+    MAX_WORKERS = int(os.getenv("MAX_WORKERS", 8))
     
     @classmethod
     def ensure_output_directory(cls):
         cls.OUTPUT_PATH.mkdir(parents=True, exist_ok=True)
         return cls.OUTPUT_PATH
 
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the shared settings instance"""
+    return Settings()
+
+settings = get_settings()
\ No newline at end of file
@@ -24,7 +24,7 @@ from datetime import datetime
 # Import workflow and utilities
 from workflow.graph import CodeGenerationWorkflow, run_code_generation_workflow
 from utils.file_handler import FileHandler
-from config.settings import Settings
+from config.settings import get_settings
 from utils.llm_client import LLMClient
 
 
@@ -65,7 +65,7 @@ class AICodeGenerator:
     """Main class for AI Code Generator application"""
     
     def __init__(self):
-        self.settings = Settings()
+        self.settings = get_settings()
         self.logger = logging.getLogger(__name__)
         self.workflow = None
         
@@ -78,6 +78,11 @@ class FileHandler:
         if not content:
             return None
         
+        return FileHandler.parse_python_source(content, file_path)
+    
+    @staticmethod
+    def parse_python_source(content: str, file_path: Optional[Path] = None) -> Optional[Dict]:
+        """Extract structure from Python source already read into memory"""
         try:
             tree = ast.parse(content)
             structure = {
@@ -92,12 +97,14 @@ class FileHandler:
                     structure['functions'].append({
                         'name': node.name,
                         'line': node.lineno,
+                        'end_line': node.end_lineno,
                         'args': [arg.arg for arg in node.args.args]
                     })
                 elif isinstance(node, ast.ClassDef):
                     structure['classes'].append({
                         'name': node.name,
-                        'line': node.lineno
+                        'line': node.lineno,
+                        'end_line': node.end_lineno
                     })
                 elif isinstance(node, (ast.Import, ast.ImportFrom)):
                     if isinstance(node, ast.Import):
@@ -114,7 +121,7 @@ class FileHandler:
             
             return structure
         except Exception as e:
-            print(f"Error parsing Python file {file_path}: {e}")
+            print(f"Error parsing Python file {file_path or '<source>'}: {e}")
             return None
     
     @staticmethod
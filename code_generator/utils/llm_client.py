@@ -1,6 +1,6 @@
-import requests
-import json
-from typing import Dict, Any, Optional, List
+import threading
+from openai import OpenAI, OpenAIError
+from typing import Dict, Any, Optional, List, Iterator
 from config.settings import settings
 
 class LMStudioClient:
@@ -8,48 +8,74 @@ class LMStudioClient:
         self.base_url = settings.LM_STUDIO_BASE_URL
         self.api_key = settings.LM_STUDIO_API_KEY
         self.model_name = settings.MODEL_NAME
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        
+        # The OpenAI SDK keeps a pooled keep-alive connection and retries with backoff
+        self.client = OpenAI(
+            base_url=self.base_url,
+            api_key=self.api_key,
+            max_retries=settings.MAX_RETRIES,
+            timeout=settings.TIMEOUT_SECONDS
+        )
+        
+        # Open a pooled connection in the background before the first completion
+        threading.Thread(target=self._prewarm, daemon=True).start()
     
-    def chat_completion(
+    def _prewarm(self):
+        """
+        Populate the connection pool with a cheap models request
+        """
+        try:
+            self.client.with_options(timeout=5, max_retries=0).models.list()
+        except Exception:
+            pass
+    
+    def stream_completion(
         self, 
         messages: List[Dict[str, str]], 
         temperature: float = None,
         max_tokens: int = None,
         system_prompt: str = None
-    ) -> Optional[str]:
+    ) -> Iterator[str]:
         """
-        Send a chat completion request to LM Studio
+        Stream a chat completion from LM Studio, yielding content deltas as they arrive
         """
         if system_prompt:
             messages = [{"role": "system", "content": system_prompt}] + messages
         
-        payload = {
-            "model": self.model_name,
-            "messages": messages,
-            "temperature": temperature or settings.TEMPERATURE,
-            "max_tokens": max_tokens or settings.MAX_TOKENS,
-            "stream": False
-        }
+        stream = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=temperature or settings.TEMPERATURE,
+            max_tokens=max_tokens or settings.MAX_TOKENS,
+            stream=True
+        )
         
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    def chat_completion(
+        self, 
+        messages: List[Dict[str, str]], 
+        temperature: float = None,
+        max_tokens: int = None,
+        system_prompt: str = None
+    ) -> Optional[str]:
+        """
+        Send a chat completion request to LM Studio
+        """
         try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
-                timeout=settings.TIMEOUT_SECONDS
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+            return "".join(self.stream_completion(
+                messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                system_prompt=system_prompt
+            ))
             
-        except requests.exceptions.RequestException as e:
+        except OpenAIError as e:
             print(f"Error communicating with LM Studio: {e}")
             return None
-        except (KeyError, IndexError) as e:
+        except (AttributeError, IndexError) as e:
             print(f"Error parsing LM Studio response: {e}")
             return None
     
@@ -65,8 +91,8 @@ class LMStudioClient:
         Test connection to LM Studio
         """
         try:
-            response = requests.get(f"{self.base_url}/models", headers=self.headers, timeout=5)
-            return response.status_code == 200
+            self.client.with_options(timeout=5, max_retries=0).models.list()
+            return True
         except:
             return False
 
@@ -2,16 +2,88 @@
 Data Analysis Agent
 Responsible for analyzing the structure and content of uploaded data
 """
+import asyncio
+import logging
+import os
+import re
+import threading
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set, Tuple
 from dataclasses import dataclass
-import json
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
 
 from core.models import ColumnProfile, DataProfile
-from core.llm_client import LMStudioClient
+from core.llm_client import LMStudioClient, to_prompt_json
 from prompts.analysis import COLUMN_ANALYSIS_PROMPT, DATA_OVERVIEW_PROMPT
-from config import MAX_UNIQUE_VALUES_DISPLAY, MIN_CORRELATION_THRESHOLD
+from config import (
+    MAX_UNIQUE_VALUES_DISPLAY,
+    MIN_CORRELATION_THRESHOLD,
+    MAX_CONCURRENT_LLM_CALLS,
+    MEMORY_PROBE_ROWS,
+    MAX_COLUMNS_FOR_DEEP_MEMORY,
+    PATTERN_SAMPLE_SIZE,
+    SEMANTIC_SAMPLE_SIZE,
+    POLARS_MIN_ROWS
+)
+
+logger = logging.getLogger(__name__)
+
+# Value formats reported by _detect_patterns, compiled once
+_RE_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_RE_CODE = re.compile(r'^[A-Z]{2,3}\d+$')
+_RE_DECIMAL = re.compile(r'^\d+\.\d+$')
+
+# Semantic type checks used by _infer_semantic_type
+_RE_EMAIL = re.compile(r'@.*\.')
+_RE_URL = re.compile(r'^https?://')
+
+_VALUE_FORMATS = [
+    (_RE_DATE, "Date format: YYYY-MM-DD"),
+    (_RE_CODE, "Code format: Letters followed by numbers"),
+    (_RE_DECIMAL, "Decimal format"),
+]
+
+
+def _compile_format_database():
+    """Compile every value format into one Hyperscan database, if Hyperscan is installed"""
+    if hyperscan is None:
+        return None
+    
+    try:
+        database = hyperscan.Database()
+        database.compile(
+            expressions=[regex.pattern.encode('utf-8') for regex, _ in _VALUE_FORMATS],
+            ids=list(range(len(_VALUE_FORMATS))),
+            elements=len(_VALUE_FORMATS),
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(_VALUE_FORMATS)
+        )
+        return database
+    except Exception as e:
+        logger.warning("Could not compile Hyperscan patterns, using re: %s", e)
+        return None
+
+
+_FORMAT_DATABASE = _compile_format_database()
+# The database owns a single scratch space, so scans from worker threads take turns
+_FORMAT_SCAN_LOCK = threading.Lock()
 
 
 @dataclass
@@ -21,6 +93,21 @@ class AnalysisResult:
     data_profile: DataProfile
     insights: List[str]
     correlations: Dict[str, Any]
+    
+    @cached_property
+    def column_arrays(self) -> Dict[str, np.ndarray]:
+        """Per-column counts and flags as parallel arrays, in column order"""
+        profiles = list(self.column_profiles.values())
+        count = len(profiles)
+        return {
+            'names': np.array(list(self.column_profiles), dtype=object),
+            'total_counts': np.fromiter((p.total_count for p in profiles), dtype=np.float64, count=count),
+            'null_counts': np.fromiter((p.null_count for p in profiles), dtype=np.float64, count=count),
+            'unique_counts': np.fromiter((p.unique_count for p in profiles), dtype=np.float64, count=count),
+            'is_identifier': np.fromiter((p.inferred_type == 'identifier' for p in profiles), dtype=bool, count=count),
+            'is_text': np.fromiter((p.inferred_type == 'text' for p in profiles), dtype=bool, count=count),
+            'has_patterns': np.fromiter((bool(p.patterns) for p in profiles), dtype=bool, count=count),
+        }
 
 
 class DataAnalyzer:
@@ -29,16 +116,24 @@ class DataAnalyzer:
     def __init__(self, llm_client: LMStudioClient):
         self.llm_client = llm_client
     
-    async def analyze(self, df: pd.DataFrame, sample_size: Optional[int] = None) -> AnalysisResult:
+    async def analyze(self, df: pd.DataFrame, sample_size: Optional[int] = None,
+                      sample_percent: Optional[float] = None) -> AnalysisResult:
         """
         Analyze the dataframe and generate comprehensive insights
+        
+        Large frames are profiled on a sample of sample_size rows or sample_percent
+        (0-1) of the rows, whichever is larger.
         """
-        print("🔍 Starting data analysis...")
+        logger.info("Starting data analysis")
         
         # Sample data if it's too large
-        if sample_size and len(df) > sample_size:
-            df_sample = df.sample(n=sample_size, random_state=42)
-            print(f"📊 Sampled {sample_size} rows from {len(df)} total rows")
+        target_rows = max(sample_size or 0, int((sample_percent or 0) * len(df)))
+        if target_rows and len(df) > target_rows:
+            # Positional sampling is far cheaper than df.sample; sorting keeps row order
+            rng = np.random.default_rng(42)
+            positions = np.sort(rng.choice(len(df), size=target_rows, replace=False))
+            df_sample = df.take(positions)
+            logger.info("Sampled %d rows from %d total rows", target_rows, len(df))
         else:
             df_sample = df
         
@@ -63,30 +158,143 @@ class DataAnalyzer:
     
     async def _analyze_columns(self, df: pd.DataFrame) -> Dict[str, ColumnProfile]:
         """Analyze each column in the dataframe"""
-        profiles = {}
+        # Frame-wide reductions run once in C; the per-column work only looks results up
+        summaries = self._summarize_with_polars(df) if self._use_polars(df) else None
+        if summaries is not None:
+            null_counts, unique_counts, numeric_stats = summaries
+        else:
+            null_counts = df.isna().sum()
+            unique_counts = df.nunique(dropna=True)
+            numeric_stats = self._describe_numeric_columns(df)
+        
+        # Per-column statistics are independent CPU work, so spread them over a thread pool
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=max(1, min(len(df.columns), os.cpu_count() or 1))) as pool:
+            column_stats = await asyncio.gather(*(
+                loop.run_in_executor(
+                    pool, self._compute_column_stats, df[column],
+                    int(null_counts[column]), int(unique_counts[column]), numeric_stats.get(column)
+                )
+                for column in df.columns
+            ))
+        
+        # Each column waits on an LLM round-trip, so fan out with a bounded concurrency
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+        
+        async def analyze_column(column: str, stats: Dict[str, Any]):
+            async with semaphore:
+                logger.debug("Analyzing column: %s", column)
+                return column, await self._analyze_single_column(column, df[column], stats)
+        
+        results = await asyncio.gather(*(
+            analyze_column(column, stats) for column, stats in zip(df.columns, column_stats)
+        ))
+        return dict(results)
+    
+    def _use_polars(self, df: pd.DataFrame) -> bool:
+        """Large frames with unique string column names take the Polars path, when installed"""
+        return (pl is not None and len(df) > POLARS_MIN_ROWS and df.columns.is_unique
+                and all(isinstance(column, str) for column in df.columns))
+    
+    def _summarize_with_polars(self, df: pd.DataFrame) -> Optional[Tuple[Dict[str, int], Dict[str, int],
+                                                                          Dict[str, pd.Series]]]:
+        """Null counts, unique counts and numeric statistics from one multithreaded Polars query"""
+        numeric_cols = [column for column in df.columns if pd.api.types.is_numeric_dtype(df[column])]
+        
+        # Aliases are positional so arbitrary column names can't collide
+        exprs = []
+        for index, column in enumerate(df.columns):
+            exprs.append(pl.col(column).null_count().alias(f"{index}:nulls"))
+            exprs.append(pl.col(column).drop_nulls().n_unique().alias(f"{index}:unique"))
+        
+        for index, column in enumerate(df.columns):
+            if column not in numeric_cols:
+                continue
+            values = pl.col(column).cast(pl.Float64)
+            exprs.extend([
+                values.mean().alias(f"{index}:mean"),
+                values.std().alias(f"{index}:std"),
+                values.min().alias(f"{index}:min"),
+                values.max().alias(f"{index}:max"),
+                values.quantile(0.25, interpolation='linear').alias(f"{index}:25%"),
+                values.quantile(0.5, interpolation='linear').alias(f"{index}:50%"),
+                values.quantile(0.75, interpolation='linear').alias(f"{index}:75%"),
+            ])
+        
+        try:
+            # NaN becomes null on conversion, matching pandas' skip-NA reductions
+            row = pl.from_pandas(df).lazy().select(exprs).collect().row(0, named=True)
+        except Exception as e:
+            logger.warning("Polars profiling failed, falling back to pandas: %s", e)
+            return None
         
-        for column in df.columns:
-            print(f"  📋 Analyzing column: {column}")
-            profile = await self._analyze_single_column(df, column)
-            profiles[column] = profile
+        null_counts = {}
+        unique_counts = {}
+        numeric_stats = {}
+        for index, column in enumerate(df.columns):
+            null_counts[column] = row[f"{index}:nulls"]
+            unique_counts[column] = row[f"{index}:unique"]
+            if column in numeric_cols:
+                numeric_stats[column] = pd.Series({
+                    key: row[f"{index}:{key}"]
+                    for key in ('mean', 'std', 'min', '25%', '50%', '75%', 'max')
+                }, dtype='float64')
         
-        return profiles
+        return null_counts, unique_counts, numeric_stats
     
-    async def _analyze_single_column(self, df: pd.DataFrame, column: str) -> ColumnProfile:
-        """Analyze a single column"""
-        series = df[column]
+    def _describe_numeric_columns(self, df: pd.DataFrame) -> Dict[str, pd.Series]:
+        """Summary statistics for every numeric column from one batched describe()"""
+        numeric_cols = [column for column in df.columns if pd.api.types.is_numeric_dtype(df[column])]
+        if not numeric_cols:
+            return {}
+        
+        # describe() on bool reports categorical counts, so treat booleans as 0/1
+        numeric = df[numeric_cols]
+        bool_cols = [column for column in numeric_cols if pd.api.types.is_bool_dtype(numeric[column])]
+        if bool_cols:
+            numeric = numeric.astype({column: 'float64' for column in bool_cols})
+        
+        if pa is not None:
+            return {column: self._describe_with_arrow(numeric[column]) for column in numeric_cols}
         
+        desc = numeric.describe(percentiles=[.25, .5, .75])
+        return {column: desc[column] for column in desc.columns}
+    
+    def _describe_with_arrow(self, series: pd.Series) -> pd.Series:
+        """describe()-compatible statistics from PyArrow's multithreaded compute kernels"""
+        # Zero-copy for primitive dtypes; NaN becomes null and is skipped by every kernel
+        arr = pa.Array.from_pandas(series)
+        min_max = pc.min_max(arr).as_py()
+        quartiles = pc.quantile(arr, q=[0.25, 0.5, 0.75]).to_pylist()
+        
+        # None (e.g. std of a single value) becomes NaN, as pandas reports it
+        return pd.Series({
+            'count': pc.count(arr).as_py(),
+            'mean': pc.mean(arr).as_py(),
+            'std': pc.stddev(arr, ddof=1).as_py(),
+            'min': min_max['min'],
+            '25%': quartiles[0] if quartiles else None,
+            '50%': quartiles[1] if quartiles else None,
+            '75%': quartiles[2] if quartiles else None,
+            'max': min_max['max']
+        }, dtype='float64')
+    
+    def _compute_column_stats(self, series: pd.Series, null_count: int, unique_count: int,
+                              numeric_stats: Optional[pd.Series] = None) -> Dict[str, Any]:
+        """Profile a single column from its precomputed frame-wide statistics (no LLM calls)"""
         # Basic statistics
-        total_count = len(series)
-        null_count = series.isnull().sum()
-        unique_count = series.nunique()
+        total_count = series.size
         
         # Data type detection
         dtype = str(series.dtype)
-        inferred_type = self._infer_semantic_type(series)
+        non_null = series.dropna()
+        non_null_str = non_null.astype(str) if dtype == 'object' else None
+        inferred_type = self._infer_semantic_type(
+            series, unique_count, total_count - null_count, non_null_str
+        )
         
         # Unique values (limited)
-        unique_values = series.dropna().unique()
+        unique_values = non_null.unique()
         if len(unique_values) > MAX_UNIQUE_VALUES_DISPLAY:
             sample_unique = list(unique_values[:MAX_UNIQUE_VALUES_DISPLAY])
             sample_unique.append(f"... and {len(unique_values) - MAX_UNIQUE_VALUES_DISPLAY} more")
@@ -95,46 +303,72 @@ class DataAnalyzer:
         
         # Statistics for numeric columns
         statistics = {}
-        if pd.api.types.is_numeric_dtype(series):
+        if numeric_stats is not None:
+            desc = numeric_stats if null_count < total_count else None
+            
+            def stat(key: str) -> Optional[float]:
+                return float(desc[key]) if desc is not None else None
+            
             statistics = {
-                'mean': float(series.mean()) if not series.isna().all() else None,
-                'median': float(series.median()) if not series.isna().all() else None,
-                'std': float(series.std()) if not series.isna().all() else None,
-                'min': float(series.min()) if not series.isna().all() else None,
-                'max': float(series.max()) if not series.isna().all() else None,
+                'mean': stat('mean'),
+                'median': stat('50%'),
+                'std': stat('std'),
+                'min': stat('min'),
+                'max': stat('max'),
                 'quantiles': {
-                    '25%': float(series.quantile(0.25)) if not series.isna().all() else None,
-                    '75%': float(series.quantile(0.75)) if not series.isna().all() else None
+                    '25%': stat('25%'),
+                    '75%': stat('75%')
                 }
             }
         
         # Value patterns for string columns
         patterns = []
-        if dtype == 'object' and not series.dropna().empty:
-            patterns = self._detect_patterns(series.dropna())
+        if non_null_str is not None and not non_null_str.empty:
+            patterns = self._detect_patterns(non_null_str)
         
-        # Generate column description using LLM
-        description = await self._generate_column_description(column, series, statistics, patterns)
+        return {
+            'data_type': dtype,
+            'inferred_type': inferred_type,
+            'total_count': total_count,
+            'null_count': null_count,
+            'unique_count': unique_count,
+            'sample_values': sample_unique,
+            'statistics': statistics,
+            'patterns': patterns,
+            'head_values': non_null.head(5)
+        }
+    
+    async def _analyze_single_column(self, column: str, series: pd.Series,
+                                     stats: Dict[str, Any]) -> ColumnProfile:
+        """Describe a profiled column with the LLM and build its ColumnProfile"""
+        description = await self._generate_column_description(
+            column, series, stats['statistics'], stats['patterns'],
+            null_count=stats['null_count'],
+            unique_count=stats['unique_count'],
+            head_values=stats['head_values']
+        )
         
         return ColumnProfile(
             name=column,
-            data_type=dtype,
-            inferred_type=inferred_type,
-            total_count=total_count,
-            null_count=null_count,
-            unique_count=unique_count,
-            sample_values=sample_unique,
-            statistics=statistics,
-            patterns=patterns,
+            data_type=stats['data_type'],
+            inferred_type=stats['inferred_type'],
+            total_count=stats['total_count'],
+            null_count=stats['null_count'],
+            unique_count=stats['unique_count'],
+            sample_values=stats['sample_values'],
+            statistics=stats['statistics'],
+            patterns=stats['patterns'],
             description=description
         )
     
-    def _infer_semantic_type(self, series: pd.Series) -> str:
-        """Infer semantic type of a column"""
+    def _infer_semantic_type(self, series: pd.Series, unique_count: int, non_null_count: int,
+                             non_null_str: Optional[pd.Series] = None) -> str:
+        """Infer semantic type of a column from its precomputed counts"""
         if pd.api.types.is_numeric_dtype(series):
             if series.dtype == 'int64' or series.dtype == 'int32':
-                # Check if it could be an ID
-                if series.nunique() == len(series.dropna()):
+                # Check if it could be an ID; the counts come precomputed from
+                # _compute_column_stats, so no extra pass over the column is needed
+                if unique_count == non_null_count:
                     return "identifier"
                 elif series.min() >= 0 and series.max() <= 1:
                     return "binary"
@@ -147,74 +381,92 @@ class DataAnalyzer:
         elif series.dtype == 'bool':
             return "boolean"
         else:
-            # String analysis
-            sample_values = series.dropna().astype(str)
+            # String analysis; one positive among the leading values settles email/url
+            if non_null_str is not None:
+                sample_values = non_null_str.head(SEMANTIC_SAMPLE_SIZE)
+            else:
+                sample_values = series.dropna().head(SEMANTIC_SAMPLE_SIZE).astype(str)
             if sample_values.empty:
                 return "text"
             
             # Check for email patterns
-            if sample_values.str.contains('@').any() and sample_values.str.contains(r'\.').any():
+            if sample_values.str.contains(_RE_EMAIL).any():
                 return "email"
             
             # Check for URL patterns
-            if sample_values.str.startswith(('http://', 'https://')).any():
+            if sample_values.str.match(_RE_URL).any():
                 return "url"
             
             # Check for categorical (low cardinality)
-            if series.nunique() / len(series.dropna()) < 0.05 and series.nunique() < 50:
+            if unique_count < 50 and unique_count / max(non_null_count, 1) < 0.05:
                 return "categorical"
             
             return "text"
     
-    def _detect_patterns(self, series: pd.Series) -> List[str]:
-        """Detect common patterns in string data"""
+    def _detect_patterns(self, sample_str: pd.Series) -> List[str]:
+        """Detect common patterns in non-null values already converted to str"""
         patterns = []
-        sample_str = series.astype(str)
         
         # Length patterns
         lengths = sample_str.str.len()
         if lengths.nunique() == 1:
             patterns.append(f"Fixed length: {lengths.iloc[0]} characters")
         
-        # Common formats
-        if sample_str.str.match(r'^\d{4}-\d{2}-\d{2}$').any():
-            patterns.append("Date format: YYYY-MM-DD")
+        # Common formats; a qualitative check, so the leading values suffice
+        matched = self._match_value_formats(sample_str.head(PATTERN_SAMPLE_SIZE))
+        patterns.extend(label for index, (_, label) in enumerate(_VALUE_FORMATS) if index in matched)
+        
+        return patterns
+    
+    def _match_value_formats(self, values: pd.Series) -> Set[int]:
+        """Indexes into _VALUE_FORMATS of the formats that any value matches"""
+        if _FORMAT_DATABASE is None:
+            return {index for index, (regex, _) in enumerate(_VALUE_FORMATS)
+                    if values.str.match(regex).any()}
+        
+        # One Hyperscan pass per value checks all formats at once
+        matched = set()
         
-        if sample_str.str.match(r'^[A-Z]{2,3}\d+$').any():
-            patterns.append("Code format: Letters followed by numbers")
+        def on_match(pattern_id, start, end, flags, context):
+            matched.add(pattern_id)
         
-        if sample_str.str.match(r'^\d+\.\d+$').any():
-            patterns.append("Decimal format")
+        with _FORMAT_SCAN_LOCK:
+            for value in values:
+                _FORMAT_DATABASE.scan(value.encode('utf-8'), match_event_handler=on_match)
+                if len(matched) == len(_VALUE_FORMATS):
+                    break
         
-        return patterns
+        return matched
     
     async def _generate_column_description(self, column_name: str, series: pd.Series, 
-                                         statistics: Dict, patterns: List[str]) -> str:
+                                         statistics: Dict, patterns: List[str],
+                                         null_count: int, unique_count: int,
+                                         head_values: pd.Series) -> str:
         """Generate column description using LLM"""
         try:
             # Prepare context for LLM
             context = {
                 "column_name": column_name,
                 "data_type": str(series.dtype),
-                "total_values": len(series),
-                "null_values": series.isnull().sum(),
-                "unique_values": series.nunique(),
-                "sample_values": list(series.dropna().head(5).astype(str)),
+                "total_values": series.size,
+                "null_values": null_count,
+                "unique_values": unique_count,
+                "sample_values": list(head_values.astype(str)),
                 "statistics": statistics,
                 "patterns": patterns
             }
             
             prompt = COLUMN_ANALYSIS_PROMPT.format(
                 column_name=column_name,
-                context=json.dumps(context, indent=2)
+                context=to_prompt_json(context)
             )
             
             response = await self.llm_client.generate(prompt)
             return response.strip()
         
         except Exception as e:
-            print(f"Warning: Could not generate LLM description for column {column_name}: {e}")
-            return f"Column containing {str(series.dtype)} data with {series.nunique()} unique values"
+            logger.warning("Could not generate LLM description for column %s: %s", column_name, e)
+            return f"Column containing {str(series.dtype)} data with {unique_count} unique values"
     
     def _generate_data_profile(self, df_full: pd.DataFrame, df_sample: pd.DataFrame) -> DataProfile:
         """Generate overall data profile"""
@@ -224,26 +476,44 @@ class DataAnalyzer:
             sample_size=len(df_sample),
             data_types=df_full.dtypes.astype(str).to_dict(),
             missing_values_count=df_full.isnull().sum().to_dict(),
-            memory_usage=df_full.memory_usage(deep=True).to_dict()
+            memory_usage=self._estimate_memory_usage(df_full, df_sample)
         )
     
+    def _estimate_memory_usage(self, df_full: pd.DataFrame, df_sample: pd.DataFrame) -> Dict[str, int]:
+        """Estimate per-column memory of the full frame from a deep scan of a few sample rows"""
+        probe = df_sample.head(MEMORY_PROBE_ROWS)
+        
+        # Deep inspection walks every object cell, so very wide frames use dtype sizes only
+        if probe.empty or len(df_full.columns) > MAX_COLUMNS_FOR_DEEP_MEMORY:
+            return df_full.memory_usage(deep=False).to_dict()
+        
+        scale = len(df_full) / len(probe)
+        usage = probe.memory_usage(deep=True) * scale
+        return usage.round().astype('int64').to_dict()
+    
     async def _generate_insights(self, df: pd.DataFrame, column_profiles: Dict[str, ColumnProfile], 
                                data_profile: DataProfile) -> List[str]:
         """Generate data insights using LLM"""
         try:
             # Prepare summary for LLM
+            missing_data = {k: v for k, v in data_profile.missing_values_count.items() if v > 0}
+            high_cardinality_columns = [name for name, profile in column_profiles.items() 
+                                        if profile.unique_count > profile.total_count * 0.8]
+            low_cardinality_columns = [name for name, profile in column_profiles.items() 
+                                       if profile.unique_count < 10]
+            
+            # Only notable columns need their types spelled out; the rest just cost prompt tokens
+            notable_columns = set(missing_data) | set(high_cardinality_columns) | set(low_cardinality_columns)
             summary = {
                 "dataset_shape": f"{data_profile.total_rows} rows × {data_profile.total_columns} columns",
-                "column_types": data_profile.data_types,
-                "missing_data": {k: v for k, v in data_profile.missing_values_count.items() if v > 0},
-                "high_cardinality_columns": [name for name, profile in column_profiles.items() 
-                                           if profile.unique_count > profile.total_count * 0.8],
-                "low_cardinality_columns": [name for name, profile in column_profiles.items() 
-                                          if profile.unique_count < 10],
+                "column_types": {k: v for k, v in data_profile.data_types.items() if k in notable_columns},
+                "missing_data": missing_data,
+                "high_cardinality_columns": high_cardinality_columns,
+                "low_cardinality_columns": low_cardinality_columns,
             }
             
             prompt = DATA_OVERVIEW_PROMPT.format(
-                summary=json.dumps(summary, indent=2)
+                summary=to_prompt_json(summary)
             )
             
             response = await self.llm_client.generate(prompt)
@@ -253,7 +523,7 @@ class DataAnalyzer:
             return insights
         
         except Exception as e:
-            print(f"Warning: Could not generate LLM insights: {e}")
+            logger.warning("Could not generate LLM insights: %s", e)
             return ["Data analysis completed with basic profiling"]
     
     def _calculate_correlations(self, df: pd.DataFrame) -> Dict[str, Any]:
@@ -264,20 +534,28 @@ class DataAnalyzer:
             return {"message": "Not enough numeric columns for correlation analysis"}
         
         try:
-            corr_matrix = df[numeric_cols].corr()
+            values = df[numeric_cols].to_numpy(dtype=np.float64)
+            if np.isnan(values).any():
+                # np.corrcoef propagates NaN; pandas drops missing values pairwise
+                corr = df[numeric_cols].corr().to_numpy()
+            else:
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    corr = np.corrcoef(values, rowvar=False)
             
-            # Find high correlations
-            high_correlations = []
-            for i in range(len(corr_matrix.columns)):
-                for j in range(i+1, len(corr_matrix.columns)):
-                    corr_val = corr_matrix.iloc[i, j]
-                    if abs(corr_val) >= MIN_CORRELATION_THRESHOLD:
-                        high_correlations.append({
-                            "column1": corr_matrix.columns[i],
-                            "column2": corr_matrix.columns[j],
-                            "correlation": float(corr_val)
-                        })
+            # Find high correlations in the upper triangle in one vectorized pass
+            rows, cols = np.triu_indices_from(corr, k=1)
+            pair_values = corr[rows, cols]
+            mask = np.abs(pair_values) >= MIN_CORRELATION_THRESHOLD
+            high_correlations = [
+                {
+                    "column1": numeric_cols[i],
+                    "column2": numeric_cols[j],
+                    "correlation": float(corr_val)
+                }
+                for i, j, corr_val in zip(rows[mask], cols[mask], pair_values[mask])
+            ]
             
+            corr_matrix = pd.DataFrame(corr, index=numeric_cols, columns=numeric_cols)
             return {
                 "correlation_matrix": corr_matrix.to_dict(),
                 "high_correlations": high_correlations,
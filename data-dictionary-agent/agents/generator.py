@@ -2,15 +2,17 @@
 Dictionary Generation Agent
 Responsible for generating comprehensive data dictionaries
 """
-import json
+import asyncio
+import numpy as np
 from typing import Dict, Any, List
 from datetime import datetime
 from dataclasses import asdict
 
 from core.models import DataDictionary, ColumnDefinition
-from core.llm_client import LMStudioClient
+from core.llm_client import LMStudioClient, to_prompt_json
 from agents.analyzer import AnalysisResult
 from prompts.generation import DICTIONARY_GENERATION_PROMPT, COLUMN_DEFINITION_PROMPT
+from config import MAX_CONCURRENT_LLM_CALLS
 
 
 class DictionaryGenerator:
@@ -26,17 +28,19 @@ class DictionaryGenerator:
         """
         print("📝 Generating data dictionary...")
         
-        # Generate column definitions
-        column_definitions = await self._generate_column_definitions(analysis_result)
+        # Score every column once, vectorized over all columns
+        quality_scores = self._calculate_quality_scores(analysis_result)
         
-        # Generate overall dataset description
-        dataset_description = await self._generate_dataset_description(analysis_result)
+        # Column definitions, dataset description and usage recommendations are
+        # independent, so their LLM calls run concurrently
+        column_definitions, dataset_description, usage_recommendations = await asyncio.gather(
+            self._generate_column_definitions(analysis_result, quality_scores),
+            self._generate_dataset_description(analysis_result, quality_scores),
+            self._generate_usage_recommendations(analysis_result)
+        )
         
         # Generate data quality assessment
-        quality_assessment = self._generate_quality_assessment(analysis_result)
-        
-        # Generate usage recommendations
-        usage_recommendations = await self._generate_usage_recommendations(analysis_result)
+        quality_assessment = self._generate_quality_assessment(analysis_result, quality_scores)
         
         # Create data dictionary
         dictionary = DataDictionary(
@@ -59,15 +63,18 @@ class DictionaryGenerator:
         print("✅ Data dictionary generated successfully!")
         return dictionary
     
-    async def _generate_column_definitions(self, analysis_result: AnalysisResult) -> List[ColumnDefinition]:
+    async def _generate_column_definitions(self, analysis_result: AnalysisResult,
+                                           quality_scores: np.ndarray) -> List[ColumnDefinition]:
         """Generate detailed column definitions"""
-        definitions = []
+        # One LLM round-trip per column, bounded so LMStudio isn't flooded
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
         
-        for column_name, profile in analysis_result.column_profiles.items():
-            print(f"  📋 Generating definition for: {column_name}")
+        async def build_definition(profile, quality_score: float) -> ColumnDefinition:
+            print(f"  📋 Generating definition for: {profile.name}")
             
             # Generate enhanced description using LLM
-            enhanced_description = await self._enhance_column_description(profile, analysis_result)
+            async with semaphore:
+                enhanced_description = await self._enhance_column_description(profile, analysis_result)
             
             # Determine constraints and validation rules
             constraints = self._generate_constraints(profile)
@@ -75,7 +82,7 @@ class DictionaryGenerator:
             # Generate business context if possible
             business_context = await self._generate_business_context(profile)
             
-            definition = ColumnDefinition(
+            return ColumnDefinition(
                 name=profile.name,
                 description=enhanced_description,
                 data_type=profile.data_type,
@@ -86,12 +93,13 @@ class DictionaryGenerator:
                 sample_values=profile.sample_values[:5],  # Limit sample values
                 statistics=profile.statistics,
                 business_context=business_context,
-                data_quality_score=self._calculate_quality_score(profile)
+                data_quality_score=quality_score
             )
-            
-            definitions.append(definition)
         
-        return definitions
+        return await asyncio.gather(*(
+            build_definition(profile, float(score))
+            for profile, score in zip(analysis_result.column_profiles.values(), quality_scores)
+        ))
     
     async def _enhance_column_description(self, profile, analysis_result: AnalysisResult) -> str:
         """Enhance column description with LLM insights"""
@@ -117,10 +125,10 @@ class DictionaryGenerator:
             
             prompt = COLUMN_DEFINITION_PROMPT.format(
                 column_name=profile.name,
-                context=json.dumps(context, indent=2)
+                context=to_prompt_json(context)
             )
             
-            response = await self.llm_client.generate(prompt)
+            response = await self.llm_client.generate_cached(prompt)
             return response.strip()
         
         except Exception as e:
@@ -179,27 +187,30 @@ class DictionaryGenerator:
         
         return constraints
     
-    def _calculate_quality_score(self, profile) -> float:
-        """Calculate data quality score for a column"""
-        score = 1.0
+    def _null_percentages(self, analysis_result: AnalysisResult) -> np.ndarray:
+        """Percentage of missing values per column (0 for empty columns)"""
+        arrays = analysis_result.column_arrays
+        total = arrays['total_counts']
+        return np.divide(arrays['null_counts'] * 100, total, out=np.zeros_like(total), where=total > 0)
+    
+    def _calculate_quality_scores(self, analysis_result: AnalysisResult) -> np.ndarray:
+        """Data quality score of every column in one vectorized pass, in column order"""
+        arrays = analysis_result.column_arrays
+        unique = arrays['unique_counts']
         
         # Penalize for missing values
-        null_ratio = profile.null_count / profile.total_count
-        score -= null_ratio * 0.3
-        
-        # Penalize for very low or very high cardinality (context dependent)
-        if profile.unique_count == 1:  # All same values
-            score -= 0.2
-        elif profile.unique_count == profile.total_count and profile.inferred_type != 'identifier':
-            score -= 0.1  # High cardinality when not expected
+        scores = 1.0 - self._null_percentages(analysis_result) / 100 * 0.3
         
-        # Bonus for having patterns
-        if profile.patterns:
-            score += 0.1
+        # Penalize for a single value, or all-unique values outside identifiers; bonus for patterns
+        constant = unique == 1
+        unexpected_unique = ~constant & (unique == arrays['total_counts']) & ~arrays['is_identifier']
+        scores -= 0.2 * constant + 0.1 * unexpected_unique
+        scores += 0.1 * arrays['has_patterns']
         
-        return max(0.0, min(1.0, score))
+        return np.clip(scores, 0.0, 1.0)
     
-    async def _generate_dataset_description(self, analysis_result: AnalysisResult) -> str:
+    async def _generate_dataset_description(self, analysis_result: AnalysisResult,
+                                            quality_scores: np.ndarray) -> str:
         """Generate overall dataset description"""
         try:
             summary = {
@@ -208,15 +219,16 @@ class DictionaryGenerator:
                 "column_summary": {
                     name: {
                         "type": profile.inferred_type,
-                        "quality": self._calculate_quality_score(profile)
+                        "quality": score
                     }
-                    for name, profile in analysis_result.column_profiles.items()
+                    for (name, profile), score in zip(analysis_result.column_profiles.items(),
+                                                      quality_scores.tolist())
                 },
                 "insights": analysis_result.insights[:3]  # Top 3 insights
             }
             
             prompt = DICTIONARY_GENERATION_PROMPT.format(
-                summary=json.dumps(summary, indent=2)
+                summary=to_prompt_json(summary)
             )
             
             response = await self.llm_client.generate(prompt)
@@ -226,20 +238,17 @@ class DictionaryGenerator:
             print(f"Warning: Could not generate dataset description: {e}")
             return f"Dataset with {analysis_result.data_profile.total_rows} rows and {analysis_result.data_profile.total_columns} columns"
     
-    def _generate_quality_assessment(self, analysis_result: AnalysisResult) -> Dict[str, Any]:
+    def _generate_quality_assessment(self, analysis_result: AnalysisResult,
+                                     quality_scores: np.ndarray) -> Dict[str, Any]:
         """Generate data quality assessment"""
-        total_values = sum(profile.total_count for profile in analysis_result.column_profiles.values())
-        total_missing = sum(profile.null_count for profile in analysis_result.column_profiles.values())
-        
-        completeness = 1 - (total_missing / total_values) if total_values > 0 else 0
+        arrays = analysis_result.column_arrays
+        total_values = arrays['total_counts'].sum()
+        total_missing = arrays['null_counts'].sum()
         
-        # Calculate column quality scores
-        column_scores = {
-            name: self._calculate_quality_score(profile)
-            for name, profile in analysis_result.column_profiles.items()
-        }
+        completeness = float(1 - (total_missing / total_values)) if total_values > 0 else 0
         
-        overall_quality = sum(column_scores.values()) / len(column_scores) if column_scores else 0
+        column_scores = dict(zip(arrays['names'], quality_scores.tolist()))
+        overall_quality = float(quality_scores.mean()) if len(quality_scores) else 0
         
         return {
             "overall_score": round(overall_quality, 2),
@@ -251,38 +260,42 @@ class DictionaryGenerator:
     
     def _identify_quality_issues(self, analysis_result: AnalysisResult) -> List[str]:
         """Identify data quality issues"""
-        issues = []
+        arrays = analysis_result.column_arrays
+        null_percentages = self._null_percentages(analysis_result)
         
-        for name, profile in analysis_result.column_profiles.items():
-            # High missing values
-            null_percentage = (profile.null_count / profile.total_count) * 100
-            if null_percentage > 50:
-                issues.append(f"Column '{name}' has {null_percentage:.1f}% missing values")
-            
-            # Constant values
-            if profile.unique_count == 1:
+        # Flag every column at once, then word the issues only for flagged columns
+        high_missing = null_percentages > 50
+        constant = arrays['unique_counts'] == 1
+        duplicate_ids = arrays['is_identifier'] & (arrays['unique_counts'] < arrays['total_counts'])
+        
+        issues = []
+        for i in np.flatnonzero(high_missing | constant | duplicate_ids):
+            name = arrays['names'][i]
+            if high_missing[i]:
+                issues.append(f"Column '{name}' has {null_percentages[i]:.1f}% missing values")
+            if constant[i]:
                 issues.append(f"Column '{name}' has only one unique value")
-            
-            # Potential duplicates in identifier columns
-            if profile.inferred_type == 'identifier' and profile.unique_count < profile.total_count:
+            if duplicate_ids[i]:
                 issues.append(f"Column '{name}' appears to be an identifier but has duplicate values")
         
         return issues
     
     def _generate_quality_recommendations(self, analysis_result: AnalysisResult) -> List[str]:
         """Generate data quality improvement recommendations"""
-        recommendations = []
+        arrays = analysis_result.column_arrays
         
-        for name, profile in analysis_result.column_profiles.items():
-            null_percentage = (profile.null_count / profile.total_count) * 100
-            
-            if null_percentage > 20:
+        needs_imputation = self._null_percentages(analysis_result) > 20
+        constant = arrays['unique_counts'] == 1
+        low_cardinality_text = arrays['is_text'] & (arrays['unique_counts'] < 20)
+        
+        recommendations = []
+        for i in np.flatnonzero(needs_imputation | constant | low_cardinality_text):
+            name = arrays['names'][i]
+            if needs_imputation[i]:
                 recommendations.append(f"Consider data imputation or collection improvement for column '{name}'")
-            
-            if profile.unique_count == 1:
+            if constant[i]:
                 recommendations.append(f"Column '{name}' may be redundant - consider removal")
-            
-            if profile.inferred_type == 'text' and profile.unique_count < 20:
+            if low_cardinality_text[i]:
                 recommendations.append(f"Column '{name}' might benefit from categorical encoding")
         
         return recommendations
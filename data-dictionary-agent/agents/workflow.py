@@ -2,18 +2,28 @@
 LangGraph Workflow for Data Dictionary Generation
 Orchestrates the data analysis and dictionary generation process
 """
+import io
 import json
 from typing import Dict, Any, Optional
-from dataclasses import asdict
 
 from langgraph.graph import Graph, Node
 from langgraph.graph.state import BaseState
 
 from core.data_loader import DataLoader
 from core.llm_client import LMStudioClient
+from core.llm_cache import LLMCache
 from agents.analyzer import DataAnalyzer
 from agents.generator import DictionaryGenerator
-from config import LMSTUDIO_BASE_URL, LMSTUDIO_MODEL, LMSTUDIO_API_KEY
+from config import LMSTUDIO_BASE_URL, LMSTUDIO_MODEL, LMSTUDIO_API_KEY, LLM_CACHE_DIR
+
+# One markdown block per column definition, filled in a single format call
+_MARKDOWN_COLUMN_TEMPLATE = (
+    "### {name}\n"
+    "**Description**: {description}\n"
+    "**Data Type**: {data_type}\n"
+    "**Semantic Type**: {semantic_type}\n"
+    "**Nullable**: {nullable}\n"
+)
 
 
 class WorkflowState(BaseState):
@@ -34,7 +44,8 @@ class DataDictionaryWorkflow:
         self.llm_client = LMStudioClient(
             base_url=LMSTUDIO_BASE_URL,
             model=LMSTUDIO_MODEL,
-            api_key=LMSTUDIO_API_KEY
+            api_key=LMSTUDIO_API_KEY,
+            cache=LLMCache(LLM_CACHE_DIR)
         )
         self.data_loader = DataLoader()
         self.analyzer = DataAnalyzer(self.llm_client)
@@ -98,6 +109,9 @@ class DataDictionaryWorkflow:
         """
         print("🚀 Starting Data Dictionary Generation Workflow")
         
+        # Connect to LMStudio while the data loads
+        self.llm_client.prewarm()
+        
         # Initialize state
         initial_state = WorkflowState(
             file_path=file_path,
@@ -207,7 +221,7 @@ class DataDictionaryWorkflow:
             )
             
             # Convert to dict for JSON serialization
-            state.dictionary = asdict(dictionary)
+            state.dictionary = dictionary.to_dict()
             print("  ✅ Dictionary generated successfully")
             
             return state
@@ -265,74 +279,74 @@ class DataDictionaryWorkflow:
     
     def _convert_to_markdown(self, dictionary: Dict[str, Any]) -> str:
         """Convert dictionary to markdown format"""
-        markdown = []
+        buf = io.StringIO()
+        write = buf.write
         
         # Title
-        markdown.append("# Data Dictionary")
-        markdown.append("")
+        write("# Data Dictionary\n\n")
         
         # Metadata
         if 'metadata' in dictionary:
-            markdown.append("## Dataset Information")
             metadata = dictionary['metadata']
-            markdown.append(f"- **Source File**: {metadata.get('source_file', 'N/A')}")
-            markdown.append(f"- **Generated At**: {metadata.get('generated_at', 'N/A')}")
-            markdown.append(f"- **Total Rows**: {metadata.get('total_rows', 'N/A'):,}")
-            markdown.append(f"- **Total Columns**: {metadata.get('total_columns', 'N/A')}")
-            markdown.append("")
+            write("## Dataset Information\n")
+            write(f"- **Source File**: {metadata.get('source_file', 'N/A')}\n")
+            write(f"- **Generated At**: {metadata.get('generated_at', 'N/A')}\n")
+            write(f"- **Total Rows**: {metadata.get('total_rows', 'N/A'):,}\n")
+            write(f"- **Total Columns**: {metadata.get('total_columns', 'N/A')}\n\n")
         
         # Dataset Description
         if 'dataset_description' in dictionary:
-            markdown.append("## Dataset Description")
-            markdown.append(dictionary['dataset_description'])
-            markdown.append("")
+            write("## Dataset Description\n")
+            write(f"{dictionary['dataset_description']}\n\n")
         
         # Column Definitions
         if 'column_definitions' in dictionary:
-            markdown.append("## Column Definitions")
-            markdown.append("")
+            write("## Column Definitions\n\n")
             
-            for col in dictionary['column_definitions']:
-                if isinstance(col, dict):
-                    markdown.append(f"### {col.get('name', 'Unknown')}")
-                    markdown.append(f"**Description**: {col.get('description', 'N/A')}")
-                    markdown.append(f"**Data Type**: {col.get('data_type', 'N/A')}")
-                    markdown.append(f"**Semantic Type**: {col.get('semantic_type', 'N/A')}")
-                    markdown.append(f"**Nullable**: {'Yes' if col.get('nullable', False) else 'No'}")
-                    
-                    if col.get('sample_values'):
-                        markdown.append(f"**Sample Values**: {', '.join(map(str, col['sample_values'][:5]))}")
-                    
-                    if col.get('business_context'):
-                        markdown.append(f"**Business Context**: {col['business_context']}")
-                    
-                    markdown.append("")
+            columns = [col for col in dictionary['column_definitions'] if isinstance(col, dict)]
+            for col in columns:
+                write(_MARKDOWN_COLUMN_TEMPLATE.format(
+                    name=col.get('name', 'Unknown'),
+                    description=col.get('description', 'N/A'),
+                    data_type=col.get('data_type', 'N/A'),
+                    semantic_type=col.get('semantic_type', 'N/A'),
+                    nullable='Yes' if col.get('nullable', False) else 'No'
+                ))
+                
+                if col.get('sample_values'):
+                    write(f"**Sample Values**: {', '.join(map(str, col['sample_values'][:5]))}\n")
+                
+                if col.get('business_context'):
+                    write(f"**Business Context**: {col['business_context']}\n")
+                
+                write("\n")
         
         # Data Quality
         if 'data_quality' in dictionary:
             quality = dictionary['data_quality']
-            markdown.append("## Data Quality Assessment")
-            markdown.append(f"- **Overall Score**: {quality.get('overall_score', 'N/A')}")
-            markdown.append(f"- **Completeness**: {quality.get('completeness', 'N/A')}")
+            write("## Data Quality Assessment\n")
+            write(f"- **Overall Score**: {quality.get('overall_score', 'N/A')}\n")
+            write(f"- **Completeness**: {quality.get('completeness', 'N/A')}\n")
             
             if quality.get('issues'):
-                markdown.append("### Issues Identified")
+                write("### Issues Identified\n")
                 for issue in quality['issues']:
-                    markdown.append(f"- {issue}")
-            markdown.append("")
+                    write(f"- {issue}\n")
+            write("\n")
         
         # Insights
         if 'insights' in dictionary:
-            markdown.append("## Key Insights")
+            write("## Key Insights\n")
             for insight in dictionary['insights']:
-                markdown.append(f"- {insight}")
-            markdown.append("")
+                write(f"- {insight}\n")
+            write("\n")
         
         # Usage Recommendations
         if 'usage_recommendations' in dictionary:
-            markdown.append("## Usage Recommendations")
+            write("## Usage Recommendations\n")
             for rec in dictionary['usage_recommendations']:
-                markdown.append(f"- {rec}")
-            markdown.append("")
+                write(f"- {rec}\n")
+            write("\n")
         
-        return "\n".join(markdown)
\ No newline at end of file
+        # Every line is newline-terminated; the last one carries no separator
+        return buf.getvalue()[:-1]
\ No newline at end of file
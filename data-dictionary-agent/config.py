@@ -1,15 +1,21 @@
 """
 Configuration file for Data Dictionary Agent
 """
+import logging
 import os
 from pathlib import Path
 
+# Library modules log instead of printing; LOG_LEVEL=DEBUG shows per-column progress
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+
 # Project paths
 PROJECT_ROOT = Path(__file__).parent
 SAMPLE_DATA_DIR = PROJECT_ROOT / "sample_data"
 OUTPUTS_DIR = PROJECT_ROOT / "outputs"
 PROMPTS_DIR = PROJECT_ROOT / "prompts"
 
+LLM_CACHE_DIR = OUTPUTS_DIR / ".llm_cache"
+
 # Ensure output directory exists
 OUTPUTS_DIR.mkdir(exist_ok=True)
 
@@ -22,11 +28,17 @@ LMSTUDIO_API_KEY = os.getenv("LMSTUDIO_API_KEY", "lm-studio")  # LMStudio typica
 MAX_UNIQUE_VALUES_DISPLAY = 20  # Max unique values to show in analysis
 SAMPLE_SIZE_FOR_ANALYSIS = 1000  # Sample size for large datasets
 MIN_CORRELATION_THRESHOLD = 0.3  # Minimum correlation to report
+MEMORY_PROBE_ROWS = 1000  # Rows deep-inspected to extrapolate memory usage
+MAX_COLUMNS_FOR_DEEP_MEMORY = 10_000  # Wider frames skip deep memory inspection
+PATTERN_SAMPLE_SIZE = 1000  # Non-null values checked against known value formats
+SEMANTIC_SAMPLE_SIZE = 256  # Non-null values checked for email/URL semantic types
+POLARS_MIN_ROWS = 100_000  # Frames larger than this are summarized with Polars when installed
 
 # LLM Configuration
 MAX_TOKENS = 2048
 TEMPERATURE = 0.1  # Low temperature for consistent outputs
 TIMEOUT = 60  # Request timeout in seconds
+MAX_CONCURRENT_LLM_CALLS = 8  # Column descriptions generated in parallel
 
 # Supported file formats
 SUPPORTED_FORMATS = ['.csv', '.xlsx', '.xls']
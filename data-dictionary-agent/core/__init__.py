@@ -5,6 +5,7 @@ Contains data loading, LLM client, and data models
 
 from .data_loader import DataLoader
 from .llm_client import LMStudioClient
+from .llm_cache import LLMCache
 from .models import (
     ColumnProfile,
     DataAnalysisResult,
@@ -17,6 +18,7 @@ from .models import (
 __all__ = [
     'DataLoader',
     'LMStudioClient', 
+    'LLMCache',
     'ColumnProfile',
     'DataAnalysisResult',
     'DataDictionary',
@@ -0,0 +1,75 @@
+"""
+LLM Response Cache
+Persistent cache for LLM responses keyed by the exact prompt
+"""
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """Persistent cache of LLM responses keyed by prompt"""
+    
+    def __init__(self, cache_dir: Path):
+        """
+        Initialize the cache
+        
+        Args:
+            cache_dir: Directory holding cached responses across runs
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._memory: Dict[str, Any] = {}
+        
+        # diskcache when installed, otherwise one JSON file per entry
+        self._store = diskcache.Cache(str(self.cache_dir)) if diskcache is not None else None
+    
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _get(self, key: str) -> Optional[Any]:
+        if key in self._memory:
+            return self._memory[key]
+        
+        value = None
+        try:
+            if self._store is not None:
+                value = self._store.get(key)
+            else:
+                path = self.cache_dir / f"{key}.json"
+                if path.exists():
+                    value = json.loads(path.read_text(encoding='utf-8'))
+        except Exception as e:
+            logger.warning(f"Could not read LLM cache entry {key}: {str(e)}")
+        
+        if value is not None:
+            self._memory[key] = value
+        return value
+    
+    def _set(self, key: str, value: Any):
+        self._memory[key] = value
+        try:
+            if self._store is not None:
+                self._store.set(key, value)
+            else:
+                (self.cache_dir / f"{key}.json").write_text(json.dumps(value), encoding='utf-8')
+        except Exception as e:
+            logger.warning(f"Could not write LLM cache entry {key}: {str(e)}")
+    
+    def get_response(self, prompt: str) -> Optional[str]:
+        """Response previously generated for exactly this prompt"""
+        return self._get(f"prompt-{self._hash(prompt)}")
+    
+    def set_response(self, prompt: str, response: str):
+        """Remember the response generated for a prompt"""
+        self._set(f"prompt-{self._hash(prompt)}", response)
@@ -8,14 +8,50 @@ import aiohttp
 from typing import Dict, List, Any, Optional, Union
 import logging
 
+from .llm_cache import LLMCache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
+def _json_loads(data):
+    """Parse JSON with orjson when installed"""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _encode_payload(payload: Dict[str, Any]) -> bytes:
+    """Serialize a request body straight to UTF-8 bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode('utf-8')
+
+
+def to_prompt_json(data: Any) -> str:
+    """
+    Serialize data for an LLM prompt
+    
+    Output is compact: indentation only costs prompt tokens. Values json can't
+    encode, including NumPy scalars, are handled rather than raising.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            data,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+            default=str
+        ).decode('utf-8')
+    return json.dumps(data, separators=(',', ':'), default=str)
+
+
 class LMStudioClient:
     """Client for interacting with LMStudio API"""
     
     def __init__(self, base_url: str = "http://localhost:1234", 
-                 model: str = "local-model", api_key: Optional[str] = None):
+                 model: str = "local-model", api_key: Optional[str] = None,
+                 max_connections: int = 50, cache: Optional[LLMCache] = None):
         """
         Initialize LMStudio client
         
@@ -23,11 +59,16 @@ class LMStudioClient:
             base_url: LMStudio server URL
             model: Model name to use
             api_key: API key if required
+            max_connections: Size of the shared keep-alive connection pool
+            cache: Optional response cache used by generate_cached
         """
         self.base_url = base_url.rstrip('/')
         self.model = model
         self.api_key = api_key
+        self.max_connections = max_connections
+        self.cache = cache
         self.session = None
+        self._prewarm_task = None
         
         # API endpoints
         self.chat_endpoint = f"{self.base_url}/v1/chat/completions"
@@ -36,7 +77,7 @@ class LMStudioClient:
     
     async def __aenter__(self):
         """Async context manager entry"""
-        self.session = aiohttp.ClientSession()
+        await self._ensure_session()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -47,7 +88,30 @@ class LMStudioClient:
     async def _ensure_session(self):
         """Ensure session is available"""
         if not self.session:
-            self.session = aiohttp.ClientSession()
+            # One pooled session serves every concurrent request
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    keepalive_timeout=30
+                )
+            )
+    
+    def prewarm(self):
+        """Open a pooled connection in the background, ahead of the first real request"""
+        if self._prewarm_task is None:
+            self._prewarm_task = asyncio.get_running_loop().create_task(self._aprewarm())
+    
+    async def _aprewarm(self):
+        """Issue a cheap models request so the connection pool holds a live connection"""
+        try:
+            await self._ensure_session()
+            async with self.session.get(
+                self.models_endpoint,
+                timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                await response.read()
+        except Exception as e:
+            logger.debug(f"Connection pre-warm failed: {str(e)}")
     
     async def generate_response(self, messages: List[Dict[str, str]], 
                               temperature: float = 0.7, 
@@ -101,7 +165,7 @@ class LMStudioClient:
             # Make request
             async with self.session.post(
                 self.chat_endpoint,
-                json=payload,
+                data=_encode_payload(payload),
                 headers=headers,
                 timeout=aiohttp.ClientTimeout(total=60)
             ) as response:
@@ -111,7 +175,7 @@ class LMStudioClient:
                     logger.error(f"LMStudio API error: {response.status} - {error_text}")
                     raise Exception(f"API request failed: {response.status}")
                 
-                result = await response.json()
+                result = await response.json(loads=_json_loads)
                 
                 # Extract response
                 if 'choices' in result and len(result['choices']) > 0:
@@ -127,9 +191,48 @@ class LMStudioClient:
             logger.error(f"Client error: {str(e)}")
             raise Exception(f"Connection error: {str(e)}")
         except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
+            logger.exception("Error generating response: %s", e)
             raise
     
+    async def generate(self, prompt: str, system_prompt: Optional[str] = None, **kwargs) -> str:
+        """
+        Generate a response for a single user prompt
+        
+        Args:
+            prompt: User prompt
+            system_prompt: Optional system prompt
+            **kwargs: Passed through to generate_response
+            
+        Returns:
+            Generated response text
+        """
+        return await self.generate_response(
+            messages=[{"role": "user", "content": prompt}],
+            system_prompt=system_prompt,
+            **kwargs
+        )
+    
+    async def generate_cached(self, prompt: str) -> str:
+        """
+        Generate a response, reusing the cached response for an identical prompt
+        
+        Args:
+            prompt: User prompt
+            
+        Returns:
+            Generated or cached response text
+        """
+        if self.cache is None:
+            return await self.generate(prompt)
+        
+        response = self.cache.get_response(prompt)
+        if response is not None:
+            return response
+        
+        response = await self.generate(prompt)
+        self.cache.set_response(prompt, response)
+        return response
+    
     async def generate_embeddings(self, texts: Union[str, List[str]]) -> List[List[float]]:
         """
         Generate embeddings for text(s)
@@ -164,7 +267,7 @@ class LMStudioClient:
             # Make request
             async with self.session.post(
                 self.embeddings_endpoint,
-                json=payload,
+                data=_encode_payload(payload),
                 headers=headers,
                 timeout=aiohttp.ClientTimeout(total=30)
             ) as response:
@@ -175,7 +278,7 @@ class LMStudioClient:
                     # Return empty embeddings on error for PoC
                     return [[0.0] * 384 for _ in texts]  # Default embedding size
                 
-                result = await response.json()
+                result = await response.json(loads=_json_loads)
                 
                 # Extract embeddings
                 if 'data' in result:
@@ -185,7 +288,7 @@ class LMStudioClient:
                     return [[0.0] * 384 for _ in texts]
         
         except Exception as e:
-            logger.error(f"Error generating embeddings: {str(e)}")
+            logger.exception("Error generating embeddings: %s", e)
             # Return empty embeddings for PoC
             return [[0.0] * 384 for _ in (texts if isinstance(texts, list) else [texts])]
     
@@ -227,7 +330,7 @@ class LMStudioClient:
                 if response.status != 200:
                     return []
                 
-                result = await response.json()
+                result = await response.json(loads=_json_loads)
                 
                 if 'data' in result:
                     return [model['id'] for model in result['data']]
@@ -253,7 +356,7 @@ class LMStudioClient:
         """
         try:
             # Format context data
-            context_str = json.dumps(context_data, indent=2, default=str)
+            context_str = to_prompt_json(context_data)
             
             # Create analysis message
             messages = [
@@ -281,7 +384,7 @@ Focus on actionable insights and practical recommendations.
             return response
         
         except Exception as e:
-            logger.error(f"Error in context analysis: {str(e)}")
+            logger.exception("Error in context analysis: %s", e)
             return f"Analysis failed: {str(e)}"
     
     async def extract_insights(self, column_profiles: List[Dict[str, Any]]) -> List[str]:
@@ -324,7 +427,7 @@ Focus on actionable insights and practical recommendations.
             insights_prompt = f"""
 Based on the following data profile summary, provide 3-5 key insights about the dataset:
 
-{json.dumps(summary, indent=2)}
+{to_prompt_json(summary)}
 
 Focus on:
 1. Data quality observations
@@ -352,7 +455,7 @@ Provide insights as a simple list of actionable statements.
             return insights[:5]  # Return top 5 insights
         
         except Exception as e:
-            logger.error(f"Error extracting insights: {str(e)}")
+            logger.exception("Error extracting insights: %s", e)
             return ["Insight extraction failed due to technical issues"]
     
     async def close(self):
@@ -89,6 +89,21 @@ class ColumnDefinition(BaseModel):
         json_encoders = {
             datetime: lambda v: v.isoformat()
         }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict of this definition; lists are shared, not copied"""
+        return {
+            "name": self.name,
+            "description": self.description,
+            "data_type": self.data_type,
+            "semantic_type": self.semantic_type,
+            "nullable": self.nullable,
+            "sample_values": self.sample_values,
+            "constraints": self.constraints,
+            "business_context": self.business_context,
+            "source_notes": self.source_notes,
+            "quality_score": self.quality_score
+        }
 
 
 class DataQuality(BaseModel):
@@ -104,6 +119,17 @@ class DataQuality(BaseModel):
         json_encoders = {
             datetime: lambda v: v.isoformat()
         }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict of this assessment; lists are shared, not copied"""
+        return {
+            "overall_score": self.overall_score,
+            "completeness": self.completeness,
+            "consistency": self.consistency,
+            "validity": self.validity,
+            "issues": self.issues,
+            "recommendations": self.recommendations
+        }
 
 
 class DatasetMetadata(BaseModel):
@@ -122,6 +148,20 @@ class DatasetMetadata(BaseModel):
         json_encoders = {
             datetime: lambda v: v.isoformat()
         }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict of this metadata"""
+        return {
+            "source_file": self.source_file,
+            "file_size_bytes": self.file_size_bytes,
+            "generated_at": self.generated_at,
+            "generated_by": self.generated_by,
+            "version": self.version,
+            "total_rows": self.total_rows,
+            "total_columns": self.total_columns,
+            "sample_size": self.sample_size,
+            "processing_time_seconds": self.processing_time_seconds
+        }
 
 
 class DataDictionary(BaseModel):
@@ -138,6 +178,23 @@ class DataDictionary(BaseModel):
         json_encoders = {
             datetime: lambda v: v.isoformat()
         }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Plain dict of the whole dictionary
+        
+        Built field by field without reflection or deep copies; nested lists and
+        dicts are shared with the model.
+        """
+        return {
+            "metadata": self.metadata.to_dict(),
+            "dataset_description": self.dataset_description,
+            "column_definitions": [column.to_dict() for column in self.column_definitions],
+            "data_quality": self.data_quality.to_dict(),
+            "insights": self.insights,
+            "usage_recommendations": self.usage_recommendations,
+            "glossary": self.glossary
+        }
 
 
 class ValidationResult(BaseModel):